@@ -0,0 +1,99 @@
+"""Adaptive concurrency limits for the heavy API endpoints.
+
+:class:`AdaptiveLimiter` admits at most ``limit`` concurrent requests and
+adjusts ``limit`` with AIMD on observed latency: each completion no slower
+than ``tolerance`` times the baseline (a slowly rising minimum latency) adds
+``1/limit`` while the pool is busy, and a slower or failed completion
+multiplies it by ``backoff``. Requests beyond the limit are rejected at once
+so they do not queue behind slow UIA/OCR work in the threadpool.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Dict
+
+import metrics
+
+# baseline drifts toward slower samples so a permanently slower host is learned
+BASELINE_DRIFT = 0.01
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one pool of requests."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+    ) -> None:
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.shed = 0
+        self.baseline_ms: float | None = None
+        self.last_ms: float | None = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Take a slot, or count the request as shed and return ``False``."""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency_ms: float, ok: bool = True) -> None:
+        """Return a slot and adapt the limit to the request's latency."""
+        now = time.monotonic()
+        with self._lock:
+            busy = self.in_flight >= int(self.limit) / 2
+            self.in_flight -= 1
+            self.last_ms = latency_ms
+            base = self.baseline_ms
+            if base is None or latency_ms < base:
+                self.baseline_ms = latency_ms
+            else:
+                self.baseline_ms = base + (latency_ms - base) * BASELINE_DRIFT
+            slow = base is not None and latency_ms > self.tolerance * max(base, 1.0)
+            if not ok or slow:
+                # one decrease per round trip so a burst of slow completions
+                # does not collapse the limit
+                if now - self._last_decrease >= latency_ms / 1000:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif busy:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait: about one typical request."""
+        ms = self.last_ms or self.baseline_ms or 0.0
+        return max(1, math.ceil(ms / 1000))
+
+    def stats(self) -> Dict[str, float | int]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "shed_total": self.shed,
+            "baseline_ms": round(self.baseline_ms or 0.0, 1),
+        }
+
+    def record_metrics(self) -> None:
+        for key, value in self.stats().items():
+            metrics.record_gauge("admission", value, label=f"{self.name}.{key}")
+
+
+__all__ = ["AdaptiveLimiter"]
@@ -16,6 +16,7 @@ from typing import cast
 
 from dispatcher import dispatch
 from registry import get_tool, violates_policy
+from validation import validator_for
 import settings
 import logger as _logger
 import metrics
@@ -532,125 +533,60 @@ class Agent:
                     except Exception:
                         args = {}
                 schema = tool.get("schema") if isinstance(tool, dict) else None
-                if schema:
-                    missing = [k for k in schema.get("required", []) if k not in args]
+                validate = validator_for(tool) if isinstance(tool, dict) else None
+                problems = validate(args) if validate is not None else []
+                if problems:
+                    failure_streak += 1
+                    missing = [p["field"] for p in problems if p["reason"] == "missing"]
+                    invalid = [p["field"] for p in problems if p["reason"] != "missing"]
+                    event: Dict[str, Any] = {"event": "invalid_tool_args", "name": name}
                     if missing:
-                        failure_streak += 1
-                        self.log.warning(
-                            json.dumps(
+                        event["missing"] = missing
+                    else:
+                        event["invalid_type"] = invalid
+                    event.update(
+                        {
+                            "conversation_id": conversation_id,
+                            "turn": turn,
+                            "request_id": request_id,
+                            "tool_call_id": tool_call_id,
+                            "safe_mode": self.safe_mode,
+                        }
+                    )
+                    self.log.warning(json.dumps(event))
+                    messages.append(
+                        {
+                            "role": "tool",
+                            "name": name,
+                            "tool_call_id": tool_call_id,
+                            "content": json.dumps(
                                 {
-                                    "event": "invalid_tool_args",
-                                    "name": name,
-                                    "missing": missing,
-                                    "conversation_id": conversation_id,
-                                    "turn": turn,
-                                    "request_id": request_id,
-                                    "tool_call_id": tool_call_id,
-                                    "safe_mode": self.safe_mode,
+                                    "kind": "error",
+                                    "code": "missing_args" if missing else "invalid_type",
+                                    "note": ", ".join(missing or invalid),
+                                    "retry_safe": False,
                                 }
-                            )
-                        )
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "name": name,
-                                "tool_call_id": tool_call_id,
-                                "content": json.dumps(
-                                    {
-                                        "kind": "error",
-                                        "code": "missing_args",
-                                        "note": ", ".join(missing),
-                                        "retry_safe": False,
-                                    }
-                                ),
-                            }
-                        )
-                        if failure_streak >= 3:
-                            self.log.warning(
-                                json.dumps(
-                                    {
-                                        "event": "circuit_breaker",
-                                        "conversation_id": conversation_id,
-                                        "turn": turn,
-                                        "safe_mode": self.safe_mode,
-                                    }
-                                )
-                            )
-                            elapsed_turn = int((self.clock() - start_turn) * 1000)
-                            metrics.record_agent_turn(elapsed_turn)
-                            return (
-                                "Falhei repetidamente ao usar ferramentas nesta tarefa. "
-                                "Posso tentar outro caminho (sem tools) ou você quer ajustar o pedido?"
-                            )
-                        continue
-                    props = schema.get("properties", {})
-                    invalid: List[str] = []
-                    for key, spec in props.items():
-                        if key in args and isinstance(spec, dict) and "type" in spec:
-                            expected = spec["type"]
-                            val = args[key]
-                            if expected == "string" and not isinstance(val, str):
-                                invalid.append(key)
-                            elif expected == "integer" and not isinstance(val, int):
-                                invalid.append(key)
-                            elif expected == "object" and not isinstance(val, dict):
-                                invalid.append(key)
-                            minv = spec.get("minimum")
-                            maxv = spec.get("maximum")
-                            if isinstance(val, (int, float)):
-                                if minv is not None and val < minv:
-                                    invalid.append(key)
-                                if maxv is not None and val > maxv:
-                                    invalid.append(key)
-                    if invalid:
-                        failure_streak += 1
+                            ),
+                        }
+                    )
+                    if failure_streak >= 3:
                         self.log.warning(
                             json.dumps(
                                 {
-                                    "event": "invalid_tool_args",
-                                    "name": name,
-                                    "invalid_type": invalid,
+                                    "event": "circuit_breaker",
                                     "conversation_id": conversation_id,
                                     "turn": turn,
-                                    "request_id": request_id,
-                                    "tool_call_id": tool_call_id,
                                     "safe_mode": self.safe_mode,
                                 }
                             )
                         )
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "name": name,
-                                "tool_call_id": tool_call_id,
-                                "content": json.dumps(
-                                    {
-                                        "kind": "error",
-                                        "code": "invalid_type",
-                                        "note": ", ".join(invalid),
-                                        "retry_safe": False,
-                                    }
-                                ),
-                            }
+                        elapsed_turn = int((self.clock() - start_turn) * 1000)
+                        metrics.record_agent_turn(elapsed_turn)
+                        return (
+                            "Falhei repetidamente ao usar ferramentas nesta tarefa. "
+                            "Posso tentar outro caminho (sem tools) ou você quer ajustar o pedido?"
                         )
-                        if failure_streak >= 3:
-                            self.log.warning(
-                                json.dumps(
-                                    {
-                                        "event": "circuit_breaker",
-                                        "conversation_id": conversation_id,
-                                        "turn": turn,
-                                        "safe_mode": self.safe_mode,
-                                    }
-                                )
-                            )
-                            elapsed_turn = int((self.clock() - start_turn) * 1000)
-                            metrics.record_agent_turn(elapsed_turn)
-                            return (
-                                "Falhei repetidamente ao usar ferramentas nesta tarefa. "
-                                "Posso tentar outro caminho (sem tools) ou você quer ajustar o pedido?"
-                            )
-                        continue
+                    continue
                 if getattr(self, "dry_run", False):
                     messages.append(
                         {
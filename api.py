@@ -5,25 +5,32 @@ from typing import (
     Dict,
     Callable,
     Awaitable,
-    Deque,
-    DefaultDict,
+    AsyncIterator,
+    MutableMapping,
     ParamSpec,
     TypeVar,
     cast,
 )
+import asyncio
+import hashlib
 import io
+import json
+import math
+import os
 import sys
+import threading
 from contextvars import Token
 
 # Ensure standard library modules have priority over local names like inspect.py
 if "" in sys.path:
     sys.path.remove("")
     sys.path.append("")
-from fastapi import FastAPI, Query, Request
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel, Field
+from starlette.requests import HTTPConnection
 from fastapi.middleware.cors import CORSMiddleware
-from collections import defaultdict, deque
+from collections import OrderedDict
 import time
 import resolve
 import screenshot
@@ -32,16 +39,31 @@ from primitives import Bounds, ErrorEnvelope, ErrorInfo, OkEnvelope
 from logger import setup, log_call as _log_call, REQUEST_ID, COMPONENT
 import metrics
 import uuid
-from dispatcher import dispatch
+import dispatcher
+from dispatcher import dispatch_async
+from admission import AdaptiveLimiter
+from hover_hub import HoverHub
+from rate_limit import parse_route_limits
+from singleflight import Singleflight
+from state_backend import get_backend
 from registry import REGISTRY
 import tools
 from settings import (
     SNAPSHOT_MAX_AREA,
     SNAPSHOT_MAX_SIDE,
     API_RATE_LIMIT_PER_MIN,
+    API_RATE_LIMIT_ROUTES,
+    API_KEY_RATE_LIMIT_PER_MIN,
+    API_RATE_LIMIT_MAX_CLIENTS,
     API_CORS_ORIGINS,
     TRUST_PROXY,
     API_KEY,
+    API_STREAM_HZ,
+    API_COALESCE_WINDOW_MS,
+    HOVER_WATCH_IDLE_HZ,
+    SNAPSHOT_CACHE_BYTES,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_LATENCY_TOLERANCE,
 )
 
 tools.register_all_tools()
@@ -56,11 +78,11 @@ COMPONENT.set("api")
 
 app = FastAPI()
 
-if API_CORS_ORIGINS:
-    origins = [o.strip() for o in API_CORS_ORIGINS.split(",") if o.strip()]
+CORS_ORIGINS = [o.strip() for o in API_CORS_ORIGINS.split(",") if o.strip()]
+if CORS_ORIGINS:
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=origins,
+        allow_origins=CORS_ORIGINS,
         allow_methods=["*"],
         allow_headers=["*"],
     )
@@ -90,12 +112,72 @@ def _require_api_key(request: Request) -> JSONResponse | None:
     return None
 
 
-ELEMENT_CACHE: Dict[str, Dict[str, Any]] = {}
-BOUNDS_CACHE: Dict[str, Bounds] = {}
+# Shared between uvicorn workers when STATE_BACKEND=sqlite
+STATE = get_backend()
+ELEMENT_CACHE: MutableMapping[str, Dict[str, Any]] = STATE.mapping("element")
+BOUNDS_CACHE: MutableMapping[str, Bounds] = STATE.mapping("bounds")
+WORKER_ID = str(os.getpid())
+METRICS_PUBLISH_INTERVAL_S = 1.0
+_metrics_published_at = 0.0
 
-# Janela deslizante de timestamps por IP para rate limit (últimos 60s)
-# Limita o deque para evitar crescimento descontrolado sob carga anômala
-_REQUEST_LOG: DefaultDict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=120))
+# Concurrent identical /inspect and /snapshot requests share one computation
+INSPECT_FLIGHT = Singleflight("/inspect", API_COALESCE_WINDOW_MS)
+SNAPSHOT_FLIGHT = Singleflight("/snapshot", API_COALESCE_WINDOW_MS)
+
+# GCRA por cliente (IP ou chave de API) e rota; tabela LRU de tamanho limitado
+RATE_LIMITER = STATE.rate_limiter("api", API_RATE_LIMIT_MAX_CLIENTS)
+ROUTE_RATE_LIMITS = parse_route_limits(API_RATE_LIMIT_ROUTES)
+
+
+def _client_ip(conn: HTTPConnection) -> str:
+    ip = conn.client.host if conn.client else "unknown"
+    forwarded_for = conn.headers.get("X-Forwarded-For")
+    if TRUST_PROXY and forwarded_for:
+        # X-Forwarded-For may contain a comma separated list of addresses;
+        # the client IP is the first one in the list.
+        ip = forwarded_for.split(",", 1)[0].strip()
+    return ip
+
+
+def _rate_limit_bucket(conn: HTTPConnection, ip: str) -> tuple[tuple[str, str], int]:
+    """Return the limiter key and per-minute limit for a request or WebSocket."""
+    client, limit = ip, API_RATE_LIMIT_PER_MIN
+    if API_KEY and conn.headers.get("X-API-Key") == API_KEY:
+        client = "api-key"
+        if API_KEY_RATE_LIMIT_PER_MIN > 0:
+            limit = API_KEY_RATE_LIMIT_PER_MIN
+    path = conn.url.path
+    route_limit = ROUTE_RATE_LIMITS.get(path)
+    if route_limit is None:
+        return (client, "*"), limit
+    return (client, path), route_limit
+
+
+async def _rate_limit_wait(conn: HTTPConnection) -> float:
+    """Consume one request from the caller's bucket; return seconds to wait."""
+    key, limit = _rate_limit_bucket(conn, _client_ip(conn))
+    if STATE.shared:
+        # shared buckets take a SQLite write lock; keep it off the event loop
+        wait: float = await asyncio.to_thread(RATE_LIMITER.check, key, limit)
+    else:
+        wait = RATE_LIMITER.check(key, limit)
+    return wait
+
+
+# Adaptive concurrency limit per heavy route; excess requests get 503
+ADMISSION_POOLS: Dict[str, AdaptiveLimiter] = (
+    {
+        path: AdaptiveLimiter(
+            path,
+            initial=min(8, ADMISSION_MAX_CONCURRENCY),
+            max_limit=ADMISSION_MAX_CONCURRENCY,
+            tolerance=ADMISSION_LATENCY_TOLERANCE,
+        )
+        for path in ("/inspect", "/snapshot", "/v1/tools.call")
+    }
+    if ADMISSION_MAX_CONCURRENCY > 0
+    else {}
+)
 
 
 @app.middleware("http")  # type: ignore[misc]
@@ -105,34 +187,63 @@ async def add_request_id_and_rate_limit(
 ) -> Response:
     request_id = request.headers.get("X-Request-Id") or uuid.uuid4().hex
     token: Token[str] = REQUEST_ID.set(request_id)
-    ip = request.client.host if request.client else "unknown"
-    forwarded_for = request.headers.get("X-Forwarded-For")
-    if TRUST_PROXY and forwarded_for:
-        # X-Forwarded-For may contain a comma separated list of addresses;
-        # the client IP is the first one in the list.
-        ip = forwarded_for.split(",", 1)[0].strip()
-    now = time.time()
-    dq = _REQUEST_LOG[ip]
-    while dq and now - dq[0] > 60:
-        dq.popleft()
-    if len(dq) >= API_RATE_LIMIT_PER_MIN:
+    wait = await _rate_limit_wait(request)
+    if wait > 0:
         metrics.record_request(request.url.path, 429)
         envelope = error_response("rate_limit", "rate limit exceeded")
         response = JSONResponse(envelope, status_code=429)
-        response.headers["Retry-After"] = "60"
+        response.headers["Retry-After"] = str(max(1, math.ceil(wait)))
+        response.headers["X-Request-Id"] = request_id
+        REQUEST_ID.reset(token)
+        return response
+    pool = ADMISSION_POOLS.get(request.url.path)
+    if pool is not None and not pool.try_acquire():
+        metrics.record_request(request.url.path, 503)
+        envelope = error_response("overloaded", "server overloaded, retry later")
+        response = JSONResponse(envelope, status_code=503)
+        response.headers["Retry-After"] = str(pool.retry_after())
         response.headers["X-Request-Id"] = request_id
         REQUEST_ID.reset(token)
         return response
-    dq.append(now)
+    start = time.monotonic()
+    ok = False
     try:
         response = await call_next(request)
+        ok = response.status_code < 500
         metrics.record_request(request.url.path, response.status_code)
         response.headers["X-Request-Id"] = request_id
+        if STATE.shared and _metrics_due():
+            await asyncio.to_thread(_publish_metrics)
         return response
     finally:
+        if pool is not None:
+            pool.release((time.monotonic() - start) * 1000, ok)
         REQUEST_ID.reset(token)
 
 
+def _metrics_due() -> bool:
+    return time.monotonic() - _metrics_published_at >= METRICS_PUBLISH_INTERVAL_S
+
+
+def _publish_metrics(force: bool = False) -> None:
+    """Share this worker's counters at most once per publish interval."""
+    global _metrics_published_at
+    now = time.monotonic()
+    if not force and now - _metrics_published_at < METRICS_PUBLISH_INTERVAL_S:
+        return
+    _metrics_published_at = now
+    STATE.publish_metrics(WORKER_ID, metrics.summary())
+
+
+def _cache_info(info: Dict[str, Any]) -> None:
+    element = info.get("element", {})
+    bounds = element.get("bounds")
+    ELEMENT_CACHE[info["control_id"]] = element
+    if bounds:
+        BOUNDS_CACHE[info["control_id"]] = bounds
+        BOUNDS_CACHE[info["window_id"]] = bounds
+
+
 @app.get("/inspect")  # type: ignore[misc]
 @log_call
 def inspect(
@@ -140,18 +251,94 @@ def inspect(
 ) -> JSONResponse:
     """Describe the element under the cursor or at provided coordinates."""
     if x is not None and y is not None:
-        info = resolve.describe_under_cursor(x, y)
+        info = INSPECT_FLIGHT.do((x, y), lambda: resolve.describe_under_cursor(x, y))
     else:
-        info = resolve.describe_under_cursor()
-    element = info.get("element", {})
-    bounds = element.get("bounds")
-    ELEMENT_CACHE[info["control_id"]] = element
-    if bounds:
-        BOUNDS_CACHE[info["control_id"]] = bounds
-        BOUNDS_CACHE[info["window_id"]] = bounds
+        info = INSPECT_FLIGHT.do(None, lambda: resolve.describe_under_cursor())
+    _cache_info(info)
     return JSONResponse(ok_response(info))
 
 
+# One hover loop per process shared by every /inspect/stream client
+HOVER_HUB = HoverHub(
+    lambda: resolve.describe_under_cursor(),
+    API_STREAM_HZ,
+    HOVER_WATCH_IDLE_HZ,
+    on_sample=_cache_info,
+)
+STREAM_KEEPALIVE_S = 15.0
+
+
+def _dump_event(record: Dict[str, Any]) -> str:
+    return json.dumps(ok_response(record), separators=(",", ":"), ensure_ascii=False)
+
+
+@app.get("/inspect/stream")  # type: ignore[misc]
+async def inspect_stream(
+    max_hz: float | None = Query(default=None, gt=0),
+    delta: bool = Query(default=False),
+) -> StreamingResponse:
+    """Stream change-only /inspect results as Server-Sent Events."""
+    sub = HOVER_HUB.subscribe(max_hz=max_hz, delta=delta)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            while True:
+                record = await sub.next(timeout=STREAM_KEEPALIVE_S)
+                if record is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: inspect\ndata: {_dump_event(record)}\n\n"
+        finally:
+            HOVER_HUB.unsubscribe(sub)
+
+    resp = StreamingResponse(events(), media_type="text/event-stream")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+@app.websocket("/inspect/stream")  # type: ignore[misc]
+async def inspect_stream_ws(
+    websocket: WebSocket,
+    max_hz: float | None = Query(default=None, gt=0),
+    delta: bool = Query(default=False),
+) -> None:
+    """Push change-only /inspect results over a WebSocket."""
+    # the HTTP middleware and CORS do not run for WebSockets, so check the
+    # Origin (cross-site WebSocket hijacking) and the rate limit here
+    origin = websocket.headers.get("Origin")
+    if origin is not None and origin not in CORS_ORIGINS and "*" not in CORS_ORIGINS:
+        metrics.record_request(websocket.url.path, 403)
+        await websocket.close(code=1008)
+        return
+    if await _rate_limit_wait(websocket) > 0:
+        metrics.record_request(websocket.url.path, 429)
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    sub = HOVER_HUB.subscribe(max_hz=max_hz, delta=delta)
+    # clients never send; a pending receive() notices the disconnect
+    receiver = asyncio.ensure_future(websocket.receive())
+    sender = asyncio.ensure_future(sub.next())
+    try:
+        while True:
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                if receiver.result().get("type") == "websocket.disconnect":
+                    break
+                receiver = asyncio.ensure_future(websocket.receive())
+            if sender.done():
+                record = sender.result()
+                sender = asyncio.ensure_future(sub.next())
+                if record is not None:
+                    await websocket.send_text(_dump_event(record))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        HOVER_HUB.unsubscribe(sub)
+
+
 @app.get("/details")  # type: ignore[misc]
 @log_call
 def details(id: str = Query(...)) -> JSONResponse:
@@ -164,10 +351,83 @@ def details(id: str = Query(...)) -> JSONResponse:
     return JSONResponse(ok_response(element))
 
 
+SNAPSHOT_FORMATS = {"png": ("PNG", "image/png"), "jpeg": ("JPEG", "image/jpeg")}
+
+
+class _EncodedSnapshotCache:
+    """LRU of encoded snapshots bounded by total payload bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items: OrderedDict[Any, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> bytes | None:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: Any, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._items[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+        metrics.record_gauge("snapshot_cache_bytes", self.bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+
+SNAPSHOT_CACHE = _EncodedSnapshotCache(SNAPSHOT_CACHE_BYTES)
+
+
+def _capture_frame(region: tuple[int, int, int, int]) -> tuple[Any, str]:
+    """Grab ``region`` and return the image with a digest of its pixels."""
+    img = screenshot.capture(region)
+    digest = hashlib.blake2b(img.tobytes(), digest_size=16).hexdigest()
+    return img, digest
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = (t.strip() for t in header.split(","))
+    return any(t.removeprefix("W/") == etag for t in tags)
+
+
 @app.get("/snapshot")  # type: ignore[misc]
 @log_call
-def snapshot(id: str | None = None, region: str | None = None) -> Response:
-    """Return a PNG screenshot by element ID or explicit region."""
+def snapshot(
+    request: Request,
+    id: str | None = None,
+    region: str | None = None,
+    fmt: str = Query(default="png", alias="format"),
+) -> Response:
+    """Return a PNG or JPEG screenshot by element ID or explicit region.
+
+    The ETag is a digest of the captured pixels; a matching ``If-None-Match``
+    gets a 304 without encoding, and encoded images are cached by region,
+    digest and format.
+    """
+    if fmt not in SNAPSHOT_FORMATS:
+        return JSONResponse(
+            error_response("invalid_format", "format must be png or jpeg"),
+            status_code=400,
+        )
     if (id is None) == (region is None):
         return JSONResponse(
             error_response("missing_id_or_region", "provide id or region"),
@@ -200,7 +460,9 @@ def snapshot(id: str | None = None, region: str | None = None) -> Response:
             )
         region_tuple = (x, y, x + w, y + h)
     try:
-        img = screenshot.capture(region_tuple)
+        img, digest = SNAPSHOT_FLIGHT.do(
+            region_tuple, lambda: _capture_frame(region_tuple)
+        )
     except ValueError as e:
         msg = str(e)
         code = ERROR_CODE_MAP.get(msg)
@@ -210,12 +472,24 @@ def snapshot(id: str | None = None, region: str | None = None) -> Response:
     except Exception as e:  # pragma: no cover - unexpected capture failure
         code = ERROR_CODE_MAP.get(str(e), "capture_failed")
         return JSONResponse(error_response(code, str(e)), status_code=500)
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    resp = StreamingResponse(buf, media_type="image/png")
-    resp.headers["Cache-Control"] = "no-store"
-    return resp
+    etag = f'"{digest}"'
+    # clients may keep the image but must revalidate it on every use
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        metrics.record_enum("snapshot_cache", "not_modified")
+        return Response(status_code=304, headers=headers)
+    pil_format, media_type = SNAPSHOT_FORMATS[fmt]
+    key = (region_tuple, digest, fmt)
+    data = SNAPSHOT_CACHE.get(key)
+    if data is None:
+        metrics.record_enum("snapshot_cache", "miss")
+        buf = io.BytesIO()
+        img.save(buf, format=pil_format)
+        data = buf.getvalue()
+        SNAPSHOT_CACHE.put(key, data)
+    else:
+        metrics.record_enum("snapshot_cache", "hit")
+    return Response(data, media_type=media_type, headers=headers)
 
 
 @app.get("/healthz")  # type: ignore[misc]
@@ -230,7 +504,17 @@ def healthz() -> JSONResponse:
 @log_call
 def get_metrics() -> JSONResponse:
     """Return aggregated latency, fallback and error information."""
-    return JSONResponse(ok_response(metrics.summary()))
+    RATE_LIMITER.record_metrics()
+    for pool in ADMISSION_POOLS.values():
+        pool.record_metrics()
+    dispatcher.EXECUTOR.record_metrics()
+    dispatcher.SCHEDULER.record_metrics()
+    summary = metrics.summary()
+    if STATE.shared:
+        _publish_metrics(force=True)
+        others = STATE.metrics_snapshots(exclude=WORKER_ID)
+        summary = metrics.merge_summaries(summary, others)
+    return JSONResponse(ok_response(summary))
 
 
 class ToolCallModel(BaseModel):  # type: ignore[misc]
@@ -239,7 +523,7 @@ class ToolCallModel(BaseModel):  # type: ignore[misc]
 
 
 @app.get("/v1/tools.list")  # type: ignore[misc]
-def tools_list(request: Request) -> JSONResponse:
+async def tools_list(request: Request) -> JSONResponse:
     auth = _require_api_key(request)
     if auth:
         return auth
@@ -257,7 +541,7 @@ def tools_list(request: Request) -> JSONResponse:
 
 
 @app.post("/v1/tools.call")  # type: ignore[misc]
-def tools_call(body: ToolCallModel, request: Request) -> JSONResponse:
+async def tools_call(body: ToolCallModel, request: Request) -> JSONResponse:
     req_id = REQUEST_ID.get()
     auth = _require_api_key(request)
     if auth:
@@ -269,7 +553,24 @@ def tools_call(body: ToolCallModel, request: Request) -> JSONResponse:
         )
         r.headers["X-Request-Id"] = req_id
         return r
-    res = dispatch({"name": body.name, "args": body.args}, request_id=req_id)
+    deadline: float | None = None
+    raw_deadline = request.headers.get("X-Request-Deadline")
+    if raw_deadline is not None:
+        try:
+            deadline = float(raw_deadline)
+        except ValueError:
+            r = JSONResponse(
+                error_response("bad_args", "invalid X-Request-Deadline"),
+                status_code=400,
+            )
+            r.headers["X-Request-Id"] = req_id
+            return r
+    res = await dispatch_async(
+        {"name": body.name, "args": body.args},
+        request_id=req_id,
+        priority=request.headers.get("X-Request-Priority"),
+        deadline=deadline,
+    )
     http = (
         200
         if res["kind"] == "ok"
@@ -280,6 +581,8 @@ def tools_call(body: ToolCallModel, request: Request) -> JSONResponse:
             if res.get("code") == "forbidden"
             else 400
             if res.get("code") in {"bad_args", "not_found"}
+            else 503
+            if res.get("code") == "overloaded"
             else 504
             if res.get("code") == "timeout"
             else 500
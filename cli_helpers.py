@@ -1,4 +1,5 @@
 import json
+import struct
 import sys
 from typing import Any, Dict
 
@@ -36,3 +37,20 @@ def emit_cli_json_line(data: Dict[str, Any]) -> None:
 
     sys.stdout.buffer.write((_dump_json(data) + "\n").encode("utf-8"))
     sys.stdout.buffer.flush()
+
+
+def emit_cli_msgpack_frame(data: Dict[str, Any]) -> None:
+    """Write ``data`` as a msgpack payload prefixed by its 4-byte length.
+
+    The length is an unsigned big-endian integer so readers can split the
+    stream without parsing payloads. Raises ``RuntimeError('missing_dep')`` when
+    ``msgpack`` is not installed.
+    """
+
+    try:
+        import msgpack
+    except Exception as e:
+        raise RuntimeError("missing_dep") from e
+    payload: bytes = msgpack.packb(data, use_bin_type=True)
+    sys.stdout.buffer.write(struct.pack(">I", len(payload)) + payload)
+    sys.stdout.buffer.flush()
@@ -1,26 +1,39 @@
 from __future__ import annotations
 
-import threading
+import asyncio
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 import metrics
-from registry import get_tool
+from executor import Cancelled, Overloaded, ToolExecutor
+from registry import get_tool, load_tool
+from scheduler import PRIORITIES, InFlight, ToolScheduler
+from settings import TOOL_CACHE_MAX_ENTRIES, TOOL_POOL_WORKERS, TOOL_PROCESS_WORKERS
+from state_backend import get_backend
+from tool_cache import ToolCache
+from validation import describe
 
-# token bucket: name -> {"tokens": float, "last": float}
-_RATE_LIMITS: Dict[str, Dict[str, float]] = {}
+# GCRA bucket per tool name; shared between processes with STATE_BACKEND=sqlite
+_STATE = get_backend()
+_RATE_LIMITER = _STATE.rate_limiter("tools", 10_000)
+# bounded thread pool per safety class, bulkhead per tool, warm process pool
+EXECUTOR = ToolExecutor(TOOL_POOL_WORKERS, TOOL_PROCESS_WORKERS)
+# priority/deadline queue per executor pool, dedup of identical calls
+SCHEDULER = ToolScheduler(EXECUTOR.workers_per_class, EXECUTOR.process_workers)
+# results of tools registered with cache metadata
+TOOL_CACHE = ToolCache(TOOL_CACHE_MAX_ENTRIES)
 
 Envelope = Dict[str, Any]
 
 
-def dispatch(
-    request: Dict[str, Any], *, request_id: str, safe_mode: bool = False
-) -> Envelope:
-    """Dispatch a tool call described by request."""
-
-    name = request.get("name")
-    args = request.get("args", {}) or {}
-    tool = get_tool(name)
+def _admit(
+    name: str | None,
+    tool: Dict[str, Any] | None,
+    args: Any,
+    safe_mode: bool,
+    start: float,
+) -> Envelope | None:
+    """Return an error envelope if the call may not run, else ``None``."""
     if tool is None:
         return {
             "kind": "error",
@@ -29,7 +42,6 @@ def dispatch(
             "hint": "",
         }
 
-    start = time.time()
     if safe_mode and not tool["enabled_in_safe_mode"]:
         metrics.record_policy_block("safe_mode")
         metrics.record_tool_call(
@@ -42,16 +54,24 @@ def dispatch(
             "hint": "",
         }
 
-    now = time.time()
+    validate = tool.get("validate")
+    if validate is not None:
+        problems = validate(args)
+        if problems:
+            metrics.record_tool_call(
+                name or "", "error", int((time.time() - start) * 1000)
+            )
+            return {
+                "kind": "error",
+                "code": "bad_args",
+                "message": describe(problems),
+                "hint": "see system.toolspec for the argument schema",
+                "errors": problems,
+            }
+
     rate = tool["rate_limit_per_min"]
     if rate:
-        bucket = _RATE_LIMITS.setdefault(
-            name, {"tokens": float(rate), "last": now}
-        )
-        elapsed = now - bucket["last"]
-        bucket["tokens"] = min(float(rate), bucket["tokens"] + elapsed * (rate / 60.0))
-        bucket["last"] = now
-        if bucket["tokens"] < 1.0:
+        if _RATE_LIMITER.check(name, rate) > 0:
             metrics.record_tool_call(
                 name or "", "rate_limit", int((time.time() - start) * 1000)
             )
@@ -62,28 +82,14 @@ def dispatch(
                 "message": "rate limit exceeded",
                 "hint": "",
             }
-        bucket["tokens"] -= 1.0
+    return None
 
-    result: Any | None = None
-    err: tuple[str, str] | None = None
 
-    def target() -> None:
-        nonlocal result, err
-        try:
-            result = tool["func"](**args)
-        except TypeError as e:
-            err = ("bad_args", str(e))
-        except ValueError as e:
-            err = ("bad_args", str(e))
-        except Exception as e:  # pragma: no cover - defensive
-            err = ("tool_error", str(e))
-
-    thread = threading.Thread(target=target)
-    thread.daemon = True
-    thread.start()
-    thread.join(tool["timeout_ms"] / 1000)
+def _failure(name: str | None, exc: Exception, start: float) -> Envelope:
+    """Map an exception raised while running a tool to an error envelope."""
     elapsed_ms = int((time.time() - start) * 1000)
-    if thread.is_alive():
+    # a tool that notices its own deadline raises Cancelled
+    if isinstance(exc, (TimeoutError, Cancelled)):
         metrics.record_tool_call(name or "", "timeout", elapsed_ms)
         return {
             "kind": "error",
@@ -92,13 +98,239 @@ def dispatch(
             "hint": "",
             "elapsed_ms": elapsed_ms,
         }
-    if err is not None:
-        code, msg = err
-        code = code or "internal"
-        metrics.record_tool_call(name or "", "error", elapsed_ms)
-        return {"kind": "error", "code": code, "message": msg, "hint": ""}
+    if isinstance(exc, Overloaded):
+        metrics.record_tool_call(name or "", "overloaded", elapsed_ms)
+        return {
+            "kind": "error",
+            "code": "overloaded",
+            "message": "too many concurrent calls",
+            "hint": "retry later",
+        }
+    err: Tuple[str, str]
+    if isinstance(exc, ImportError):
+        err = ("missing_dep", str(exc))
+    elif isinstance(exc, (TypeError, ValueError)):
+        err = ("bad_args", str(exc))
+    else:  # pragma: no cover - defensive
+        err = ("tool_error", str(exc))
+    code, msg = err
+    code = code or "internal"
+    metrics.record_tool_call(name or "", "error", elapsed_ms)
+    return {"kind": "error", "code": code, "message": msg, "hint": ""}
 
-    metrics.record_tool_call(name or "", "ok", elapsed_ms)
+
+def _success(name: str | None, result: Any, start: float) -> Envelope:
+    metrics.record_tool_call(name or "", "ok", int((time.time() - start) * 1000))
     if isinstance(result, dict) and "kind" in result:
         return result
     return {"kind": "ok", "result": result}
+
+
+def _schedule(
+    name: str | None,
+    tool: Dict[str, Any],
+    priority: str | None,
+    deadline: float | None,
+) -> Tuple[int, float] | Envelope:
+    """Return ``(rank, monotonic deadline)`` for a call, or an error envelope.
+
+    ``deadline`` is an absolute Unix time set by the caller; the call must
+    finish by the earlier of it and the tool's own ``timeout_ms``.
+    """
+    rank = PRIORITIES.get(priority or "default")
+    if rank is None:
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": f"unknown priority {priority!r}",
+            "hint": "use one of: " + ", ".join(PRIORITIES),
+        }
+    now = time.monotonic()
+    due = now + tool["timeout_ms"] / 1000
+    if deadline is not None:
+        due = min(due, now + (deadline - time.time()))
+        if due <= now:
+            metrics.record_tool_call(name or "", "timeout", 0)
+            return {
+                "kind": "error",
+                "code": "timeout",
+                "message": "request deadline already passed",
+                "hint": "",
+                "elapsed_ms": 0,
+            }
+    return rank, due
+
+
+def _execute(
+    name: str | None,
+    tool: Dict[str, Any],
+    args: Dict[str, Any],
+    rank: int,
+    due: float,
+    start: float,
+) -> Envelope:
+    try:
+        with SCHEDULER.slot(tool, rank, due):
+            result = EXECUTOR.run(tool, args, max(0.0, due - time.monotonic()))
+    except Exception as e:
+        return _failure(name, e, start)
+    return _success(name, result, start)
+
+
+async def _execute_async(
+    name: str | None,
+    tool: Dict[str, Any],
+    args: Dict[str, Any],
+    rank: int,
+    due: float,
+    start: float,
+) -> Envelope:
+    try:
+        async with SCHEDULER.slot_async(tool, rank, due):
+            result = await EXECUTOR.run_async(
+                tool, args, max(0.0, due - time.monotonic())
+            )
+    except Exception as e:
+        return _failure(name, e, start)
+    return _success(name, result, start)
+
+
+def _shared_error(exc: BaseException) -> Exception:
+    # followers of a cancelled leader must not be cancelled themselves
+    return exc if isinstance(exc, Exception) else RuntimeError("shared call aborted")
+
+
+def dispatch(
+    request: Dict[str, Any],
+    *,
+    request_id: str,
+    safe_mode: bool = False,
+    priority: str | None = None,
+    deadline: float | None = None,
+) -> Envelope:
+    """Dispatch a tool call described by request.
+
+    ``priority`` is one of :data:`scheduler.PRIORITIES` and orders calls
+    waiting for a busy pool; ``deadline`` is an absolute Unix time after
+    which the call is abandoned. Identical concurrent calls of tools
+    registered with ``coalesce`` share one execution.
+    """
+
+    name = request.get("name")
+    args = request.get("args", {}) or {}
+    tool = get_tool(name)
+    start = time.time()
+    denied = _admit(name, tool, args, safe_mode, start)
+    if denied is not None:
+        return denied
+    assert tool is not None
+    plan = _schedule(name, tool, priority, deadline)
+    if isinstance(plan, dict):
+        return plan
+    rank, due = plan
+    try:
+        load_tool(tool)
+    except ImportError as e:
+        return _failure(name, e, start)
+    key = TOOL_CACHE.key(tool, args)
+    if key is not None:
+        cached = TOOL_CACHE.get(tool, args, key)
+        if cached is not None:
+            return cached
+        stamp = TOOL_CACHE.stamp(tool, args)
+    if not tool.get("coalesce"):
+        env = _execute(name, tool, args, rank, due, start)
+    else:
+        flight_key = InFlight.key(tool["name"], args)
+        fut, leader = SCHEDULER.flights.join(flight_key)
+        if not leader:
+            metrics.record_coalesce(tool["name"], "coalesced")
+            try:
+                return dict(fut.result(max(0.0, due - time.monotonic())))
+            except Exception as e:
+                return _failure(name, e, start)
+        metrics.record_coalesce(tool["name"], "executed")
+        try:
+            env = _execute(name, tool, args, rank, due, start)
+        except BaseException as e:
+            SCHEDULER.flights.land(flight_key, fut, error=_shared_error(e))
+            raise
+        SCHEDULER.flights.land(flight_key, fut, env)
+    if key is not None:
+        TOOL_CACHE.put(tool, key, env, stamp)
+    return env
+
+
+async def dispatch_async(
+    request: Dict[str, Any],
+    *,
+    request_id: str,
+    safe_mode: bool = False,
+    priority: str | None = None,
+    deadline: float | None = None,
+) -> Envelope:
+    """Like :func:`dispatch`, without blocking the running event loop.
+
+    ``async def`` tools run on the loop under ``asyncio.timeout``; sync tools
+    run on the executor's pools while the caller awaits.
+    """
+
+    name = request.get("name")
+    args = request.get("args", {}) or {}
+    tool = get_tool(name)
+    start = time.time()
+    if _STATE.shared:
+        # shared buckets take a SQLite write lock; keep it off the event loop
+        denied = await asyncio.to_thread(_admit, name, tool, args, safe_mode, start)
+    else:
+        denied = _admit(name, tool, args, safe_mode, start)
+    if denied is not None:
+        return denied
+    assert tool is not None
+    plan = _schedule(name, tool, priority, deadline)
+    if isinstance(plan, dict):
+        return plan
+    rank, due = plan
+    try:
+        if tool.get("func") is None:
+            # first call imports the implementing module: keep it off the loop
+            await asyncio.to_thread(load_tool, tool)
+    except ImportError as e:
+        return _failure(name, e, start)
+    key = TOOL_CACHE.key(tool, args)
+    if key is not None:
+        # validators stat files or revalidate over HTTP: keep that off the loop
+        cached = await asyncio.to_thread(TOOL_CACHE.get, tool, args, key)
+        if cached is not None:
+            return cached
+        stamp = await asyncio.to_thread(TOOL_CACHE.stamp, tool, args)
+    if not tool.get("coalesce"):
+        env = await _execute_async(name, tool, args, rank, due, start)
+    else:
+        flight_key = InFlight.key(tool["name"], args)
+        fut, leader = SCHEDULER.flights.join(flight_key)
+        if not leader:
+            metrics.record_coalesce(tool["name"], "coalesced")
+            try:
+                shared = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(fut)),
+                    max(0.0, due - time.monotonic()),
+                )
+            except asyncio.TimeoutError:
+                return _failure(name, TimeoutError("tool timed out"), start)
+            except Exception as e:
+                return _failure(name, e, start)
+            return dict(shared)
+        metrics.record_coalesce(tool["name"], "executed")
+        try:
+            env = await _execute_async(name, tool, args, rank, due, start)
+        except BaseException as e:
+            SCHEDULER.flights.land(flight_key, fut, error=_shared_error(e))
+            raise
+        SCHEDULER.flights.land(flight_key, fut, env)
+    if key is not None:
+        TOOL_CACHE.put(tool, key, env, stamp)
+    return env
+
+
+__all__ = ["EXECUTOR", "SCHEDULER", "TOOL_CACHE", "dispatch", "dispatch_async"]
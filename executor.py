@@ -0,0 +1,540 @@
+"""Bounded, cancellable execution of tool calls.
+
+Tool functions run on a reusable :class:`~concurrent.futures.ThreadPoolExecutor`
+per safety class instead of one new thread per call. A per-tool semaphore
+(the *bulkhead*, ``max_concurrency`` in the registry) keeps one slow tool from
+taking over its pool. Timeouts cancel a :class:`CancelToken` that tools check
+cooperatively with :func:`check_cancelled`; a call still running after its
+timeout is counted as *leaked* until it returns.
+
+Tools registered with ``executor="process"`` run in a warm
+:class:`~concurrent.futures.ProcessPoolExecutor`; string and bytes arguments
+and results of at least :data:`SHM_MIN_BYTES` travel through
+:mod:`multiprocessing.shared_memory` blocks instead of being pickled through
+the pool's pipe. Base64 arguments named in a tool's ``binary_args`` (image
+payloads) are decoded first, so the worker gets the raw bytes, a quarter
+smaller, and does not decode them again. Tools registered with
+``executor="isolated"`` run in a fresh
+child process that is terminated on timeout.
+:meth:`ToolExecutor.run_async` runs ``async def`` tools on the caller's event
+loop and awaits sync tools without blocking it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import contextvars
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, NamedTuple
+
+import metrics
+
+
+class Cancelled(Exception):
+    """Raised by :meth:`CancelToken.check` once the call was cancelled."""
+
+
+class Overloaded(Exception):
+    """Raised when a tool's bulkhead has no free slot."""
+
+
+class CancelToken:
+    """Cancellation flag with an optional monotonic deadline."""
+
+    __slots__ = ("deadline", "_event", "finished", "leaked")
+
+    def __init__(self, deadline: float | None = None) -> None:
+        self.deadline = deadline
+        self._event = threading.Event()
+        self.finished = False
+        self.leaked = False
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise Cancelled("tool call cancelled")
+
+    def remaining(self, default: float) -> float:
+        """Seconds left before the deadline, capped at ``default``.
+
+        Raises :class:`Cancelled` once the deadline has passed, so the result
+        can always be used as a ``timeout=`` argument.
+        """
+        self.check()
+        if self.deadline is None:
+            return default
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            raise Cancelled("tool call deadline passed")
+        return min(default, left)
+
+
+_NEVER = CancelToken()
+_CURRENT: contextvars.ContextVar[CancelToken] = contextvars.ContextVar(
+    "tool_cancel_token", default=_NEVER
+)
+
+
+def current_token() -> CancelToken:
+    """Token of the tool call running in this context."""
+    return _CURRENT.get()
+
+
+def check_cancelled() -> None:
+    """Raise :class:`Cancelled` if the current tool call was cancelled."""
+    _CURRENT.get().check()
+
+
+def _process_entry(
+    conn: Connection, func: Callable[..., Any], args: Dict[str, Any]
+) -> None:
+    try:
+        conn.send(("ok", func(**args)))
+    except BaseException as e:  # pragma: no cover - runs in the child
+        try:
+            conn.send(("error", e))
+        except Exception:
+            conn.send(("error", RuntimeError(repr(e))))
+    finally:
+        conn.close()
+
+
+# smaller payloads are cheaper to pickle than to map
+SHM_MIN_BYTES = 64 * 1024
+
+
+class ShmRef(NamedTuple):
+    """Handle to a payload stored in a shared-memory block."""
+
+    name: str
+    size: int
+    text: bool
+
+
+def _pack(obj: Any, blocks: List[shared_memory.SharedMemory]) -> Any:
+    """Move large str/bytes values of ``obj`` into shared memory."""
+    if isinstance(obj, (str, bytes)) and len(obj) >= SHM_MIN_BYTES:
+        text = isinstance(obj, str)
+        data = obj.encode("utf-8") if isinstance(obj, str) else obj
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        shm.buf[: len(data)] = data
+        blocks.append(shm)
+        return ShmRef(shm.name, len(data), text)
+    if isinstance(obj, dict):
+        return {k: _pack(v, blocks) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_pack(v, blocks) for v in obj]
+    return obj
+
+
+def _unpack(obj: Any, unlink: bool) -> Any:
+    """Inverse of :func:`_pack`; ``unlink`` frees blocks made by the peer."""
+    if isinstance(obj, ShmRef):
+        shm = shared_memory.SharedMemory(name=obj.name)
+        try:
+            data = bytes(shm.buf[: obj.size])
+        finally:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        return data.decode("utf-8") if obj.text else data
+    if isinstance(obj, dict):
+        return {k: _unpack(v, unlink) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_unpack(v, unlink) for v in obj]
+    return obj
+
+
+def _decode_binary(tool: Dict[str, Any], args: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace base64 ``binary_args`` of ``tool`` by their decoded bytes.
+
+    ``binary_args`` maps an argument to the parameter taking raw bytes; the
+    base64 argument is passed as ``None``. Undecodable values are left for
+    the tool to report.
+    """
+    fields: Dict[str, str] | None = tool.get("binary_args")
+    if not fields:
+        return args
+    out = dict(args)
+    for name, target in fields.items():
+        value = out.get(name)
+        if not isinstance(value, str):
+            continue
+        try:
+            out[target] = base64.b64decode(value)
+        except binascii.Error:
+            continue
+        out[name] = None
+    return out
+
+
+def _pool_entry(func: Callable[..., Any], args: Dict[str, Any]) -> Any:
+    result = func(**_unpack(args, unlink=False))
+    blocks: List[shared_memory.SharedMemory] = []
+    packed = _pack(result, blocks)
+    for shm in blocks:
+        # the parent unlinks after copying
+        shm.close()
+    return packed
+
+
+def _warm() -> None:
+    pass
+
+
+def default_process_workers() -> int:
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class ToolExecutor:
+    """Run registry tools on bounded pools with bulkheads and timeouts."""
+
+    def __init__(self, workers_per_class: int = 8, process_workers: int = 0) -> None:
+        self.workers_per_class = max(1, workers_per_class)
+        self.process_workers = process_workers or default_process_workers()
+        self._lock = threading.Lock()
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._process_pool: ProcessPoolExecutor | None = None
+        self._bulkheads: Dict[tuple[str, int], threading.BoundedSemaphore] = {}
+        self.live = 0
+        self.leaked = 0
+        self.processes = 0
+        self.rejected = 0
+
+    def _pool(self, safety: str) -> ThreadPoolExecutor:
+        with self._lock:
+            pool = self._pools.get(safety)
+            if pool is None:
+                pool = self._pools[safety] = ThreadPoolExecutor(
+                    self.workers_per_class, thread_name_prefix=f"tool-{safety}"
+                )
+            return pool
+
+    def _processes(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    self.process_workers, mp_context=mp.get_context()
+                )
+                # start the workers now rather than on the first calls
+                for _ in range(self.process_workers):
+                    self._process_pool.submit(_warm)
+            return self._process_pool
+
+    def _bulkhead(self, tool: Dict[str, Any]) -> threading.BoundedSemaphore:
+        size = tool.get("max_concurrency") or self.workers_per_class
+        key = (tool["name"], size)
+        with self._lock:
+            sem = self._bulkheads.get(key)
+            if sem is None:
+                sem = self._bulkheads[key] = threading.BoundedSemaphore(size)
+            return sem
+
+    def run(self, tool: Dict[str, Any], args: Dict[str, Any], timeout_s: float) -> Any:
+        """Return ``tool["func"](**args)``.
+
+        Raises :class:`Overloaded` when the bulkhead is full and
+        :class:`TimeoutError` after ``timeout_s``; other exceptions propagate
+        from the tool.
+        """
+        sem = self._bulkhead(tool)
+        if not sem.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            self.record_metrics()
+            raise Overloaded(tool["name"])
+        if tool.get("executor") == "isolated":
+            try:
+                return self._run_process(tool["func"], args, timeout_s)
+            finally:
+                sem.release()
+        if tool.get("executor") == "process":
+            fut, token, settle = self._submit_process(tool, args, timeout_s, sem)
+            try:
+                packed = fut.result(timeout_s)
+            except FutureTimeout:
+                return self._abandon_process(fut, token, settle)
+            except BrokenProcessPool:
+                settle()
+                self._reset_processes()
+                raise RuntimeError("tool process pool crashed") from None
+            except BaseException:
+                settle()
+                raise
+            settle()
+            return _unpack(packed, unlink=True)
+        fut, token = self._submit(tool, args, timeout_s, sem)
+        try:
+            return fut.result(timeout_s)
+        except FutureTimeout:
+            self._abandon(fut, token, sem)
+            raise TimeoutError("tool timed out") from None
+
+    async def run_async(
+        self, tool: Dict[str, Any], args: Dict[str, Any], timeout_s: float
+    ) -> Any:
+        """Awaitable :meth:`run` that never blocks the running loop."""
+        sem = self._bulkhead(tool)
+        if not sem.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            self.record_metrics()
+            raise Overloaded(tool["name"])
+        if tool.get("executor") == "isolated":
+            try:
+                return await asyncio.to_thread(
+                    self._run_process, tool["func"], args, timeout_s
+                )
+            finally:
+                sem.release()
+        if tool.get("executor") == "process":
+            fut, token, settle = self._submit_process(tool, args, timeout_s, sem)
+            try:
+                packed = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(fut)), timeout_s
+                )
+            except asyncio.TimeoutError:
+                return self._abandon_process(fut, token, settle)
+            except BrokenProcessPool:
+                settle()
+                self._reset_processes()
+                raise RuntimeError("tool process pool crashed") from None
+            except BaseException:
+                settle()
+                raise
+            settle()
+            return _unpack(packed, unlink=True)
+        if tool.get("is_async"):
+            token = CancelToken(time.monotonic() + timeout_s)
+            reset = _CURRENT.set(token)
+            with self._lock:
+                self.live += 1
+            try:
+                async with asyncio.timeout(timeout_s):
+                    return await tool["func"](**args)
+            except asyncio.TimeoutError:
+                raise TimeoutError("tool timed out") from None
+            finally:
+                token.cancel()
+                _CURRENT.reset(reset)
+                with self._lock:
+                    self.live -= 1
+                sem.release()
+        fut, token = self._submit(tool, args, timeout_s, sem)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), timeout_s)
+        except asyncio.TimeoutError:
+            self._abandon(fut, token, sem)
+            raise TimeoutError("tool timed out") from None
+
+    def _submit(
+        self,
+        tool: Dict[str, Any],
+        args: Dict[str, Any],
+        timeout_s: float,
+        sem: threading.BoundedSemaphore,
+    ) -> tuple[Future[Any], CancelToken]:
+        token = CancelToken(time.monotonic() + timeout_s)
+        call: Callable[..., Any] = tool["func"]
+        if tool.get("is_async"):
+            coro_func = call
+
+            def call(**kw: Any) -> Any:
+                # sync dispatch of an async tool: run it on a private loop
+                return asyncio.run(coro_func(**kw))
+
+        fut = self._pool(tool.get("safety", "")).submit(
+            contextvars.copy_context().run, self._call, call, args, token, sem
+        )
+        return fut, token
+
+    def _abandon(
+        self, fut: Future[Any], token: CancelToken, sem: threading.BoundedSemaphore
+    ) -> None:
+        token.cancel()
+        if fut.cancel():
+            # never started: _call will not release the slot
+            sem.release()
+            return
+        with self._lock:
+            if not token.finished:
+                token.leaked = True
+                self.leaked += 1
+        self.record_metrics()
+
+    def _submit_process(
+        self,
+        tool: Dict[str, Any],
+        args: Dict[str, Any],
+        timeout_s: float,
+        sem: threading.BoundedSemaphore,
+    ) -> tuple[Future[Any], CancelToken, Callable[[], None]]:
+        """Submit to the process pool; call the returned ``settle`` once the
+        caller has the outcome. Abandoned calls settle when they finish."""
+        token = CancelToken(time.monotonic() + timeout_s)
+        blocks: List[shared_memory.SharedMemory] = []
+        try:
+            packed = _pack(_decode_binary(tool, args), blocks)
+            fut = self._processes().submit(_pool_entry, tool["func"], packed)
+        except BaseException:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+            sem.release()
+            raise
+        with self._lock:
+            self.live += 1
+        settled = False
+
+        def settle() -> None:
+            nonlocal settled
+            with self._lock:
+                if settled:
+                    return
+                settled = True
+                self.live -= 1
+            sem.release()
+
+        def done(f: Future[Any]) -> None:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+            with self._lock:
+                token.finished = True
+                leaked = token.leaked
+                if leaked:
+                    self.leaked -= 1
+            if leaked:
+                settle()
+                if not f.cancelled() and f.exception() is None:
+                    # nobody will read the result: free its blocks
+                    _unpack(f.result(), unlink=True)
+
+        fut.add_done_callback(done)
+        return fut, token, settle
+
+    def _abandon_process(
+        self, fut: Future[Any], token: CancelToken, settle: Callable[[], None]
+    ) -> Any:
+        """Give up on a pool task; its worker cannot be interrupted."""
+        token.cancel()
+        with self._lock:
+            if not token.finished:
+                token.leaked = True
+                self.leaked += 1
+        if not token.leaked:
+            # finished while we were timing out
+            try:
+                return _unpack(fut.result(), unlink=True)
+            finally:
+                settle()
+        fut.cancel()
+        self.record_metrics()
+        raise TimeoutError("tool timed out")
+
+    def _reset_processes(self) -> None:
+        with self._lock:
+            pool, self._process_pool = self._process_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _call(
+        self,
+        func: Callable[..., Any],
+        args: Dict[str, Any],
+        token: CancelToken,
+        sem: threading.BoundedSemaphore,
+    ) -> Any:
+        _CURRENT.set(token)
+        with self._lock:
+            self.live += 1
+        try:
+            return func(**args)
+        finally:
+            with self._lock:
+                self.live -= 1
+                token.finished = True
+                if token.leaked:
+                    self.leaked -= 1
+            sem.release()
+
+    def _run_process(
+        self, func: Callable[..., Any], args: Dict[str, Any], timeout_s: float
+    ) -> Any:
+        ctx = mp.get_context()
+        recv, send = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_process_entry, args=(send, func, args), daemon=True)
+        with self._lock:
+            self.processes += 1
+        try:
+            proc.start()
+            send.close()
+            if not recv.poll(timeout_s):
+                proc.terminate()
+                raise TimeoutError("tool timed out")
+            try:
+                status, value = recv.recv()
+            except EOFError:
+                raise RuntimeError("tool process exited without a result") from None
+            if status == "error":
+                raise value
+            return value
+        finally:
+            recv.close()
+            proc.join(1.0)
+            if proc.is_alive():  # pragma: no cover - terminate() ignored
+                proc.kill()
+                proc.join()
+            with self._lock:
+                self.processes -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "live": self.live,
+                "leaked": self.leaked,
+                "processes": self.processes,
+                "pools": len(self._pools),
+                "bulkhead_rejected_total": self.rejected,
+            }
+
+    def record_metrics(self) -> None:
+        for key, value in self.stats().items():
+            metrics.record_gauge("tool_workers", value, label=key)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._reset_processes()
+
+
+__all__ = [
+    "Cancelled",
+    "CancelToken",
+    "Overloaded",
+    "SHM_MIN_BYTES",
+    "ShmRef",
+    "ToolExecutor",
+    "check_cancelled",
+    "current_token",
+]
@@ -0,0 +1,193 @@
+"""Shared hover loop fanning change-only samples out to many subscribers.
+
+:class:`HoverHub` runs one background thread that samples ``describe`` with a
+:class:`hover_watch.TickScheduler` while at least one subscriber is attached.
+A sample is published only when :func:`hover_watch.change_key` changes.
+Each :class:`Subscriber` keeps just the latest unsent sample, so a slow
+consumer gets coalesced updates instead of a growing queue, and may cap its
+own delivery rate with ``max_hz``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Set
+
+import metrics
+from hover_watch import DeltaEncoder, TickScheduler, change_key
+from logger import get_logger
+
+
+class Subscriber:
+    """Latest-value mailbox for one stream client on an asyncio loop."""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        *,
+        max_hz: float | None = None,
+        delta: bool = False,
+    ) -> None:
+        self._loop = loop
+        self._event = asyncio.Event()
+        self._lock = threading.Lock()
+        self._latest: Dict[str, Any] | None = None
+        self._interval = 1.0 / max_hz if max_hz and max_hz > 0 else 0.0
+        self._next_send = 0.0
+        self._encoder = DeltaEncoder() if delta else None
+        self.sent = 0
+        self.coalesced = 0
+
+    def offer(self, info: Dict[str, Any]) -> None:
+        """Replace the pending sample; safe to call from any thread."""
+        with self._lock:
+            if self._latest is not None:
+                self.coalesced += 1
+            self._latest = info
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:  # pragma: no cover - loop already closed
+            pass
+
+    def _take(self) -> Dict[str, Any] | None:
+        with self._lock:
+            info, self._latest = self._latest, None
+        return info
+
+    async def next(self, timeout: float | None = None) -> Dict[str, Any] | None:
+        """Return the next record to send or ``None`` after ``timeout``.
+
+        Records are full samples, or :class:`hover_watch.DeltaEncoder`
+        records when the subscriber was created with ``delta=True``.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            self._event.clear()
+            wait = self._next_send - self._loop.time()
+            if wait > 0:
+                # newer samples arriving meanwhile replace the pending one
+                await asyncio.sleep(wait)
+            info = self._take()
+            if info is None:
+                continue
+            self._next_send = self._loop.time() + self._interval
+            record = info if self._encoder is None else self._encoder.encode(info)
+            if record is None:
+                continue
+            self.sent += 1
+            return record
+
+
+class HoverHub:
+    """Run one ``describe`` loop for all subscribers of a process."""
+
+    def __init__(
+        self,
+        describe: Callable[[], Dict[str, Any]],
+        hz: float,
+        idle_hz: float | None = None,
+        *,
+        on_sample: Callable[[Dict[str, Any]], None] | None = None,
+    ) -> None:
+        self._describe = describe
+        self.hz = hz
+        self.idle_hz = idle_hz
+        self._on_sample = on_sample
+        self._lock = threading.Lock()
+        self._subs: Set[Subscriber] = set()
+        self._thread: threading.Thread | None = None
+        self._stop: threading.Event | None = None
+        self._last: Dict[str, Any] | None = None
+        self._scheduler: TickScheduler | None = None
+        self.samples = 0
+        self.published = 0
+
+    def subscribe(
+        self, *, max_hz: float | None = None, delta: bool = False
+    ) -> Subscriber:
+        """Attach a subscriber on the running loop, starting the loop if idle."""
+        sub = Subscriber(asyncio.get_running_loop(), max_hz=max_hz, delta=delta)
+        with self._lock:
+            self._subs.add(sub)
+            last = self._last
+            if self._thread is None or self._stop is None or self._stop.is_set():
+                self._start()
+        if last is not None:
+            sub.offer(last)
+        self._record_metrics()
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+            if not self._subs and self._stop is not None:
+                self._stop.set()
+                self._last = None
+        self._record_metrics()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def _start(self) -> None:
+        # caller holds self._lock
+        stop = threading.Event()
+        self._stop = stop
+        self._thread = threading.Thread(target=self._run, args=(stop,), daemon=True)
+        self._thread.start()
+
+    def _run(self, stop: threading.Event) -> None:
+        scheduler = TickScheduler(self.hz, self.idle_hz)
+        self._scheduler = scheduler
+        last_key: Any = object()
+        while not stop.is_set():
+            scheduler.wait()
+            if stop.is_set():
+                break
+            try:
+                info = self._describe()
+            except Exception as e:  # pragma: no cover - defensive
+                get_logger().warning(f"hover hub sample failed: {e}")
+                scheduler.feedback(False)
+                continue
+            self.samples += 1
+            key = change_key(info)
+            changed = key != last_key
+            scheduler.feedback(changed)
+            if not changed:
+                continue
+            last_key = key
+            if self._on_sample is not None:
+                self._on_sample(info)
+            with self._lock:
+                if stop.is_set():
+                    break
+                self._last = info
+                subs = list(self._subs)
+            self.published += 1
+            for sub in subs:
+                sub.offer(info)
+            self._record_metrics()
+
+    def _record_metrics(self) -> None:
+        with self._lock:
+            subs = list(self._subs)
+        data: Dict[str, float | int] = {
+            "subscribers": len(subs),
+            "samples_total": self.samples,
+            "published_total": self.published,
+            "coalesced": sum(s.coalesced for s in subs),
+        }
+        if self._scheduler is not None:
+            stats = self._scheduler.stats()
+            data["achieved_hz"] = stats["achieved_hz"]
+            data["skipped_ticks"] = stats["skipped_ticks"]
+        for key, value in data.items():
+            metrics.record_gauge("inspect_stream", value, label=key)
+
+
+__all__ = ["HoverHub", "Subscriber"]
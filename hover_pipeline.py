@@ -0,0 +1,342 @@
+"""Multi-process pipeline for ``hover_watch``.
+
+The calling thread produces frames (cursor, UIA and capture via
+:func:`resolve.capture_frame`). Each frame's OCR crop is copied into a
+shared-memory slot and handed to a pool of OCR worker processes. A single
+emitter thread collects the results, restores frame order and calls
+:func:`resolve.finish_frame` before handing the description to ``emit``.
+
+Only one frame per worker is in flight at a time. When every worker is busy
+the newest frame waits in a one-slot buffer and replaces (drops) any older
+waiting frame, so the pipeline never builds a backlog of stale frames.
+
+A frame whose OCR takes longer than ``job_timeout`` seconds, or whose worker
+dies, is given up: it is emitted in order with an ``extract_text`` error,
+the stuck worker is terminated and a replacement process is started.
+"""
+
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+import metrics
+import resolve
+from settings import CAPTURE_WIDTH, CAPTURE_HEIGHT
+
+_STATS_WINDOW = 100
+
+
+def default_workers() -> int:
+    """Leave one core to the producer and emitter."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def _ocr_worker(
+    jobs: Any,
+    results: Any,
+    slot_names: List[str],
+    ocr_func: Callable[..., Tuple[str, float]] | None,
+    current: Any,
+    index: int,
+) -> None:
+    from PIL import Image
+
+    if ocr_func is None:
+        from ocr import extract_text
+
+        ocr_func = extract_text
+    slots: Dict[int, shared_memory.SharedMemory] = {}
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            seq, slot, mode, size = job
+            # lets the parent tell which frame a dead or stuck worker held
+            current[index] = seq
+            start = time.time()
+            try:
+                shm = slots.get(slot)
+                if shm is None:
+                    shm = slots[slot] = shared_memory.SharedMemory(
+                        name=slot_names[slot]
+                    )
+                nbytes = size[0] * size[1] * len(mode)
+                img = Image.frombytes(mode, size, bytes(shm.buf[:nbytes]))
+                text, conf = ocr_func(img)
+                results.put((seq, slot, text, conf, None, start, time.time()))
+            except Exception as e:
+                results.put((seq, slot, "", 0.0, str(e), start, time.time()))
+            current[index] = -1
+    finally:
+        for shm in slots.values():
+            shm.close()
+
+
+class HoverPipeline:
+    """Run OCR for hover frames in ``workers`` processes.
+
+    Call :meth:`start`, feed frames from :func:`resolve.capture_frame` to
+    :meth:`submit` and finish with :meth:`stop`. ``emit`` is called from the
+    emitter thread, in submission order, with each finished description.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        emit: Callable[[Dict[str, Any]], None],
+        *,
+        ocr_func: Callable[..., Tuple[str, float]] | None = None,
+        slot_bytes: int | None = None,
+        job_timeout: float = 10.0,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.job_timeout = job_timeout
+        self._emit = emit
+        self._ocr_func = ocr_func
+        self._slot_bytes = slot_bytes or CAPTURE_WIDTH * CAPTURE_HEIGHT * 4
+        self._ctx = mp.get_context()
+        self._jobs: Any = None
+        self._results: Any = None
+        self._procs: List[Any] = []
+        # seq each worker is running, -1 when idle
+        self._current: Any = None
+        self._shms: List[shared_memory.SharedMemory] = []
+        self._free: Deque[int] = deque()
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._pending: Dict[str, Any] | None = None
+        self._frames: Dict[int, Dict[str, Any]] = {}
+        self._ready: Dict[int, Dict[str, Any]] = {}
+        # seq -> (slot, time dispatched) for frames handed to a worker
+        self._inflight: Dict[int, Tuple[int, float]] = {}
+        self._next_seq = 0
+        self._next_emit = 0
+        self._emitter: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._started_at = 0.0
+        self._counts = {
+            "produced": 0,
+            "dropped": 0,
+            "dispatched": 0,
+            "ocr_done": 0,
+            "abandoned": 0,
+            "emitted": 0,
+        }
+        self._ocr_ms: Deque[int] = deque(maxlen=_STATS_WINDOW)
+
+    def start(self) -> None:
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        for _ in range(self.workers):
+            self._shms.append(
+                shared_memory.SharedMemory(create=True, size=self._slot_bytes)
+            )
+        self._current = self._ctx.RawArray("q", [-1] * self.workers)
+        self._free.extend(range(self.workers))
+        for index in range(self.workers):
+            self._procs.append(self._start_worker(index))
+        self._started_at = time.monotonic()
+        self._emitter = threading.Thread(target=self._emit_loop, daemon=True)
+        self._emitter.start()
+
+    def _start_worker(self, index: int) -> Any:
+        proc = self._ctx.Process(
+            target=_ocr_worker,
+            args=(
+                self._jobs,
+                self._results,
+                [shm.name for shm in self._shms],
+                self._ocr_func,
+                self._current,
+                index,
+            ),
+            daemon=True,
+        )
+        proc.start()
+        return proc
+
+    def submit(self, frame: Dict[str, Any]) -> None:
+        """Queue ``frame`` for OCR, replacing any frame still waiting."""
+        with self._lock:
+            self._counts["produced"] += 1
+            if self._free:
+                self._dispatch(frame, self._free.popleft())
+            else:
+                if self._pending is not None:
+                    self._counts["dropped"] += 1
+                    metrics.record_fallback("hover_frame_dropped")
+                self._pending = frame
+        if self._ready:
+            self._flush()
+
+    def _dispatch(self, frame: Dict[str, Any], slot: int) -> None:
+        # caller holds self._lock
+        seq = self._next_seq
+        self._next_seq += 1
+        self._counts["dispatched"] += 1
+        img = frame.pop("image", None)
+        crop = frame.pop("crop", None)
+        if img is not None and crop is not None:
+            img = img.crop(crop)
+        if img is not None and getattr(img, "mode", None) not in ("RGB", "L"):
+            img = img.convert("RGB")
+        self._frames[seq] = frame
+        if img is None:
+            self._complete(seq, "", 0.0, "missing image", time.time(), time.time())
+            self._free.append(slot)
+            return
+        data = img.tobytes()
+        if len(data) > self._slot_bytes:
+            self._complete(seq, "", 0.0, "frame_too_large", time.time(), time.time())
+            self._free.append(slot)
+            return
+        self._shms[slot].buf[: len(data)] = data
+        self._inflight[seq] = (slot, time.monotonic())
+        self._jobs.put((seq, slot, img.mode, img.size))
+
+    def _complete(
+        self,
+        seq: int,
+        text: str,
+        conf: float,
+        error: str | None,
+        start: float,
+        end: float,
+    ) -> None:
+        # caller holds self._lock
+        frame = self._frames.pop(seq)
+        frame["ocr_text"] = text
+        frame["ocr_conf"] = conf
+        frame["timings"]["extract_text"] = {"start": start, "end": end}
+        if error is not None:
+            frame["errors"]["extract_text"] = error
+        self._ready[seq] = frame
+
+    def _release(self, slot: int) -> None:
+        # caller holds self._lock
+        if self._pending is not None and not self._stopping.is_set():
+            frame, self._pending = self._pending, None
+            self._dispatch(frame, slot)
+        else:
+            self._free.append(slot)
+
+    def _abandon(self, seq: int, error: str) -> None:
+        # caller holds self._lock
+        slot, _ = self._inflight.pop(seq)
+        self._counts["abandoned"] += 1
+        metrics.record_fallback("hover_ocr_abandoned")
+        now = time.time()
+        self._complete(seq, "", 0.0, error, now, now)
+        self._release(slot)
+
+    def _reap(self) -> None:
+        """Give up on frames past ``job_timeout`` or held by a dead worker."""
+        # caller holds self._lock
+        now = time.monotonic()
+        for seq, (_, since) in list(self._inflight.items()):
+            if now - since <= self.job_timeout:
+                continue
+            self._abandon(seq, "ocr_timeout")
+            for index, proc in enumerate(self._procs):
+                if self._current[index] == seq:
+                    proc.terminate()
+                    proc.join(1.0)
+        for index, proc in enumerate(self._procs):
+            if proc.exitcode is None:
+                continue
+            seq = self._current[index]
+            self._current[index] = -1
+            if seq in self._inflight:
+                self._abandon(seq, "ocr_worker_died")
+            if not self._stopping.is_set():
+                metrics.record_fallback("hover_ocr_worker_restarted")
+                self._procs[index] = self._start_worker(index)
+
+    def _emit_loop(self) -> None:
+        while not (self._stopping.is_set() and not self._frames):
+            try:
+                result = self._results.get(timeout=0.1)
+            except queue.Empty:
+                result = None
+            with self._lock:
+                if result is not None:
+                    seq, slot, text, conf, error, start, end = result
+                    # a frame already given up on had its slot reused
+                    if self._inflight.pop(seq, None) is not None:
+                        self._counts["ocr_done"] += 1
+                        self._ocr_ms.append(int((end - start) * 1000))
+                        self._complete(seq, text, conf, error, start, end)
+                        self._release(slot)
+                self._reap()
+            self._flush()
+
+    def _flush(self) -> None:
+        # a single emitter at a time keeps output in submission order
+        with self._emit_lock:
+            while True:
+                with self._lock:
+                    frame = self._ready.pop(self._next_emit, None)
+                    if frame is None:
+                        return
+                    self._next_emit += 1
+                self._emit(resolve.finish_frame(frame))
+                with self._lock:
+                    self._counts["emitted"] += 1
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Drain in-flight frames, stop the workers and release shared memory."""
+        self._stopping.set()
+        with self._lock:
+            self._pending = None
+        # frames completed without a worker (e.g. missing image) are emitted here
+        self._flush()
+        if self._emitter is not None:
+            self._emitter.join(timeout)
+        for _ in self._procs:
+            self._jobs.put(None)
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():  # pragma: no cover - defensive
+                proc.terminate()
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+        self._procs.clear()
+        self._shms.clear()
+
+    def stats(self) -> Dict[str, float | int]:
+        with self._lock:
+            counts = dict(self._counts)
+            in_flight = self.workers - len(self._free)
+            waiting = 1 if self._pending is not None else 0
+            reorder = len(self._ready)
+            ocr_ms = sorted(self._ocr_ms)
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        data: Dict[str, float | int] = {
+            "workers": self.workers,
+            "cpu_count": os.cpu_count() or 0,
+            "in_flight": in_flight,
+            "waiting": waiting,
+            "reorder_depth": reorder,
+            "ocr_ms_p50": ocr_ms[len(ocr_ms) // 2] if ocr_ms else 0,
+        }
+        for stage, count in counts.items():
+            data[f"{stage}_total"] = count
+            if stage not in ("dropped", "abandoned"):
+                data[f"{stage}_fps"] = round(count / elapsed, 3) if elapsed else 0.0
+        return data
+
+    def record_metrics(self) -> None:
+        for key, value in self.stats().items():
+            metrics.record_gauge("hover_pipeline", value, label=key)
+
+
+__all__ = ["HoverPipeline", "default_workers"]
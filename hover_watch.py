@@ -1,47 +1,338 @@
 import argparse
+import copy
 import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+import metrics
+import resolve
+from hover_pipeline import HoverPipeline, default_workers
 from resolve import describe_under_cursor
 from logger import setup, COMPONENT, get_logger
-from cli_helpers import emit_cli_json_line
-from settings import HOVER_WATCH_HZ, HOVER_WATCH_RUN_AS_ADMIN
+from cli_helpers import emit_cli_json_line, emit_cli_msgpack_frame
+from settings import HOVER_WATCH_HZ, HOVER_WATCH_IDLE_HZ, HOVER_WATCH_RUN_AS_ADMIN
+
+# Fraction of the current rate kept after each tick without changes
+IDLE_DECAY = 0.8
+_STATS_WINDOW = 50
+KEYFRAME_EVERY = 50
+# Per-tick telemetry left out of change-only records
+DELTA_DROP_FIELDS = ("timings",)
+
+
+class TickScheduler:
+    """Deadline based scheduler that adapts its rate to cursor activity.
+
+    Deadlines advance on a monotonic clock so processing time does not
+    accumulate as drift. While samples change the rate stays at ``hz``; when
+    nothing changes it decays by :data:`IDLE_DECAY` per tick down to
+    ``idle_hz``. Ticks missed by more than a full period are dropped instead
+    of being replayed as a burst.
+    """
+
+    def __init__(
+        self,
+        hz: float,
+        idle_hz: float | None = None,
+        *,
+        clock: Callable[[], float] | None = None,
+        sleep: Callable[[float], None] | None = None,
+    ) -> None:
+        self.max_hz = hz
+        floor = hz if idle_hz is None else idle_hz
+        self.idle_hz = min(floor, hz) if hz > 0 else 0.0
+        self.hz = hz
+        self.skipped = 0
+        self.ticks = 0
+        self._clock = clock or time.monotonic
+        self._sleep = sleep
+        self._deadline: float | None = None
+        self._wakeups: Deque[float] = deque(maxlen=_STATS_WINDOW)
+        self._jitter_ms: Deque[float] = deque(maxlen=_STATS_WINDOW)
+
+    @property
+    def period(self) -> float:
+        return 1.0 / self.hz if self.hz > 0 else 0.0
+
+    def feedback(self, changed: bool) -> None:
+        """Raise the rate after a change, otherwise decay toward the floor."""
+        if self.max_hz <= 0:
+            return
+        if changed:
+            self.hz = self.max_hz
+        else:
+            self.hz = max(self.idle_hz, self.hz * IDLE_DECAY)
+
+    def wait(self) -> None:
+        """Block until the next deadline, dropping ticks that were missed."""
+        now = self._clock()
+        period = self.period
+        if self._deadline is None or period == 0:
+            self._deadline = now
+        else:
+            self._deadline += period
+            late = now - self._deadline
+            if late >= period:
+                missed = int(late // period)
+                self.skipped += missed
+                self._deadline += missed * period
+            delay = self._deadline - now
+            if delay > 0:
+                (self._sleep or time.sleep)(delay)
+                now = self._clock()
+            self._jitter_ms.append(abs(now - self._deadline) * 1000)
+        self.ticks += 1
+        self._wakeups.append(now)
+
+    def stats(self) -> Dict[str, float | int]:
+        achieved = 0.0
+        if len(self._wakeups) >= 2:
+            span = self._wakeups[-1] - self._wakeups[0]
+            if span > 0:
+                achieved = (len(self._wakeups) - 1) / span
+        jitter = sorted(self._jitter_ms)
+        p95 = jitter[min(len(jitter) - 1, int(len(jitter) * 0.95))] if jitter else 0.0
+        return {
+            "target_hz": round(self.hz, 3),
+            "achieved_hz": round(achieved, 3),
+            "jitter_ms_p95": round(p95, 3),
+            "ticks": self.ticks,
+            "skipped_ticks": self.skipped,
+        }
+
+    def record_metrics(self) -> None:
+        for key, value in self.stats().items():
+            metrics.record_gauge("hover_watch", value, label=key)
+
+
+def _activity_key(info: Dict[str, Any]) -> Any:
+    cursor = info.get("cursor") or {}
+    return (cursor.get("x"), cursor.get("y"), info.get("control_id"))
+
+
+def change_key(info: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Return the fields whose change makes a sample worth emitting."""
+    element = info.get("element") or {}
+    text = info.get("text") or {}
+    bounds = element.get("bounds") if isinstance(element, dict) else None
+    if isinstance(bounds, dict):
+        bounds = tuple(sorted(bounds.items()))
+    return (info.get("control_id"), text.get("chosen"), bounds)
+
+
+def _pointer_token(key: Any) -> str:
+    """Escape one JSON Pointer (RFC 6901) path segment."""
+    return "/" + str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _pointer_parts(path: str) -> List[str]:
+    return [p.replace("~1", "/").replace("~0", "~") for p in path.split("/")[1:]]
+
+
+def _diff(
+    old: Dict[str, Any],
+    new: Dict[str, Any],
+    prefix: str,
+    changed: Dict[str, Any],
+    removed: List[str],
+) -> None:
+    for key, value in new.items():
+        path = prefix + _pointer_token(key)
+        if key not in old:
+            changed[path] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            _diff(old[key], value, path, changed, removed)
+        elif old[key] != value:
+            changed[path] = value
+    for key in old:
+        if key not in new:
+            removed.append(prefix + _pointer_token(key))
+
+
+class DeltaEncoder:
+    """Turn full ``describe_under_cursor`` samples into a change-only stream.
+
+    A record is produced only when :func:`change_key` differs from the last
+    emitted sample. Records are either ``{"seq", "type": "key", "data"}``
+    keyframes or ``{"seq", "type": "delta", "set", "unset"}`` where ``set``
+    maps JSON Pointer paths (``"/text/chosen"``, with ``~0``/``~1`` escapes
+    so keys may contain any character) to new values and ``unset`` lists
+    removed paths. A
+    keyframe is sent first and then every ``keyframe_every`` records so a
+    reader can join mid-stream; see :func:`apply_record`.
+    """
+
+    def __init__(self, keyframe_every: int = KEYFRAME_EVERY) -> None:
+        self.keyframe_every = max(1, keyframe_every)
+        self.seq = 0
+        self._prev: Dict[str, Any] | None = None
+        self._key: Tuple[Any, ...] | None = None
+        self._since_keyframe = 0
+
+    def force_keyframe(self) -> None:
+        self._since_keyframe = self.keyframe_every
+
+    def encode(self, info: Dict[str, Any]) -> Dict[str, Any] | None:
+        key = change_key(info)
+        if self._prev is not None and key == self._key:
+            metrics.record_enum("hover_watch_records", "suppressed")
+            return None
+        sample = {k: v for k, v in info.items() if k not in DELTA_DROP_FIELDS}
+        self.seq += 1
+        record: Dict[str, Any]
+        if self._prev is None or self._since_keyframe >= self.keyframe_every - 1:
+            record = {"seq": self.seq, "type": "key", "data": sample}
+            self._since_keyframe = 0
+        else:
+            changed: Dict[str, Any] = {}
+            removed: List[str] = []
+            _diff(self._prev, sample, "", changed, removed)
+            record = {"seq": self.seq, "type": "delta", "set": changed}
+            if removed:
+                record["unset"] = removed
+            self._since_keyframe += 1
+        metrics.record_enum("hover_watch_records", record["type"])
+        self._prev = sample
+        self._key = key
+        return record
+
+
+def apply_record(
+    state: Dict[str, Any] | None, record: Dict[str, Any]
+) -> Dict[str, Any] | None:
+    """Return the sample reconstructed from ``state`` and ``record``.
+
+    Deltas received before the first keyframe return ``None``.
+    """
+    if record.get("type") == "key":
+        return copy.deepcopy(record["data"])
+    if state is None:
+        return None
+    state = copy.deepcopy(state)
+    for path, value in record.get("set", {}).items():
+        *parents, leaf = _pointer_parts(path)
+        node = state
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    for path in record.get("unset", []):
+        *parents, leaf = _pointer_parts(path)
+        node = state
+        for part in parents:
+            node = node.get(part, {})
+        node.pop(leaf, None)
+    return state
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(
-        description="Poll describe_under_cursor at a fixed rate"
+        description="Poll describe_under_cursor with an adaptive rate"
     )
     parser.add_argument(
         "--hz",
         type=float,
         default=HOVER_WATCH_HZ,
-        help="polling frequency in Hertz",
+        help="polling frequency in Hertz while the cursor moves",
+    )
+    parser.add_argument(
+        "--idle-hz",
+        type=float,
+        default=HOVER_WATCH_IDLE_HZ,
+        help="lowest polling frequency reached while nothing changes",
+    )
+    parser.add_argument(
+        "--changes-only",
+        action="store_true",
+        help="emit delta records only when control, text or bounds change",
+    )
+    parser.add_argument(
+        "--keyframe-every",
+        type=int,
+        default=KEYFRAME_EVERY,
+        help="records between full keyframes in --changes-only mode",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("jsonl", "msgpack"),
+        default="jsonl",
+        help="output framing: JSON lines or length-prefixed msgpack",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="run OCR in a pool of worker processes",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=default_workers(),
+        help="OCR worker processes in --pipeline mode",
     )
     parser.add_argument("--jsonl", action="store_true", help="Enable JSONL logging")
     parser.add_argument(
         "--rate-limit-hz", type=float, default=None, help="max log frequency"
     )
     args = parser.parse_args()
+    emit = emit_cli_json_line
+    if args.format == "msgpack":
+        try:
+            import msgpack  # noqa: F401
+        except Exception:
+            parser.error("--format msgpack requires the msgpack package")
+        emit = emit_cli_msgpack_frame
     setup(enable=args.jsonl, jsonl=args.jsonl, rate_limit_hz=args.rate_limit_hz)
     COMPONENT.set("cli")
     logger = get_logger()
     logger.info(
         "hover_watch starting",
-        extra={"hz": args.hz, "run_as_admin": HOVER_WATCH_RUN_AS_ADMIN},
+        extra={
+            "hz": args.hz,
+            "idle_hz": args.idle_hz,
+            "run_as_admin": HOVER_WATCH_RUN_AS_ADMIN,
+        },
     )
     if HOVER_WATCH_RUN_AS_ADMIN:
         try:  # pragma: no cover - best effort
             logger.warning("run_as_admin requested but elevation not implemented")
         except Exception:
             logger.warning("run_as_admin requested but failed to elevate")
-    delay = 1.0 / args.hz if args.hz > 0 else 0
+    scheduler = TickScheduler(args.hz, args.idle_hz if args.idle_hz > 0 else None)
+    encoder = DeltaEncoder(args.keyframe_every) if args.changes_only else None
+
+    def sink(info: Dict[str, Any]) -> None:
+        if encoder is None:
+            emit(info)
+            return
+        record = encoder.encode(info)
+        if record is not None:
+            emit(record)
+
+    pipeline = HoverPipeline(args.workers, sink) if args.pipeline else None
+    last_key: Any = object()
     try:
+        if pipeline is not None:
+            pipeline.start()
         while True:
-            info = describe_under_cursor()
-            emit_cli_json_line(info)
-            if delay:
-                time.sleep(delay)
+            scheduler.wait()
+            if pipeline is None:
+                info = describe_under_cursor()
+                sink(info)
+            else:
+                info = resolve.capture_frame()
+                pipeline.submit(info)
+                pipeline.record_metrics()
+            key = _activity_key(info)
+            scheduler.feedback(key != last_key)
+            last_key = key
+            scheduler.record_metrics()
     except KeyboardInterrupt:
         pass
+    finally:
+        stats: Dict[str, Any] = scheduler.stats()
+        if pipeline is not None:
+            pipeline.stop()
+            stats.update(pipeline.stats())
+        logger.info("hover_watch stopped", extra=stats)
 
 
 if __name__ == "__main__":  # pragma: no cover
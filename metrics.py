@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from collections import Counter, deque
-from typing import Deque, Dict, Tuple
+from typing import Any, Deque, Dict, List, Tuple
 
 _WINDOW = 100
 
@@ -25,6 +25,10 @@ _tool_latency: Dict[str, Deque[int]] = {}
 _agent_tool_calls: Counter[Tuple[str, str]] = Counter()
 _agent_tool_latency: Dict[str, Deque[int]] = {}
 _agent_tool_name_total: Counter[str] = Counter()
+_coalesce: Counter[Tuple[str, str]] = Counter()
+_tool_cache: Counter[Tuple[str, str]] = Counter()
+_fs_cache: Counter[Tuple[str, str]] = Counter()
+_http: Counter[Tuple[str, str]] = Counter()
 
 
 def record_agent_turn(elapsed_ms: int) -> None:
@@ -75,6 +79,22 @@ def record_agent_tool_name(name: str) -> None:
     _agent_tool_name_total[name] += 1
 
 
+def record_coalesce(name: str, outcome: str) -> None:
+    _coalesce[(name, outcome)] += 1
+
+
+def record_tool_cache(name: str, outcome: str) -> None:
+    _tool_cache[(name, outcome)] += 1
+
+
+def record_fs_cache(kind: str, outcome: str) -> None:
+    _fs_cache[(kind, outcome)] += 1
+
+
+def record_http(kind: str, outcome: str) -> None:
+    _http[(kind, outcome)] += 1
+
+
 def record_request(route: str, status: int) -> None:
     global _rate_limited_total
     _route_total[route] += 1
@@ -129,6 +149,32 @@ def summary() -> Dict:
     agent_tool_calls: Dict[str, Dict[str, int]] = {}
     for (name, outcome), count in _agent_tool_calls.items():
         agent_tool_calls.setdefault(name, {})[outcome] = count
+    coalesce: Dict[str, Dict[str, int]] = {}
+    for (name, outcome), count in _coalesce.items():
+        coalesce.setdefault(name, {})[outcome] = count
+    tool_cache: Dict[str, Dict[str, int]] = {}
+    for (name, outcome), count in _tool_cache.items():
+        tool_cache.setdefault(name, {})[outcome] = count
+    tool_cache_hit_ratio = {
+        name: (c.get("hit", 0) + c.get("revalidated", 0)) / sum(c.values())
+        for name, c in tool_cache.items()
+    }
+    fs_cache: Dict[str, Dict[str, int]] = {}
+    for (kind, outcome), count in _fs_cache.items():
+        fs_cache.setdefault(kind, {})[outcome] = count
+    fs_cache_hit_ratio = {
+        kind: c.get("hit", 0) / sum(c.values()) for kind, c in fs_cache.items()
+    }
+    http: Dict[str, Dict[str, int]] = {}
+    for (kind, outcome), count in _http.items():
+        http.setdefault(kind, {})[outcome] = count
+    web_cache = http.get("cache", {})
+    http_cache_hit_ratio = (
+        (web_cache.get("hit", 0) + web_cache.get("revalidated", 0))
+        / sum(web_cache.values())
+        if web_cache
+        else None
+    )
     return {
         "latency_ms": latency,
         "agent_turn_ms": agent_turn,
@@ -146,9 +192,62 @@ def summary() -> Dict:
         "tool_calls_total": tool_calls,
         "agent_tool_latency_ms": agent_tool_latency,
         "tool_latency_ms": tool_latency,
+        "coalesce_total": coalesce,
+        "tool_cache_total": tool_cache,
+        "tool_cache_hit_ratio": tool_cache_hit_ratio,
+        "fs_cache_total": fs_cache,
+        "fs_cache_hit_ratio": fs_cache_hit_ratio,
+        "http_total": http,
+        "http_cache_hit_ratio": http_cache_hit_ratio,
     }
 
 
+# summary() keys holding counters that add up across processes
+_SUMMED_KEYS = (
+    "fallbacks",
+    "status_total",
+    "rate_limited_total",
+    "resets_total",
+    "enums",
+    "agent_policy_blocks_total",
+    "policy_blocked_total",
+    "agent_tool_uses_total",
+    "agent_tool_name_total",
+    "tool_calls_total",
+    "coalesce_total",
+    "tool_cache_total",
+    "fs_cache_total",
+    "http_total",
+)
+
+
+def _add(a: Any, b: Any) -> Any:
+    if isinstance(a, dict) and isinstance(b, dict):
+        out = dict(a)
+        for k, v in b.items():
+            out[k] = _add(out[k], v) if k in out else v
+        return out
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a + b
+    return a
+
+
+def merge_summaries(local: Dict, others: List[Dict]) -> Dict:
+    """Combine ``summary()`` outputs of several worker processes.
+
+    Counters are summed; latency percentiles, gauges and error rates stay
+    those of ``local``. ``workers`` reports how many summaries were merged.
+    """
+    merged = dict(local)
+    for other in others:
+        for key in _SUMMED_KEYS:
+            if key in other:
+                value = other[key]
+                merged[key] = _add(merged[key], value) if key in merged else value
+    merged["workers"] = 1 + len(others)
+    return merged
+
+
 def reset() -> None:
     for dq in _times.values():
         dq.clear()
@@ -166,3 +265,7 @@ def reset() -> None:
     _agent_tool_calls.clear()
     _agent_tool_latency.clear()
     _agent_tool_name_total.clear()
+    _coalesce.clear()
+    _tool_cache.clear()
+    _fs_cache.clear()
+    _http.clear()
@@ -0,0 +1,61 @@
+"""Per-user locations for caches and indexes that must not leak.
+
+The HTTP cache, the search index, tar sidecars and the shared API state hold
+page bodies, file contents and screen text. By default they live under
+``$XDG_CACHE_HOME/nuv2`` (``~/.cache/nuv2``), or ``%LOCALAPPDATA%\\nuv2\\Cache``
+on Windows, instead of the shared temp directory. Directories are created
+0700 and files 0600, and on POSIX an existing path owned by another user is
+refused rather than reused, so nobody else can read or pre-create it.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+
+APP_NAME = "nuv2"
+
+
+def user_cache_dir() -> str:
+    """Directory for this user's caches; not created here."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+        return os.path.join(base, APP_NAME, "Cache")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, APP_NAME)
+
+
+def _check_owner(path: str, st: os.stat_result, mode: int) -> None:
+    if os.name == "nt":
+        return
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by another user")
+    if stat.S_IMODE(st.st_mode) & 0o077:
+        os.chmod(path, mode)
+
+
+def private_dir(path: str) -> str:
+    """Create ``path`` (and parents) with mode 0700 and return it."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    _check_owner(path, os.stat(path), 0o700)
+    return path
+
+
+def private_file(path: str) -> str:
+    """Create ``path`` with mode 0600 if missing, e.g. before SQLite opens it.
+
+    A missing parent directory is created 0700.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(parent):
+        private_dir(parent)
+    flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0)
+    fd = os.open(path, flags, 0o600)
+    try:
+        _check_owner(path, os.fstat(fd), 0o600)
+    finally:
+        os.close(fd)
+    return path
+
+
+__all__ = ["private_dir", "private_file", "user_cache_dir"]
@@ -0,0 +1,112 @@
+"""GCRA rate limiting with a bounded client table.
+
+Each bucket stores a single float, its *theoretical arrival time* (TAT).
+A request at ``now`` for a limit of ``n`` per ``period`` seconds is allowed
+when ``max(tat, now) + period/n - period <= now``; the stored TAT then moves
+forward by one emission interval. This allows bursts of up to ``n`` requests
+and refills smoothly, with O(1) work per check. Buckets live in an LRU capped
+at ``max_clients`` entries so unseen clients cannot grow memory without bound.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+import metrics
+
+
+def gcra(
+    tat: float | None, now: float, limit: int, period: float
+) -> tuple[float, float]:
+    """Return ``(new_tat, wait)`` for one request against a stored ``tat``.
+
+    ``wait`` is 0.0 when the request is allowed, in which case ``new_tat`` is
+    the value to store; otherwise ``new_tat`` is the unchanged TAT.
+    """
+    if tat is None or tat < now:
+        tat = now
+    new_tat = tat + period / limit
+    allow_at = new_tat - period
+    if allow_at > now:
+        return tat, allow_at - now
+    return new_tat, 0.0
+
+
+class GCRALimiter:
+    """Per-key generic cell rate limiter."""
+
+    def __init__(
+        self,
+        max_clients: int = 10_000,
+        *,
+        period: float = 60.0,
+        clock: Callable[[], float] | None = None,
+    ) -> None:
+        self.max_clients = max(1, max_clients)
+        self.period = period
+        self._clock = clock
+        self._tat: OrderedDict[Hashable, float] = OrderedDict()
+        self.evicted = 0
+
+    def check(self, key: Hashable, limit: int) -> float:
+        """Consume one request for ``key``; return 0.0 or seconds to wait.
+
+        ``limit`` is the number of requests allowed per ``period`` and may
+        differ between calls (e.g. per route). A non-positive limit allows
+        nothing: the call is refused with a wait of one ``period``.
+        """
+        if limit <= 0:
+            return self.period
+        now = (self._clock or time.monotonic)()
+        new_tat, wait = gcra(self._tat.get(key), now, limit, self.period)
+        if wait > 0:
+            # a throttled client is still active; keep it away from eviction
+            self._tat.move_to_end(key)
+            return wait
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        if len(self._tat) > self.max_clients:
+            self._tat.popitem(last=False)
+            self.evicted += 1
+        return 0.0
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    def clear(self) -> None:
+        self._tat.clear()
+        self.evicted = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "clients": len(self._tat),
+            "max_clients": self.max_clients,
+            "evicted_total": self.evicted,
+        }
+
+    def record_metrics(self) -> None:
+        for key, value in self.stats().items():
+            metrics.record_gauge("rate_limit", value, label=key)
+
+
+def parse_route_limits(spec: str) -> Dict[str, int]:
+    """Parse ``"/snapshot=30,/v1/tools.call=120"`` into a path->limit map.
+
+    Malformed entries are ignored.
+    """
+    limits: Dict[str, int] = {}
+    for item in spec.split(","):
+        path, sep, value = item.partition("=")
+        path = path.strip()
+        if not sep or not path:
+            continue
+        try:
+            limits[path] = int(value)
+        except ValueError:
+            continue
+    return limits
+
+
+__all__ = ["GCRALimiter", "gcra", "parse_route_limits"]
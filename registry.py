@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import importlib
+import inspect
+import threading
 from typing import Any, Callable, Dict
 
+from validation import compile_args
+
 # Global registry mapping tool name to metadata and callable
 REGISTRY: Dict[str, Dict[str, Any]] = {}
+_LOAD_LOCK = threading.Lock()
 
 
 def register_tool(
@@ -15,9 +21,23 @@ def register_tool(
     timeout_ms: int,
     rate_limit_per_min: int,
     enabled_in_safe_mode: bool,
-    func: Callable[..., Any],
+    func: Callable[..., Any] | None = None,
+    target: str | None = None,
     schema: Dict[str, Any] | None = None,
+    max_concurrency: int | None = None,
+    executor: str = "thread",
+    binary_args: Dict[str, str] | None = None,
+    cache: Dict[str, Any] | None = None,
+    coalesce: bool | None = None,
 ) -> None:
+    """Register a tool implemented by ``func`` or, lazily, by ``target``.
+
+    ``target`` is a ``"module:function"`` path imported by :func:`load_tool`
+    on first dispatch. ``binary_args`` maps base64 arguments to the
+    parameter that takes them decoded; process-pool tools receive the bytes.
+    """
+    if func is None and target is None:
+        raise ValueError(f"tool {name!r} needs func or target")
     REGISTRY[name] = {
         "name": name,
         "version": version,
@@ -27,6 +47,16 @@ def register_tool(
         "rate_limit_per_min": rate_limit_per_min,
         "enabled_in_safe_mode": enabled_in_safe_mode,
         "func": func,
+        "target": target,
+        "max_concurrency": max_concurrency,
+        "executor": executor,
+        "binary_args": binary_args,
+        "is_async": func is not None and inspect.iscoroutinefunction(func),
+        "cache": cache,
+        # identical concurrent calls share one run; read-only tools by default
+        "coalesce": safety == "read" if coalesce is None else coalesce,
+        # compiled once here; run by the dispatcher before every call
+        "validate": compile_args(schema),
     }
     if schema is not None:
         REGISTRY[name]["schema"] = schema
@@ -36,6 +66,27 @@ def get_tool(name: str) -> Dict[str, Any] | None:
     return REGISTRY.get(name)
 
 
+def load_tool(tool: Dict[str, Any]) -> Callable[..., Any]:
+    """Return the tool's callable, importing its ``target`` module if needed.
+
+    Raises ``ImportError`` when the module or function cannot be loaded.
+    """
+    func: Callable[..., Any] | None = tool.get("func")
+    if func is not None:
+        return func
+    with _LOAD_LOCK:
+        func = tool.get("func")
+        if func is None:
+            module, _, attr = tool["target"].partition(":")
+            try:
+                func = getattr(importlib.import_module(module), attr)
+            except AttributeError:
+                raise ImportError(f"{module} has no tool {attr!r}") from None
+            tool["is_async"] = inspect.iscoroutinefunction(func)
+            tool["func"] = func
+    return func
+
+
 def register_alias(name: str, alias: str) -> None:
     if name in REGISTRY:
         REGISTRY[alias] = REGISTRY[name]
@@ -52,6 +103,7 @@ def violates_policy(tool: Dict[str, Any], safe_mode: bool) -> bool:
 __all__ = [
     "register_tool",
     "get_tool",
+    "load_tool",
     "register_alias",
     "clear",
     "violates_policy",
@@ -68,7 +68,15 @@ def _bounds_dict(b: Mapping[str, int | str]) -> Bounds:
     return bounds
 
 
-def describe_under_cursor(x: int | None = None, y: int | None = None) -> Dict[str, Any]:
+def capture_frame(x: int | None = None, y: int | None = None) -> Dict[str, Any]:
+    """Run the cursor, UIA and capture stages and return an intermediate frame.
+
+    The frame carries the captured image and the OCR crop so that
+    :func:`ocr_frame` can run separately (e.g. in a worker process) before
+    :func:`finish_frame` builds the final description. ``window_id`` and
+    ``control_id`` are already set, so callers can react to the hovered
+    control before OCR finishes.
+    """
     timings: Dict[str, Dict[str, float]] = {}
     errors: Dict[str, str] = {}
 
@@ -98,6 +106,7 @@ def describe_under_cursor(x: int | None = None, y: int | None = None) -> Dict[st
         errors["get_element_info"] = str(e)
         window, element, uia_text, uia_conf = {}, {}, "", 0.0
     timings["get_element_info"] = {"start": start, "end": time.time()}
+    window_id, control_id = _compute_ids(window, element)
 
     # capture_around
     start = time.time()
@@ -117,20 +126,42 @@ def describe_under_cursor(x: int | None = None, y: int | None = None) -> Dict[st
         region = (0, 0, 0, 0)
     timings["capture_around"] = {"start": start, "end": time.time()}
 
+    crop = None
+    if bounds is not None:
+        crop = (
+            max(0, bounds["left"] - region[0]),
+            max(0, bounds["top"] - region[1]),
+            max(0, min(region[2], bounds["right"]) - region[0]),
+            max(0, min(region[3], bounds["bottom"]) - region[1]),
+        )
+    return {
+        "cursor": pos,
+        "window": window,
+        "element": element,
+        "window_id": window_id,
+        "control_id": control_id,
+        "uia_text": uia_text,
+        "uia_conf": uia_conf,
+        "image": img,
+        "crop": crop,
+        "ocr_text": "",
+        "ocr_conf": 0.0,
+        "timings": timings,
+        "errors": errors,
+    }
+
+
+def ocr_frame(frame: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the OCR stage on ``frame`` in place and return it."""
+    timings = frame["timings"]
+    errors = frame["errors"]
+    img = frame.get("image")
     # extract_text
     start = time.time()
     log("extract_text.start", start)
     if img is not None:
         try:
-            crop = None
-            if bounds is not None:
-                crop = (
-                    max(0, bounds["left"] - region[0]),
-                    max(0, bounds["top"] - region[1]),
-                    max(0, min(region[2], bounds["right"]) - region[0]),
-                    max(0, min(region[3], bounds["bottom"]) - region[1]),
-                )
-            ocr_text, ocr_conf = extract_text(img, region=crop)
+            ocr_text, ocr_conf = extract_text(img, region=frame.get("crop"))
             log("extract_text.end", start)
         except Exception as e:  # pragma: no cover - defensive
             log("extract_text.error", start, error=str(e))
@@ -141,8 +172,27 @@ def describe_under_cursor(x: int | None = None, y: int | None = None) -> Dict[st
         errors["extract_text"] = "missing image"
         ocr_text, ocr_conf = "", 0.0
     timings["extract_text"] = {"start": start, "end": time.time()}
+    frame["ocr_text"] = ocr_text
+    frame["ocr_conf"] = ocr_conf
+    return frame
 
-    window_id, control_id = _compute_ids(window, element)
+
+def finish_frame(frame: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine UIA and OCR results of ``frame`` into the final description."""
+    pos: Point = frame["cursor"]
+    window: Dict[str, Any] = frame["window"]
+    element: Dict[str, Any] = frame["element"]
+    uia_text: str = frame["uia_text"]
+    uia_conf: float = frame["uia_conf"]
+    ocr_text: str = frame["ocr_text"]
+    ocr_conf: float = frame["ocr_conf"]
+    timings: Dict[str, Dict[str, float]] = frame["timings"]
+    errors: Dict[str, str] = frame["errors"]
+
+    if "control_id" in frame:
+        window_id, control_id = frame["window_id"], frame["control_id"]
+    else:
+        window_id, control_id = _compute_ids(window, element)
     window["window_id"] = window_id
     element["control_id"] = control_id
     ID_CACHE["last_window_id"] = window_id
@@ -207,3 +257,7 @@ def describe_under_cursor(x: int | None = None, y: int | None = None) -> Dict[st
         "timings": timings,
         "errors": errors,
     }
+
+
+def describe_under_cursor(x: int | None = None, y: int | None = None) -> Dict[str, Any]:
+    return finish_frame(ocr_frame(capture_frame(x, y)))
@@ -0,0 +1,215 @@
+"""Ordering and deduplication of tool calls in front of the executor.
+
+:class:`PriorityGate` admits at most ``slots`` calls into one executor pool
+and queues the rest by ``(priority, deadline)``, so interactive calls overtake
+batch traffic and, within a class, the call that must finish first runs first.
+A queued call whose deadline passes leaves the queue without running.
+
+:class:`InFlight` lets identical concurrent calls share one execution: the
+first caller of a key becomes the leader and the others wait for its
+envelope. Both work for threads and for coroutines, since waiters hold a
+:class:`concurrent.futures.Future`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+import metrics
+
+# lower rank runs first
+PRIORITIES: Dict[str, int] = {"interactive": 0, "default": 1, "batch": 2}
+
+
+class PriorityGate:
+    """Bounded admission with a ``(priority, deadline)`` ordered queue."""
+
+    def __init__(self, name: str, slots: int) -> None:
+        self.name = name
+        self.slots = max(1, slots)
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[int, float, int, Future[None]]] = []
+        self._seq = itertools.count()
+        self.running = 0
+        self.queued = 0
+        self.expired = 0
+
+    def _enqueue(self, rank: int, deadline: float) -> Future[None]:
+        fut: Future[None] = Future()
+        with self._lock:
+            if self.running < self.slots and not self.queued:
+                self.running += 1
+                fut.set_result(None)
+                return fut
+            heapq.heappush(self._heap, (rank, deadline, next(self._seq), fut))
+            self.queued += 1
+        return fut
+
+    def _give_up(self, fut: Future[None]) -> None:
+        with self._lock:
+            if fut.cancel():
+                # still queued: the heap entry is skipped when popped
+                self.queued -= 1
+                self.expired += 1
+                return
+        # granted while the waiter was timing out
+        self.release()
+
+    def acquire(self, rank: int, deadline: float) -> None:
+        """Block until a slot is granted; ``TimeoutError`` at ``deadline``."""
+        fut = self._enqueue(rank, deadline)
+        try:
+            fut.result(max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            self._give_up(fut)
+            raise TimeoutError("deadline exceeded while queued") from None
+
+    async def acquire_async(self, rank: int, deadline: float) -> None:
+        fut = self._enqueue(rank, deadline)
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(fut)),
+                max(0.0, deadline - time.monotonic()),
+            )
+        except asyncio.TimeoutError:
+            self._give_up(fut)
+            raise TimeoutError("deadline exceeded while queued") from None
+        except BaseException:
+            self._give_up(fut)
+            raise
+
+    def release(self) -> None:
+        """Hand the slot to the best queued call, or free it."""
+        with self._lock:
+            while self._heap:
+                fut = heapq.heappop(self._heap)[3]
+                if fut.set_running_or_notify_cancel():
+                    self.queued -= 1
+                    fut.set_result(None)
+                    return
+            self.running -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "running": self.running,
+                "queued": self.queued,
+                "expired_total": self.expired,
+            }
+
+
+class InFlight:
+    """Share the envelope of one in-flight call among identical callers."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future[Any]] = {}
+
+    @staticmethod
+    def key(name: str, args: Dict[str, Any]) -> str:
+        return json.dumps([name, args], sort_keys=True, default=str)
+
+    def join(self, key: str) -> Tuple[Future[Any], bool]:
+        """Return the call's future and whether the caller must run it."""
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut, False
+            fut = self._calls[key] = Future()
+            fut.set_running_or_notify_cancel()
+            return fut, True
+
+    def land(
+        self,
+        key: str,
+        fut: Future[Any],
+        value: Any = None,
+        error: BaseException | None = None,
+    ) -> None:
+        """Publish the leader's outcome and forget the key."""
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(value)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class ToolScheduler:
+    """Priority gates per executor pool plus in-flight deduplication."""
+
+    def __init__(self, workers_per_class: int = 8, process_workers: int = 1) -> None:
+        self.workers_per_class = max(1, workers_per_class)
+        self.process_workers = max(1, process_workers)
+        self._lock = threading.Lock()
+        self._gates: Dict[str, PriorityGate] = {}
+        self.flights = InFlight()
+
+    def gate(self, tool: Dict[str, Any]) -> PriorityGate | None:
+        """Gate of the pool that runs ``tool``; ``None`` if it has no pool."""
+        if tool.get("is_async") or tool.get("executor") == "isolated":
+            return None
+        if tool.get("executor") == "process":
+            name, slots = "process", self.process_workers
+        else:
+            name, slots = tool.get("safety", ""), self.workers_per_class
+        with self._lock:
+            gate = self._gates.get(name)
+            if gate is None:
+                gate = self._gates[name] = PriorityGate(name, slots)
+            return gate
+
+    @contextmanager
+    def slot(self, tool: Dict[str, Any], rank: int, deadline: float) -> Iterator[None]:
+        gate = self.gate(tool)
+        if gate is None:
+            yield
+            return
+        gate.acquire(rank, deadline)
+        try:
+            yield
+        finally:
+            gate.release()
+
+    @asynccontextmanager
+    async def slot_async(
+        self, tool: Dict[str, Any], rank: int, deadline: float
+    ) -> AsyncIterator[None]:
+        gate = self.gate(tool)
+        if gate is None:
+            yield
+            return
+        await gate.acquire_async(rank, deadline)
+        try:
+            yield
+        finally:
+            gate.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            gates = list(self._gates.values())
+        out = {"in_flight_keys": len(self.flights)}
+        for gate in gates:
+            for key, value in gate.stats().items():
+                out[f"{gate.name}.{key}"] = value
+        return out
+
+    def record_metrics(self) -> None:
+        for key, value in self.stats().items():
+            metrics.record_gauge("tool_queue", value, label=key)
+
+
+__all__ = ["InFlight", "PRIORITIES", "PriorityGate", "ToolScheduler"]
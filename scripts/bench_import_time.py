@@ -0,0 +1,68 @@
+"""Benchmark helper for import time and cold start.
+
+Times ``python -c "import api"`` and an agent REPL cold start (importing
+``agent_local`` and registering the tool catalog) in fresh interpreters, and
+lists the slowest second-level imports reported by ``python -X importtime``.
+This is a manual aid for performance tuning and is not part of the automated
+test suite.
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+TARGETS = {
+    "import api": "import api",
+    "agent cold start": (
+        "import agent_local; agent_local._ensure_tools(); "
+        "agent_local.Agent(llm=lambda messages, **kw: '')"
+    ),
+}
+
+
+def wall_ms(code: str, runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def slowest_imports(code: str, top: int) -> list[tuple[int, str]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        name = name[1:]
+        # modules imported directly by the ones the code imports
+        if name.startswith("  ") and not name.startswith("   "):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(runs: int = 5, top: int = 8) -> None:
+    for label, code in TARGETS.items():
+        times = wall_ms(code, runs)
+        print(
+            f"{label}: median {statistics.median(times):.0f} ms "
+            f"(min {min(times):.0f}, {runs} runs)"
+        )
+        for cumulative, name in slowest_imports(code, top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,35 @@
+"""Benchmark helper for the API rate limiter.
+
+Runs :class:`rate_limit.GCRALimiter` against a growing number of distinct
+clients and reports the per-check cost, including the case where the client
+count exceeds the LRU table. This is a manual aid for performance tuning and
+is not part of the automated test suite.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from rate_limit import GCRALimiter  # noqa: E402
+
+
+def run(clients: int, max_clients: int, checks: int = 200_000) -> float:
+    limiter = GCRALimiter(max_clients)
+    keys = [(f"10.0.{i >> 8}.{i & 255}", "*") for i in range(clients)]
+    start = time.perf_counter()
+    for i in range(checks):
+        limiter.check(keys[i % clients], 60)
+    return (time.perf_counter() - start) / checks * 1e9
+
+
+def main() -> None:
+    table = 10_000
+    for clients in (1, 100, 10_000, 100_000):
+        ns = run(clients, table)
+        print(f"clients={clients:>7} table={table} {ns:8.0f} ns/check")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
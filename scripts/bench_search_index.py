@@ -0,0 +1,101 @@
+"""Benchmark helper for the ``fs.search`` trigram index.
+
+Generates a synthetic source tree, then reports the time to build the index,
+its size on disk, the cost of an incremental refresh after touching a few
+files, and query latency against a naive scan that reads every file. This is
+a manual aid for performance tuning and is not part of the automated test
+suite.
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from search_index import TrigramIndex, trigrams  # noqa: E402
+
+WORDS = [
+    "".join(random.Random(i).choices(string.ascii_lowercase, k=8)) for i in range(5000)
+]
+
+
+def make_tree(root: Path, files: int, lines: int) -> None:
+    rng = random.Random(0)
+    for i in range(files):
+        d = root / f"pkg{i % 50}"
+        d.mkdir(exist_ok=True)
+        body = "\n".join(" ".join(rng.choices(WORDS, k=8)) for _ in range(lines))
+        (d / f"mod{i}.py").write_text(body + "\n")
+
+
+def naive(root: Path, pattern: re.Pattern) -> int:
+    hits = 0
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            with open(os.path.join(dirpath, name), encoding="utf-8") as f:
+                hits += sum(1 for line in f if pattern.search(line))
+    return hits
+
+
+def median_ms(fn, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "tree"
+        root.mkdir()
+        make_tree(root, args.files, args.lines)
+        index = TrigramIndex(os.path.join(tmp, "idx.sqlite3"), watch=False)
+
+        start = time.perf_counter()
+        index.refresh([str(root)])
+        print(f"build: {(time.perf_counter() - start) * 1000:.0f} ms")
+        stats = index.stats()
+        print(
+            f"index: {stats['files']} files, {stats['postings']} postings, "
+            f"{stats['bytes'] / 1e6:.1f} MB"
+        )
+
+        for path in sorted(root.rglob("*.py"))[:10]:
+            path.write_text(path.read_text() + "touched\n")
+        start = time.perf_counter()
+        changed = index.refresh([str(root)], force=True)
+        print(
+            f"refresh after 10 edits: {(time.perf_counter() - start) * 1000:.0f} ms "
+            f"({changed})"
+        )
+
+        query = WORDS[123]
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        indexed = median_ms(
+            lambda: index.search(
+                pattern, [str(root)], required=trigrams(query), limit=10_000
+            ),
+            args.runs,
+        )
+        scanned = median_ms(lambda: naive(root, pattern), args.runs)
+        print(f"query {query!r}: index {indexed:.1f} ms, naive scan {scanned:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark helper for CPU-bound tools on thread vs process executors.
+
+Runs ``image.crop`` on a large generated PNG from several concurrent callers,
+once on the thread pool and once on the warm process pool, and reports calls
+per second. This is a manual aid for performance tuning and is not part of
+the automated test suite.
+"""
+
+import base64
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image  # noqa: E402
+
+from executor import ToolExecutor  # noqa: E402
+from tools import image  # noqa: E402
+
+
+def make_png(side: int = 1000) -> str:
+    img = Image.effect_noise((side, side), 64).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def run(mode: str, png: str, callers: int, calls: int) -> float:
+    ex = ToolExecutor(callers)
+    tool = {
+        "name": "image.crop",
+        "safety": "read",
+        "func": image.crop,
+        "executor": mode,
+    }
+    args = {"png_base64": png, "x": 0, "y": 0, "w": 800, "h": 800}
+    ex.run(tool, args, 60.0)  # warm-up
+    start = time.perf_counter()
+    with ThreadPoolExecutor(callers) as agents:
+        list(agents.map(lambda _: ex.run(tool, args, 60.0), range(calls)))
+    elapsed = time.perf_counter() - start
+    ex.shutdown()
+    return calls / elapsed
+
+
+def main(callers: int = 4, calls: int = 32) -> None:
+    png = make_png()
+    print(f"payload={len(png) / 1e6:.1f}MB base64 callers={callers} calls={calls}")
+    for mode in ("thread", "process"):
+        print(f"{mode:>8}: {run(mode, png, callers, calls):6.1f} calls/s")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,439 @@
+"""On-disk trigram index of file contents for the ``fs.search`` tool.
+
+Every text file under the indexed roots is stored in a SQLite database with
+the set of lowercase three-character substrings (trigrams) of its lines. A
+query is turned into the trigrams any match must contain (the query itself
+for substrings, the literal runs of a regular expression), the posting lists
+give the few candidate files, and only those are read to produce ``file:line``
+hits.
+
+The index is kept current incrementally: a root is rescanned by comparing each
+file's ``mtime``/``size`` with the stored values, at most every
+``SEARCH_REFRESH_S`` seconds. When the optional ``watchdog`` package is
+installed (inotify on Linux, ReadDirectoryChangesW on Windows), file events
+mark single paths dirty instead and periodic rescans are skipped.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import os
+import re
+import sqlite3
+import stat
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from executor import Cancelled, check_cancelled
+from private_paths import private_file, user_cache_dir
+
+try:  # Python 3.11+
+    from re import _parser as sre_parse
+except ImportError:  # pragma: no cover
+    import sre_parse  # type: ignore[no-redef]
+
+# postings reveal file contents: keep them readable by this user only
+DEFAULT_INDEX_PATH = os.path.join(user_cache_dir(), "search.sqlite3")
+# larger files are not indexed
+MAX_FILE_BYTES = 1_000_000
+SKIP_DIRS = {
+    ".git",
+    ".hg",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".venv",
+    "__pycache__",
+    "node_modules",
+    "venv",
+}
+# watchdog event types: reads emit opened/closed_no_write, and a directory
+# created here may be a tree moved in from outside, whose files send no events
+IGNORED_EVENTS = {"opened", "closed_no_write"}
+RESCAN_DIR_EVENTS = {"created", "deleted", "moved"}
+# files indexed per transaction during a scan
+COMMIT_EVERY = 200
+MAX_LINE_CHARS = 200
+
+
+def trigrams(text: str) -> Set[str]:
+    """Lowercase trigrams of each line of ``text``."""
+    out: Set[str] = set()
+    for line in text.lower().splitlines():
+        out.update(line[i : i + 3] for i in range(len(line) - 2))
+    return out
+
+
+def literal_runs(pattern: str) -> List[str]:
+    """Literal strings every match of the regex ``pattern`` must contain.
+
+    Only top-level runs of plain characters are used; anything optional,
+    repeated or alternated ends a run. Runs shorter than 3 are dropped.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return []
+    runs: List[str] = []
+    current: List[str] = []
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            current.append(chr(av))
+        else:
+            runs.append("".join(current))
+            current = []
+    runs.append("".join(current))
+    return [r for r in runs if len(r) >= 3]
+
+
+def _skipped(path: str) -> bool:
+    return any(part in SKIP_DIRS for part in path.split(os.sep))
+
+
+def _under(path: str, roots: Sequence[str]) -> bool:
+    return any(path.startswith(root + os.sep) for root in roots)
+
+
+def distinct_roots(roots: Iterable[str]) -> List[str]:
+    """Absolute roots with those nested inside another root removed."""
+    unique = sorted({os.path.abspath(r) for r in roots})
+    return [r for r in unique if not _under(r, unique)]
+
+
+class TrigramIndex:
+    """Trigram index stored at ``path``; safe to share between threads."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_INDEX_PATH,
+        *,
+        refresh_s: float = 30.0,
+        watch: bool = True,
+    ) -> None:
+        self.path = private_file(path)
+        self.refresh_s = refresh_s
+        self.watch = watch
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._dirty_lock = threading.Lock()
+        self._dirty: Set[str] = set()
+        self._scanned: Dict[str, float] = {}
+        self._watched: Set[str] = set()
+        self._observer: Any = None
+        self.connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                text INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                trigram TEXT NOT NULL, file INTEGER NOT NULL,
+                PRIMARY KEY (trigram, file)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_file ON postings (file);
+            """
+        )
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        con: sqlite3.Connection | None = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    # updating ------------------------------------------------------------
+
+    def refresh(self, roots: Sequence[str], force: bool = False) -> Dict[str, int]:
+        """Bring the index up to date for ``roots``.
+
+        Returns how many files were ``indexed``, ``removed`` and found
+        ``unchanged``. A cancelled refresh keeps the files already indexed.
+        """
+        stats = {"indexed": 0, "removed": 0, "unchanged": 0}
+        with self._lock:
+            for root in distinct_roots(roots):
+                self._watch(root)
+                last = self._scanned.get(root)
+                stale = root not in self._watched and (
+                    time.monotonic() - (last or 0.0) >= self.refresh_s
+                )
+                if force or last is None or stale:
+                    self._scan_root(root, stats)
+                    self._scanned[root] = time.monotonic()
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, set()
+            if dirty:
+                self._batch(self._sync_paths(sorted(dirty), stats))
+        return stats
+
+    def _batch(self, work: Iterator[None]) -> None:
+        """Run ``work`` in transactions of :data:`COMMIT_EVERY` files."""
+        con = self.connection()
+        con.execute("BEGIN")
+        try:
+            for n, _ in enumerate(work, 1):
+                if n % COMMIT_EVERY == 0:
+                    con.execute("COMMIT")
+                    con.execute("BEGIN")
+        except Cancelled:
+            con.execute("COMMIT")
+            raise
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def _scan_root(self, root: str, stats: Dict[str, int]) -> None:
+        con = self.connection()
+        lo, hi = root + os.sep, root + chr(ord(os.sep) + 1)
+        known = {
+            path: (fid, mtime_ns, size)
+            for fid, path, mtime_ns, size in con.execute(
+                "SELECT id, path, mtime_ns, size FROM files WHERE path >= ? AND path < ?",
+                (lo, hi),
+            )
+        }
+        seen: Set[str] = set()
+
+        def work() -> Iterator[None]:
+            for path, st in _walk_files(root):
+                seen.add(path)
+                row = known.get(path)
+                if row is not None and row[1:] == (st.st_mtime_ns, st.st_size):
+                    stats["unchanged"] += 1
+                    continue
+                self._index_file(path, st)
+                stats["indexed"] += 1
+                yield None
+            for path in known.keys() - seen:
+                self._forget(path)
+                stats["removed"] += 1
+                yield None
+
+        self._batch(work())
+
+    def _sync_paths(self, paths: List[str], stats: Dict[str, int]) -> Iterator[None]:
+        for path in paths:
+            check_cancelled()
+            if _skipped(path):
+                continue
+            try:
+                # like the walk, never follow symlinks out of the root
+                st = os.lstat(path)
+            except OSError:
+                st = None
+            if (
+                st is None
+                or not stat.S_ISREG(st.st_mode)
+                or st.st_size > MAX_FILE_BYTES
+            ):
+                self._forget(path)
+                stats["removed"] += 1
+            else:
+                self._index_file(path, st)
+                stats["indexed"] += 1
+            yield None
+
+    def _index_file(self, path: str, st: os.stat_result) -> None:
+        try:
+            with open(path, "rb") as f:
+                data = f.read(MAX_FILE_BYTES + 1)
+        except OSError:
+            return
+        is_text = b"\0" not in data[:8192]
+        con = self.connection()
+        con.execute(
+            """
+            INSERT INTO files (path, mtime_ns, size, text) VALUES (?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                mtime_ns = excluded.mtime_ns, size = excluded.size, text = excluded.text
+            """,
+            (path, st.st_mtime_ns, st.st_size, int(is_text)),
+        )
+        (fid,) = con.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        con.execute("DELETE FROM postings WHERE file = ?", (fid,))
+        if is_text:
+            con.executemany(
+                "INSERT INTO postings (trigram, file) VALUES (?, ?)",
+                ((t, fid) for t in trigrams(data.decode("utf-8", "replace"))),
+            )
+
+    def _forget(self, path: str) -> None:
+        con = self.connection()
+        row = con.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            con.execute("DELETE FROM postings WHERE file = ?", row)
+            con.execute("DELETE FROM files WHERE id = ?", row)
+
+    def _watch(self, root: str) -> None:
+        if not self.watch or root in self._watched:
+            return
+        try:
+            from watchdog.events import FileSystemEventHandler  # type: ignore[import-not-found]
+            from watchdog.observers import Observer  # type: ignore[import-not-found]
+        except ImportError:
+            return
+        index = self
+
+        class Handler(FileSystemEventHandler):  # type: ignore[misc]
+            def on_any_event(self, event: Any) -> None:
+                index._on_event(root, event)
+
+        try:
+            if self._observer is None:
+                self._observer = Observer()
+                self._observer.daemon = True
+                self._observer.start()
+            self._observer.schedule(Handler(), root, recursive=True)
+        except Exception:
+            # e.g. inotify watch limit reached: fall back to periodic scans
+            return
+        self._watched.add(root)
+
+    def _on_event(self, root: str, event: Any) -> None:
+        """Apply one watchdog event for a path under ``root``."""
+        if event.event_type in IGNORED_EVENTS:
+            return
+        if event.is_directory:
+            # every file change also modifies its parent directory; only
+            # trees that appear, move or vanish as a whole need a rescan
+            if event.event_type in RESCAN_DIR_EVENTS:
+                self._scanned.pop(root, None)
+            return
+        with self._dirty_lock:
+            self._dirty.add(os.path.abspath(event.src_path))
+            dest = getattr(event, "dest_path", "")
+            if dest:
+                self._dirty.add(os.path.abspath(dest))
+
+    # querying ------------------------------------------------------------
+
+    def candidates(self, roots: Sequence[str], required: Set[str]) -> List[str]:
+        """Indexed text files under ``roots`` containing all ``required``."""
+        con = self.connection()
+        if required:
+            marks = ", ".join("?" * len(required))
+            rows = con.execute(
+                f"""
+                SELECT f.path FROM postings p JOIN files f ON f.id = p.file
+                WHERE p.trigram IN ({marks})
+                GROUP BY p.file HAVING COUNT(*) = ?
+                """,
+                (*required, len(required)),
+            )
+        else:
+            rows = con.execute("SELECT path FROM files WHERE text = 1")
+        roots = distinct_roots(roots)
+        return sorted(path for (path,) in rows if _under(path, roots))
+
+    def search(
+        self,
+        pattern: re.Pattern[str],
+        roots: Sequence[str],
+        *,
+        required: Set[str],
+        limit: int = 50,
+        glob: str | None = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Return ``(hits, truncated)`` for lines matching ``pattern``."""
+        hits: List[Dict[str, Any]] = []
+        real_roots = [os.path.realpath(r) for r in roots]
+        for path in self.candidates(roots, required):
+            if glob and not fnmatch.fnmatch(os.path.basename(path), glob):
+                continue
+            check_cancelled()
+            # the file may have been swapped for a link since it was indexed
+            real = os.path.realpath(path)
+            if real not in real_roots and not _under(real, real_roots):
+                continue
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    for lineno, line in enumerate(f, 1):
+                        if pattern.search(line):
+                            hits.append(
+                                {
+                                    "path": path,
+                                    "line": lineno,
+                                    "text": line.rstrip("\r\n")[:MAX_LINE_CHARS],
+                                }
+                            )
+                            if len(hits) >= limit:
+                                return hits, True
+            except OSError:
+                continue
+        return hits, False
+
+    def stats(self) -> Dict[str, int]:
+        con = self.connection()
+        (files,) = con.execute("SELECT COUNT(*) FROM files").fetchone()
+        (postings,) = con.execute("SELECT COUNT(*) FROM postings").fetchone()
+        size = 0
+        for suffix in ("", "-wal"):
+            try:
+                size += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return {"files": files, "postings": postings, "bytes": size}
+
+    def close(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        self._watched.clear()
+
+
+def _walk_files(root: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield ``(path, stat)`` of indexable regular files under ``root``."""
+    stack = [root]
+    while stack:
+        top = stack.pop()
+        try:
+            with os.scandir(top) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            check_cancelled()
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_size <= MAX_FILE_BYTES:
+                        yield entry.path, st
+            except OSError:
+                continue
+
+
+_INDEX: TrigramIndex | None = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index() -> TrigramIndex:
+    """Return the process-wide index configured by ``SEARCH_INDEX_PATH``."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            from settings import SEARCH_INDEX_PATH, SEARCH_REFRESH_S
+
+            _INDEX = TrigramIndex(
+                SEARCH_INDEX_PATH or DEFAULT_INDEX_PATH, refresh_s=SEARCH_REFRESH_S
+            )
+        return _INDEX
+
+
+__all__ = [
+    "TrigramIndex",
+    "distinct_roots",
+    "get_index",
+    "literal_runs",
+    "trigrams",
+]
@@ -2,13 +2,10 @@ import json
 import os
 import platform
 import sys
+from importlib import metadata
 from pathlib import Path
 from typing import Any
 
-import mss
-import PIL
-import pytesseract
-
 DEFAULTS: dict[str, Any] = {
     "OCR_LANG": "por+eng",
     "OCR_CFG": "--oem 3 --psm 6",
@@ -22,13 +19,36 @@ DEFAULTS: dict[str, Any] = {
     "LOG_FORMAT": "text",
     "SNAPSHOT_MAX_AREA": 2_000_000,
     "SNAPSHOT_MAX_SIDE": 2000,
+    "SNAPSHOT_CACHE_BYTES": 16_000_000,
     "API_RATE_LIMIT_PER_MIN": 60,
+    "API_RATE_LIMIT_ROUTES": "",
+    "API_KEY_RATE_LIMIT_PER_MIN": 0,
+    "API_RATE_LIMIT_MAX_CLIENTS": 10_000,
     "API_CORS_ORIGINS": "",
     "API_KEY": "",
     "TRUST_PROXY": False,
     "SAFE_MODE": True,
     "HOVER_WATCH_HZ": 1.0,
+    "HOVER_WATCH_IDLE_HZ": 0.2,
+    "API_STREAM_HZ": 5.0,
+    "API_COALESCE_WINDOW_MS": 0,
     "HOVER_WATCH_RUN_AS_ADMIN": False,
+    "ADMISSION_MAX_CONCURRENCY": 32,
+    "ADMISSION_LATENCY_TOLERANCE": 2.0,
+    "TOOL_POOL_WORKERS": 8,
+    "TOOL_PROCESS_WORKERS": 0,
+    "TOOL_CACHE_MAX_ENTRIES": 256,
+    "STATE_BACKEND": "memory",
+    "STATE_PATH": "",
+    "SEARCH_INDEX_PATH": "",
+    "SEARCH_REFRESH_S": 30.0,
+    "FS_DIR_CACHE_ENTRIES": 1024,
+    "ARCHIVE_MAX_HANDLES": 16,
+    "ARCHIVE_INDEX_DIR": "",
+    "WEB_POOL_HOSTS": 32,
+    "WEB_POOL_PER_HOST": 4,
+    "WEB_CACHE_PATH": "",
+    "WEB_CACHE_MAX_BYTES": 50_000_000,
 }
 
 DEFAULTS.update({"LLM_API_KEY": "", "LLM_AUTH_HEADER": ""})
@@ -49,6 +69,15 @@ def _load_env_file(path: Path) -> dict[str, str]:
     return data
 
 
+def _dist_version(dist: str) -> str | None:
+    # read from package metadata so loading settings never imports the
+    # capture/OCR stack
+    try:
+        return metadata.version(dist)
+    except metadata.PackageNotFoundError:
+        return None
+
+
 def load_settings() -> dict[str, Any]:
     cfg: dict[str, Any] = DEFAULTS.copy()
     origins: dict[str, str] = {key: "default" for key in DEFAULTS}
@@ -83,7 +112,20 @@ def load_settings() -> dict[str, Any]:
         "CAPTURE_HEIGHT",
         "SNAPSHOT_MAX_AREA",
         "SNAPSHOT_MAX_SIDE",
+        "SNAPSHOT_CACHE_BYTES",
         "API_RATE_LIMIT_PER_MIN",
+        "API_KEY_RATE_LIMIT_PER_MIN",
+        "API_RATE_LIMIT_MAX_CLIENTS",
+        "ADMISSION_MAX_CONCURRENCY",
+        "TOOL_POOL_WORKERS",
+        "TOOL_PROCESS_WORKERS",
+        "TOOL_CACHE_MAX_ENTRIES",
+        "FS_DIR_CACHE_ENTRIES",
+        "ARCHIVE_MAX_HANDLES",
+        "WEB_POOL_HOSTS",
+        "WEB_POOL_PER_HOST",
+        "WEB_CACHE_MAX_BYTES",
+        "API_COALESCE_WINDOW_MS",
     ):
         try:
             cfg[key] = int(cfg[key])
@@ -95,7 +137,15 @@ def load_settings() -> dict[str, Any]:
             cfg[key] = DEFAULTS[key]
             origins[key] = "default"
 
-    for key in ("UIA_THRESHOLD", "CAPTURE_LOG_SAMPLE_RATE", "HOVER_WATCH_HZ"):
+    for key in (
+        "UIA_THRESHOLD",
+        "CAPTURE_LOG_SAMPLE_RATE",
+        "HOVER_WATCH_HZ",
+        "HOVER_WATCH_IDLE_HZ",
+        "API_STREAM_HZ",
+        "ADMISSION_LATENCY_TOLERANCE",
+        "SEARCH_REFRESH_S",
+    ):
         try:
             cfg[key] = float(cfg[key])
         except Exception:
@@ -124,6 +174,19 @@ def load_settings() -> dict[str, Any]:
         cfg["LOG_FORMAT"] = DEFAULTS["LOG_FORMAT"]
         origins["LOG_FORMAT"] = "default"
 
+    cfg["STATE_BACKEND"] = str(cfg["STATE_BACKEND"]).lower()
+    if cfg["STATE_BACKEND"] not in {"memory", "sqlite"}:
+        print(
+            f"Invalid STATE_BACKEND={cfg['STATE_BACKEND']!r}, using default {DEFAULTS['STATE_BACKEND']!r}",
+            file=sys.stderr,
+        )
+        cfg["STATE_BACKEND"] = DEFAULTS["STATE_BACKEND"]
+        origins["STATE_BACKEND"] = "default"
+    cfg["STATE_PATH"] = str(cfg["STATE_PATH"])
+    cfg["SEARCH_INDEX_PATH"] = str(cfg["SEARCH_INDEX_PATH"])
+    cfg["ARCHIVE_INDEX_DIR"] = str(cfg["ARCHIVE_INDEX_DIR"])
+    cfg["WEB_CACHE_PATH"] = str(cfg["WEB_CACHE_PATH"])
+
     cfg["TRUST_PROXY"] = str(cfg["TRUST_PROXY"]).lower() in {
         "1",
         "true",
@@ -161,9 +224,9 @@ def load_settings() -> dict[str, Any]:
 
     version_stamp = {
         "python": platform.python_version(),
-        "mss": getattr(mss, "__version__", None),
-        "pillow": getattr(PIL, "__version__", None),
-        "pytesseract": getattr(pytesseract, "__version__", None),
+        "mss": _dist_version("mss"),
+        "pillow": _dist_version("Pillow"),
+        "pytesseract": _dist_version("pytesseract"),
     }
     import logger as _logger
 
@@ -189,12 +252,35 @@ LOG_LEVEL = CONFIG["LOG_LEVEL"]
 LOG_FORMAT = CONFIG["LOG_FORMAT"]
 SNAPSHOT_MAX_AREA = CONFIG["SNAPSHOT_MAX_AREA"]
 SNAPSHOT_MAX_SIDE = CONFIG["SNAPSHOT_MAX_SIDE"]
+SNAPSHOT_CACHE_BYTES = CONFIG["SNAPSHOT_CACHE_BYTES"]
 API_RATE_LIMIT_PER_MIN = CONFIG["API_RATE_LIMIT_PER_MIN"]
+API_RATE_LIMIT_ROUTES = CONFIG["API_RATE_LIMIT_ROUTES"]
+API_KEY_RATE_LIMIT_PER_MIN = CONFIG["API_KEY_RATE_LIMIT_PER_MIN"]
+API_RATE_LIMIT_MAX_CLIENTS = CONFIG["API_RATE_LIMIT_MAX_CLIENTS"]
 API_CORS_ORIGINS = CONFIG["API_CORS_ORIGINS"]
 TRUST_PROXY = CONFIG["TRUST_PROXY"]
 SAFE_MODE = CONFIG["SAFE_MODE"]
 HOVER_WATCH_HZ = CONFIG["HOVER_WATCH_HZ"]
+HOVER_WATCH_IDLE_HZ = CONFIG["HOVER_WATCH_IDLE_HZ"]
+API_STREAM_HZ = CONFIG["API_STREAM_HZ"]
+API_COALESCE_WINDOW_MS = CONFIG["API_COALESCE_WINDOW_MS"]
 HOVER_WATCH_RUN_AS_ADMIN = CONFIG["HOVER_WATCH_RUN_AS_ADMIN"]
+ADMISSION_MAX_CONCURRENCY = CONFIG["ADMISSION_MAX_CONCURRENCY"]
+ADMISSION_LATENCY_TOLERANCE = CONFIG["ADMISSION_LATENCY_TOLERANCE"]
+TOOL_POOL_WORKERS = CONFIG["TOOL_POOL_WORKERS"]
+TOOL_PROCESS_WORKERS = CONFIG["TOOL_PROCESS_WORKERS"]
+TOOL_CACHE_MAX_ENTRIES = CONFIG["TOOL_CACHE_MAX_ENTRIES"]
+STATE_BACKEND = CONFIG["STATE_BACKEND"]
+STATE_PATH = CONFIG["STATE_PATH"]
+SEARCH_INDEX_PATH = CONFIG["SEARCH_INDEX_PATH"]
+SEARCH_REFRESH_S = CONFIG["SEARCH_REFRESH_S"]
+FS_DIR_CACHE_ENTRIES = CONFIG["FS_DIR_CACHE_ENTRIES"]
+ARCHIVE_MAX_HANDLES = CONFIG["ARCHIVE_MAX_HANDLES"]
+ARCHIVE_INDEX_DIR = CONFIG["ARCHIVE_INDEX_DIR"]
+WEB_POOL_HOSTS = CONFIG["WEB_POOL_HOSTS"]
+WEB_POOL_PER_HOST = CONFIG["WEB_POOL_PER_HOST"]
+WEB_CACHE_PATH = CONFIG["WEB_CACHE_PATH"]
+WEB_CACHE_MAX_BYTES = CONFIG["WEB_CACHE_MAX_BYTES"]
 API_KEY = CONFIG["API_KEY"]
 LLM_API_KEY = CONFIG["LLM_API_KEY"]
 LLM_AUTH_HEADER = CONFIG["LLM_AUTH_HEADER"]
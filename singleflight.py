@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Generic, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    __slots__ = ("done", "value", "error", "expires")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: T | None = None
+        self.error: BaseException | None = None
+        self.expires = 0.0
+
+    def result(self) -> T:
+        if self.error is not None:
+            raise self.error
+        return self.value  # type: ignore[return-value]
+
+
+class Singleflight:
+    """Share one in-flight computation among concurrent callers of a key.
+
+    The first caller of :meth:`do` for a key runs ``fn``; callers arriving
+    while it runs wait and receive the same result or exception. With
+    ``window_ms`` > 0 a successful result is also reused for that long after
+    it completes. Outcomes are counted per ``name`` as ``executed``,
+    ``coalesced`` or ``reused`` in ``metrics.summary()["coalesce_total"]``.
+    """
+
+    def __init__(self, name: str, window_ms: int = 0) -> None:
+        self.name = name
+        self.window_ms = window_ms
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call[Any]] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        now = time.monotonic()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done.is_set() and call.expires <= now:
+                del self._calls[key]
+                call = None
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                leader = False
+                outcome = "reused" if call.done.is_set() else "coalesced"
+        if not leader:
+            metrics.record_coalesce(self.name, outcome)
+            call.done.wait()
+            return call.result()  # type: ignore[no-any-return]
+        metrics.record_coalesce(self.name, "executed")
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                done_at = time.monotonic()
+                if self.window_ms > 0 and call.error is None:
+                    call.expires = done_at + self.window_ms / 1000
+                    self._prune(done_at)
+                elif self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result()  # type: ignore[no-any-return]
+
+    def _prune(self, now: float) -> None:
+        # caller holds self._lock
+        expired = [
+            k for k, c in self._calls.items() if c.done.is_set() and c.expires <= now
+        ]
+        for k in expired:
+            del self._calls[k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._calls.clear()
+
+
+__all__ = ["Singleflight"]
@@ -0,0 +1,288 @@
+"""Pluggable storage for API state shared between worker processes.
+
+``STATE_BACKEND=memory`` (default) keeps element/bounds caches, rate-limit
+buckets and metrics in the current process, as before. ``STATE_BACKEND=sqlite``
+stores them in a SQLite database in WAL mode at ``STATE_PATH`` so several
+``uvicorn --workers`` processes on one host see the same ``/details`` ids,
+enforce one set of rate limits and report merged ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterator, List, MutableMapping
+
+import metrics
+from private_paths import private_file, user_cache_dir
+from rate_limit import GCRALimiter, gcra
+
+# element caches hold on-screen text: keep them readable by this user only
+DEFAULT_SQLITE_PATH = os.path.join(user_cache_dir(), "state.sqlite3")
+# worker snapshots older than this are ignored when merging /metrics
+METRICS_MAX_AGE_S = 300.0
+# expired rate buckets are pruned every this many checks
+PRUNE_EVERY = 1024
+
+
+class MemoryBackend:
+    """In-process state; the default for single-worker deployments."""
+
+    name = "memory"
+    shared = False
+
+    def __init__(self) -> None:
+        self._maps: Dict[str, Dict[str, Any]] = {}
+
+    def mapping(self, namespace: str) -> MutableMapping[str, Any]:
+        return self._maps.setdefault(namespace, {})
+
+    def rate_limiter(self, name: str, max_clients: int) -> GCRALimiter:
+        return GCRALimiter(max_clients)
+
+    def publish_metrics(self, worker: str, snapshot: Dict[str, Any]) -> None:
+        pass
+
+    def metrics_snapshots(self, exclude: str = "") -> List[Dict[str, Any]]:
+        return []
+
+
+class SQLiteBackend:
+    """State in a SQLite WAL database shared by processes on one host."""
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH) -> None:
+        self.path = private_file(path)
+        self._local = threading.local()
+        con = self.connection()
+        con.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS kv (
+                ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+                PRIMARY KEY (ns, key)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS rate (
+                name TEXT NOT NULL, key TEXT NOT NULL, tat REAL NOT NULL,
+                PRIMARY KEY (name, key)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS metrics (
+                worker TEXT PRIMARY KEY, updated REAL NOT NULL, data TEXT NOT NULL
+            );
+            """
+        )
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        con: sqlite3.Connection | None = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def mapping(self, namespace: str) -> "SQLiteMap":
+        return SQLiteMap(self, namespace)
+
+    def rate_limiter(self, name: str, max_clients: int) -> "SQLiteRateLimiter":
+        return SQLiteRateLimiter(self, name, max_clients)
+
+    def publish_metrics(self, worker: str, snapshot: Dict[str, Any]) -> None:
+        self.connection().execute(
+            "INSERT OR REPLACE INTO metrics (worker, updated, data) VALUES (?, ?, ?)",
+            (worker, time.time(), json.dumps(snapshot, default=str)),
+        )
+
+    def metrics_snapshots(self, exclude: str = "") -> List[Dict[str, Any]]:
+        """Return recent snapshots of all workers except ``exclude``."""
+        rows = self.connection().execute(
+            "SELECT data FROM metrics WHERE updated >= ? AND worker != ?",
+            (time.time() - METRICS_MAX_AGE_S, exclude),
+        )
+        return [json.loads(data) for (data,) in rows]
+
+
+class SQLiteMap(MutableMapping[str, Any]):
+    """Dict-like view of one namespace of :class:`SQLiteBackend`.
+
+    Values are stored as JSON, so reads return fresh copies.
+    """
+
+    def __init__(self, backend: SQLiteBackend, namespace: str) -> None:
+        self._backend = backend
+        self.namespace = namespace
+
+    def __getitem__(self, key: str) -> Any:
+        row = (
+            self._backend.connection()
+            .execute(
+                "SELECT value FROM kv WHERE ns = ? AND key = ?", (self.namespace, key)
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._backend.connection().execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value) VALUES (?, ?, ?)",
+            (self.namespace, key, json.dumps(value, default=str)),
+        )
+
+    def __delitem__(self, key: str) -> None:
+        cur = self._backend.connection().execute(
+            "DELETE FROM kv WHERE ns = ? AND key = ?", (self.namespace, key)
+        )
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self._backend.connection().execute(
+            "SELECT key FROM kv WHERE ns = ?", (self.namespace,)
+        )
+        return iter([key for (key,) in rows])
+
+    def __len__(self) -> int:
+        row = (
+            self._backend.connection()
+            .execute("SELECT COUNT(*) FROM kv WHERE ns = ?", (self.namespace,))
+            .fetchone()
+        )
+        return int(row[0])
+
+    def clear(self) -> None:
+        self._backend.connection().execute(
+            "DELETE FROM kv WHERE ns = ?", (self.namespace,)
+        )
+
+
+class SQLiteRateLimiter:
+    """GCRA limiter whose buckets are shared through :class:`SQLiteBackend`.
+
+    Same interface as :class:`rate_limit.GCRALimiter`. Buckets whose TAT is in
+    the past carry no state and are pruned; beyond ``max_clients`` the buckets
+    with the oldest TAT are dropped.
+    """
+
+    def __init__(
+        self,
+        backend: SQLiteBackend,
+        name: str,
+        max_clients: int = 10_000,
+        *,
+        period: float = 60.0,
+        clock: Callable[[], float] | None = None,
+    ) -> None:
+        self._backend = backend
+        self.name = name
+        self.max_clients = max(1, max_clients)
+        self.period = period
+        # wall clock: comparable between processes
+        self._clock = clock
+        self._checks = 0
+        self.evicted = 0
+
+    def check(self, key: Hashable, limit: int) -> float:
+        if limit <= 0:
+            return self.period
+        skey = json.dumps(key, default=str)
+        con = self._backend.connection()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            now = (self._clock or time.time)()
+            row = con.execute(
+                "SELECT tat FROM rate WHERE name = ? AND key = ?", (self.name, skey)
+            ).fetchone()
+            new_tat, wait = gcra(row[0] if row else None, now, limit, self.period)
+            if wait == 0.0:
+                con.execute(
+                    "INSERT OR REPLACE INTO rate (name, key, tat) VALUES (?, ?, ?)",
+                    (self.name, skey, new_tat),
+                )
+            self._checks += 1
+            if self._checks % PRUNE_EVERY == 0:
+                self._prune(con, now)
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return wait
+
+    def _prune(self, con: sqlite3.Connection, now: float) -> None:
+        con.execute("DELETE FROM rate WHERE name = ? AND tat < ?", (self.name, now))
+        cur = con.execute(
+            """
+            DELETE FROM rate WHERE name = ? AND key IN (
+                SELECT key FROM rate WHERE name = ? ORDER BY tat DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.name, self.name, self.max_clients),
+        )
+        self.evicted += max(cur.rowcount, 0)
+
+    def __len__(self) -> int:
+        row = (
+            self._backend.connection()
+            .execute("SELECT COUNT(*) FROM rate WHERE name = ?", (self.name,))
+            .fetchone()
+        )
+        return int(row[0])
+
+    def clear(self) -> None:
+        self._backend.connection().execute(
+            "DELETE FROM rate WHERE name = ?", (self.name,)
+        )
+        self.evicted = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "clients": len(self),
+            "max_clients": self.max_clients,
+            "evicted_total": self.evicted,
+        }
+
+    def record_metrics(self) -> None:
+        for key, value in self.stats().items():
+            metrics.record_gauge("rate_limit", value, label=key)
+
+
+StateBackend = MemoryBackend | SQLiteBackend
+
+_BACKEND: StateBackend | None = None
+
+
+def create_backend(kind: str, path: str = "") -> StateBackend:
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or DEFAULT_SQLITE_PATH)
+    raise ValueError(f"unknown state backend {kind!r}")
+
+
+def get_backend() -> StateBackend:
+    """Return the process-wide backend selected by ``STATE_BACKEND``."""
+    global _BACKEND
+    if _BACKEND is None:
+        from settings import STATE_BACKEND, STATE_PATH
+
+        _BACKEND = create_backend(STATE_BACKEND, STATE_PATH)
+    return _BACKEND
+
+
+__all__ = [
+    "MemoryBackend",
+    "SQLiteBackend",
+    "SQLiteMap",
+    "SQLiteRateLimiter",
+    "StateBackend",
+    "create_backend",
+    "get_backend",
+]
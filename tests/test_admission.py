@@ -0,0 +1,34 @@
+from admission import AdaptiveLimiter
+
+
+def test_limiter_sheds_beyond_limit():
+    pool = AdaptiveLimiter("/inspect", initial=2)
+    assert pool.try_acquire() and pool.try_acquire()
+    assert not pool.try_acquire()
+    assert pool.stats()["shed_total"] == 1
+    pool.release(10)
+    assert pool.try_acquire()
+
+
+def test_limiter_grows_when_busy_and_fast():
+    pool = AdaptiveLimiter("/inspect", initial=2, max_limit=4)
+    for _ in range(50):
+        pool.try_acquire()
+        pool.try_acquire()
+        pool.release(10)
+        pool.release(10)
+    assert pool.stats()["limit"] == 4
+
+
+def test_limiter_backs_off_on_slow_or_failed_requests():
+    pool = AdaptiveLimiter("/inspect", initial=10, backoff=0.5)
+    pool.try_acquire()
+    pool.release(10)
+    pool.try_acquire()
+    pool.release(100)
+    assert pool.stats()["limit"] == 5
+    pool._last_decrease = 0.0
+    pool.try_acquire()
+    pool.release(10, ok=False)
+    assert pool.stats()["limit"] == 2
+    assert pool.retry_after() == 1
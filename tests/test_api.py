@@ -1,6 +1,10 @@
+import asyncio
 import json
 import sys
+import time
 import types
+import pytest
+from fastapi import WebSocketDisconnect
 from fastapi.testclient import TestClient
 import tools
 import zipfile
@@ -44,8 +48,14 @@ def fake_describe_under_cursor(x=None, y=None):
 
 
 class FakeImage:
+    def __init__(self, pixels=b"px"):
+        self.pixels = pixels
+
+    def tobytes(self):
+        return self.pixels
+
     def save(self, buf, format):
-        buf.write(b"fake")
+        buf.write(b"fake-" + format.encode())
 
 
 def fake_capture(region):
@@ -77,7 +87,8 @@ def test_api_routes(monkeypatch):
     resp = client.get("/snapshot", params={"region": "0,0,1,1"})
     assert resp.status_code == 200
     assert resp.headers["content-type"] == "image/png"
-    assert resp.headers["cache-control"] == "no-store"
+    assert resp.headers["cache-control"] == "no-cache"
+    assert resp.headers["etag"]
 
     resp = client.get("/snapshot", params={"id": "c1"})
     assert resp.status_code == 200
@@ -222,7 +233,7 @@ def test_rate_limit(monkeypatch):
         api.resolve, "describe_under_cursor", fake_describe_under_cursor
     )
     monkeypatch.setattr(api, "API_RATE_LIMIT_PER_MIN", 2)
-    api._REQUEST_LOG.clear()
+    api.RATE_LIMITER.clear()
     client = TestClient(api.app)
     client.get("/inspect")
     client.get("/inspect")
@@ -230,10 +241,66 @@ def test_rate_limit(monkeypatch):
     assert resp.status_code == 429
     data = resp.json()
     assert data["error"]["code"] == "rate_limit"
-    assert resp.headers["Retry-After"] == "60"
+    # two per minute: the next slot opens 30s after the burst
+    assert resp.headers["Retry-After"] == "30"
     assert "X-Request-Id" in resp.headers
 
 
+def test_rate_limit_zero_refuses_all(monkeypatch):
+    monkeypatch.setattr(api, "API_RATE_LIMIT_PER_MIN", 0)
+    api.RATE_LIMITER.clear()
+    resp = TestClient(api.app).get("/inspect")
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "60"
+
+
+def _record_loop(monkeypatch, limiter):
+    """Note, per ``limiter.check``, whether it ran on an event loop thread."""
+    on_loop = []
+    check = limiter.check
+
+    def spy(key, limit):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return check(key, limit)
+
+    monkeypatch.setattr(limiter, "check", spy)
+    return on_loop
+
+
+def test_shared_rate_limit_runs_off_event_loop(monkeypatch, tmp_path):
+    from state_backend import SQLiteBackend
+
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    limiter = backend.rate_limiter("api", 100)
+    on_loop = _record_loop(monkeypatch, limiter)
+    monkeypatch.setattr(api, "STATE", backend)
+    monkeypatch.setattr(api, "RATE_LIMITER", limiter)
+    monkeypatch.setattr(api, "API_RATE_LIMIT_PER_MIN", 1)
+    client = TestClient(api.app)
+    assert client.get("/details", params={"id": "x"}).status_code == 404
+    assert client.get("/details", params={"id": "x"}).status_code == 429
+    assert on_loop == [False, False]
+
+
+def test_shared_tool_rate_limit_runs_off_event_loop(monkeypatch, tmp_path):
+    from state_backend import SQLiteBackend
+
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    limiter = backend.rate_limiter("tools", 100)
+    on_loop = _record_loop(monkeypatch, limiter)
+    monkeypatch.setattr(api.dispatcher, "_STATE", backend)
+    monkeypatch.setattr(api.dispatcher, "_RATE_LIMITER", limiter)
+    api.RATE_LIMITER.clear()
+    client = TestClient(api.app)
+    resp = client.post("/v1/tools.call", json={"name": "system.toolspec", "args": {}})
+    assert resp.json()["kind"] == "ok"
+    assert on_loop == [False]
+
+
 def test_rate_limit_trust_proxy(monkeypatch):
     api.ELEMENT_CACHE.clear()
     api.BOUNDS_CACHE.clear()
@@ -242,7 +309,7 @@ def test_rate_limit_trust_proxy(monkeypatch):
     )
     monkeypatch.setattr(api, "API_RATE_LIMIT_PER_MIN", 1)
     monkeypatch.setattr(api, "TRUST_PROXY", True)
-    api._REQUEST_LOG.clear()
+    api.RATE_LIMITER.clear()
     client = TestClient(api.app)
     # X-Forwarded-For may include multiple comma-separated IP addresses; ensure
     # the first one is used for rate limiting.
@@ -344,6 +411,7 @@ def test_tools_call_web_and_archive(monkeypatch, tmp_path):
     big = tmp_path / "b.zip"
     with zipfile.ZipFile(big, "w") as z:
         z.writestr("a.txt", "a" * (tools.archive.MAX_BYTES + 1))
+        z.writestr("bomb.txt", b"\0" * 2_000_000, zipfile.ZIP_DEFLATED)
     resp = client.post(
         "/v1/tools.call",
         json={
@@ -356,6 +424,21 @@ def test_tools_call_web_and_archive(monkeypatch, tmp_path):
         },
         headers={"X-API-Key": "secret"},
     )
+    # large members are previewed one window at a time
+    assert resp.status_code == 200
+    assert resp.json()["next_offset"] == tools.archive.MAX_BYTES
+    resp = client.post(
+        "/v1/tools.call",
+        json={
+            "name": "archive.read",
+            "args": {
+                "path": str(big),
+                "inner_path": "bomb.txt",
+                "allow": [str(tmp_path)],
+            },
+        },
+        headers={"X-API-Key": "secret"},
+    )
     assert resp.status_code == 400
 
     traversal = tmp_path / "t.zip"
@@ -387,6 +470,26 @@ def test_tools_auth_required():
     api.API_KEY = ""
 
 
+def test_tools_call_deadline_and_priority_headers():
+    client = TestClient(api.app)
+    call = {"name": "system.info", "args": {}}
+    resp = client.post(
+        "/v1/tools.call", json=call, headers={"X-Request-Deadline": "soon"}
+    )
+    assert resp.status_code == 400
+    resp = client.post(
+        "/v1/tools.call",
+        json=call,
+        headers={"X-Request-Deadline": str(time.time() - 1)},
+    )
+    assert resp.status_code == 504
+    resp = client.post(
+        "/v1/tools.call", json=call, headers={"X-Request-Priority": "urgent"}
+    )
+    assert resp.status_code == 400
+    assert resp.json()["error"]["code"] == "bad_args"
+
+
 def test_tools_call_payload_limit(tmp_path):
     api.API_KEY = "secret"
     client = TestClient(api.app)
@@ -402,3 +505,273 @@ def test_tools_call_payload_limit(tmp_path):
     assert resp.status_code == 400
     assert resp.json()["error"]["code"] == "bad_args"
     api.API_KEY = ""
+
+
+def _counting_describe():
+    calls = {"n": 0}
+
+    def fake(x=None, y=None):
+        i = calls["n"]
+        calls["n"] += 1
+        info = fake_describe_under_cursor()
+        info["cursor"] = {"x": i, "y": 0}
+        info["text"] = {"chosen": str(i // 3), "source": "uia"}
+        return info
+
+    return fake
+
+
+def test_inspect_stream_websocket_change_only(monkeypatch):
+    api.ELEMENT_CACHE.clear()
+    monkeypatch.setattr(api.resolve, "describe_under_cursor", _counting_describe())
+    monkeypatch.setattr(api.HOVER_HUB, "hz", 200.0)
+    client = TestClient(api.app)
+    with client.websocket_connect("/inspect/stream?delta=true") as ws:
+        first = ws.receive_json()["data"]
+        second = ws.receive_json()["data"]
+    assert first["type"] == "key" and first["data"]["text"]["chosen"] == "0"
+    # samples 1 and 2 only moved the cursor, so they were not published
+    assert second == {
+        "seq": 2,
+        "type": "delta",
+        "set": {"/cursor/x": 3, "/text/chosen": "1"},
+    }
+    assert "c1" in api.ELEMENT_CACHE
+    deadline = time.monotonic() + 2
+    while api.HOVER_HUB.subscribers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert api.HOVER_HUB.subscribers == 0
+
+
+def test_inspect_stream_websocket_checks_origin_and_rate(monkeypatch):
+    monkeypatch.setattr(api.resolve, "describe_under_cursor", _counting_describe())
+    monkeypatch.setattr(api.HOVER_HUB, "hz", 200.0)
+    monkeypatch.setattr(api, "CORS_ORIGINS", ["https://app.example"])
+    client = TestClient(api.app)
+    with pytest.raises(WebSocketDisconnect) as denied:
+        with client.websocket_connect(
+            "/inspect/stream", headers={"Origin": "https://evil.example"}
+        ):
+            pass
+    assert denied.value.code == 1008
+    with client.websocket_connect(
+        "/inspect/stream", headers={"Origin": "https://app.example"}
+    ) as ws:
+        assert ws.receive_json()["ok"] is True
+
+    monkeypatch.setattr(api.RATE_LIMITER, "check", lambda key, limit: 1.0)
+    with pytest.raises(WebSocketDisconnect) as limited:
+        with client.websocket_connect("/inspect/stream"):
+            pass
+    assert limited.value.code == 1013
+
+
+def test_inspect_stream_sse(monkeypatch):
+    monkeypatch.setattr(api.resolve, "describe_under_cursor", _counting_describe())
+    monkeypatch.setattr(api.HOVER_HUB, "hz", 200.0)
+
+    async def read_two():
+        resp = await api.inspect_stream(max_hz=None, delta=False)
+        assert resp.media_type == "text/event-stream"
+        it = resp.body_iterator
+        events = [await it.__anext__(), await it.__anext__()]
+        await it.aclose()
+        return events
+
+    events = asyncio.run(read_two())
+    assert all(e.startswith("event: inspect\ndata: ") for e in events)
+    payloads = [json.loads(e.split("data: ", 1)[1]) for e in events]
+    assert [p["data"]["text"]["chosen"] for p in payloads] == ["0", "1"]
+    assert api.HOVER_HUB.subscribers == 0
+
+
+def test_stream_subscriber_coalesces_slow_consumer():
+    from hover_hub import Subscriber
+
+    async def run():
+        sub = Subscriber(asyncio.get_running_loop(), max_hz=1000)
+        for i in range(5):
+            sub.offer({"control_id": str(i)})
+        record = await sub.next()
+        assert await sub.next(timeout=0.01) is None
+        return record, sub.coalesced
+
+    record, coalesced = asyncio.run(run())
+    assert record == {"control_id": "4"} and coalesced == 4
+
+
+def test_singleflight_coalesces_concurrent_calls():
+    import threading
+
+    from singleflight import Singleflight
+
+    metrics_mod = api.metrics
+    metrics_mod.reset()
+    flight = Singleflight("test")
+    gate = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        gate.wait(2)
+        return {"n": len(calls)}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 2
+    while (
+        sum(metrics_mod.summary()["coalesce_total"].get("test", {}).values()) < 5
+        and time.monotonic() < deadline
+    ):
+        time.sleep(0.005)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [{"n": 1}] * 5
+    assert metrics_mod.summary()["coalesce_total"]["test"] == {
+        "executed": 1,
+        "coalesced": 4,
+    }
+    # no reuse window: the next call runs again
+    assert flight.do("k", lambda: "again") == "again"
+
+
+def test_inspect_reuse_window(monkeypatch):
+    calls = []
+
+    def fake_desc(x=None, y=None):
+        calls.append((x, y))
+        return fake_describe_under_cursor(x, y)
+
+    monkeypatch.setattr(api.resolve, "describe_under_cursor", fake_desc)
+    monkeypatch.setattr(api.INSPECT_FLIGHT, "window_ms", 60_000)
+    api.INSPECT_FLIGHT.clear()
+    api.RATE_LIMITER.clear()
+    api.metrics.reset()
+    client = TestClient(api.app)
+    try:
+        assert client.get("/inspect").status_code == 200
+        assert client.get("/inspect").status_code == 200
+        assert client.get("/inspect", params={"x": 1, "y": 2}).status_code == 200
+    finally:
+        api.INSPECT_FLIGHT.clear()
+    assert calls == [(None, None), (1, 2)]
+    data = client.get("/metrics").json()["data"]
+    assert data["coalesce_total"]["/inspect"] == {"executed": 2, "reused": 1}
+
+
+def test_snapshot_etag_and_encoded_cache(monkeypatch):
+    pixels = {"value": b"a"}
+    saves = []
+
+    class CountingImage(FakeImage):
+        def save(self, buf, format):
+            saves.append(format)
+            super().save(buf, format)
+
+    monkeypatch.setattr(
+        api.screenshot, "capture", lambda region: CountingImage(pixels["value"])
+    )
+    api.SNAPSHOT_CACHE.clear()
+    client = TestClient(api.app)
+    params = {"region": "0,0,1,1"}
+
+    first = client.get("/snapshot", params=params)
+    etag = first.headers["etag"]
+    assert first.content == b"fake-PNG"
+
+    resp = client.get("/snapshot", params=params)
+    assert resp.content == b"fake-PNG"
+    assert saves == ["PNG"]
+
+    resp = client.get("/snapshot", params=params, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+    assert resp.content == b""
+    resp = client.get(
+        "/snapshot", params=params, headers={"If-None-Match": f'"x", W/{etag}'}
+    )
+    assert resp.status_code == 304
+    assert saves == ["PNG"]
+
+    resp = client.get("/snapshot", params={**params, "format": "jpeg"})
+    assert resp.headers["content-type"] == "image/jpeg"
+    assert resp.headers["etag"] == etag
+    assert saves == ["PNG", "JPEG"]
+
+    pixels["value"] = b"b"
+    resp = client.get("/snapshot", params=params, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+    assert saves == ["PNG", "JPEG", "PNG"]
+
+    resp = client.get("/snapshot", params={**params, "format": "gif"})
+    assert resp.status_code == 400
+    assert resp.json()["error"]["code"] == "invalid_format"
+
+
+def test_snapshot_cache_is_byte_bounded():
+    cache = api._EncodedSnapshotCache(10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") == b"12345"
+    cache.put("c", b"123")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.bytes == 8
+    cache.put("big", b"x" * 11)
+    assert cache.get("big") is None
+
+
+def test_rate_limit_per_route_and_api_key(monkeypatch):
+    monkeypatch.setattr(
+        api.resolve, "describe_under_cursor", fake_describe_under_cursor
+    )
+    monkeypatch.setattr(api, "API_RATE_LIMIT_PER_MIN", 100)
+    monkeypatch.setattr(api, "ROUTE_RATE_LIMITS", {"/inspect": 1})
+    monkeypatch.setattr(api, "API_KEY", "k")
+    monkeypatch.setattr(api, "API_KEY_RATE_LIMIT_PER_MIN", 1)
+    api.RATE_LIMITER.clear()
+    api.INSPECT_FLIGHT.clear()
+    client = TestClient(api.app)
+    assert client.get("/inspect").status_code == 200
+    resp = client.get("/inspect")
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "60"
+    # other routes use their own bucket and the global limit
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/metrics").status_code == 200
+    # a valid API key has its own bucket and limit
+    headers = {"X-API-Key": "k"}
+    assert client.get("/v1/tools.list", headers=headers).status_code == 200
+    assert client.get("/v1/tools.list", headers=headers).status_code == 429
+    assert client.get("/v1/tools.list", headers={"X-API-Key": "x"}).status_code == 401
+    api.RATE_LIMITER.clear()
+
+
+def test_admission_sheds_with_overloaded_envelope(monkeypatch):
+    monkeypatch.setattr(
+        api.resolve, "describe_under_cursor", fake_describe_under_cursor
+    )
+    pool = api.AdaptiveLimiter("/inspect", initial=1, max_limit=1)
+    monkeypatch.setattr(api, "ADMISSION_POOLS", {"/inspect": pool})
+    api.RATE_LIMITER.clear()
+    api.INSPECT_FLIGHT.clear()
+    client = TestClient(api.app)
+    assert client.get("/inspect").status_code == 200
+    assert pool.in_flight == 0
+    assert pool.try_acquire()
+    resp = client.get("/inspect")
+    assert resp.status_code == 503
+    assert resp.json()["error"]["code"] == "overloaded"
+    assert resp.headers["Retry-After"] == "1"
+    pool.release(1)
+    gauges = client.get("/metrics").json()["data"]["gauges"]["admission"]
+    assert gauges["/inspect.shed_total"] == 1
+    assert gauges["/inspect.limit"] == 1
+    api.RATE_LIMITER.clear()
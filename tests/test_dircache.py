@@ -0,0 +1,79 @@
+import os
+import time
+from pathlib import Path
+
+import metrics
+from tools import fs
+from tools.dircache import DirCache, PathTrie
+
+
+def _age(path: Path, seconds: float = 60.0) -> None:
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_dir_cache_revalidates_by_mtime(tmp_path):
+    metrics.reset()
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "sub").mkdir()
+    _age(tmp_path)
+    cache = DirCache(max_dirs=8)
+
+    first = cache.entries(str(tmp_path))
+    assert [e.name for e in first] == ["a.txt", "sub"]
+    assert cache.entries(str(tmp_path)) is first
+    assert [e.kind for e in first] == ["file", "dir"]
+
+    (tmp_path / "b.txt").write_text("b")
+    # modified just now: listed fresh and not cached until it settles
+    assert [e.name for e in cache.entries(str(tmp_path))] == ["a.txt", "b.txt", "sub"]
+    assert len(cache) == 0
+    _age(tmp_path)
+    cache.entries(str(tmp_path))
+    assert len(cache) == 1
+
+    summary = metrics.summary()
+    assert summary["fs_cache_total"]["dir"] == {"miss": 2, "hit": 1, "stale": 1}
+    assert summary["fs_cache_hit_ratio"]["dir"] == 0.25
+
+
+def test_dir_cache_is_bounded(tmp_path):
+    cache = DirCache(max_dirs=2)
+    for name in ("x", "y", "z"):
+        (tmp_path / name).mkdir()
+        _age(tmp_path / name)
+        cache.entries(str(tmp_path / name))
+    assert len(cache) == 2
+
+
+def test_fs_list_sees_changes_through_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(fs, "_DIR_CACHE", DirCache())
+    (tmp_path / "a.txt").write_text("a")
+    _age(tmp_path)
+    allow = [str(tmp_path)]
+    assert fs.list(str(tmp_path), allow=allow)["result"] == ["a.txt"]
+    (tmp_path / "a.txt").write_text("longer")
+    # content changes do not touch the directory, stat data is always fresh
+    assert fs.list(str(tmp_path), allow=allow, stat=True)["result"][0]["size"] == 6
+    (tmp_path / "a.txt").unlink()
+    assert fs.list(str(tmp_path), allow=allow)["result"] == []
+
+
+def test_path_trie_and_resolve_allowed(tmp_path, monkeypatch):
+    trie = PathTrie([tmp_path / "a", tmp_path / "b" / "c"])
+    assert trie.covers(tmp_path / "a")
+    assert trie.covers(tmp_path / "a" / "x" / "y")
+    assert trie.covers(tmp_path / "b" / "c" / "d")
+    assert not trie.covers(tmp_path / "b")
+    assert not trie.covers(tmp_path / "ab")
+    assert not PathTrie().covers(tmp_path)
+
+    monkeypatch.setattr(fs, "ALLOWED", [])
+    inside = tmp_path / "inside"
+    inside.mkdir()
+    (inside / "escape").symlink_to(tmp_path)
+    allow = [str(inside)]
+    assert fs.resolve_allowed(str(inside / "f.txt"), allow) == inside / "f.txt"
+    assert fs.resolve_allowed(str(inside / ".." / "f.txt"), allow) is None
+    assert fs.resolve_allowed(str(inside / "escape"), allow) is None
+    assert fs.resolve_allowed(str(inside)) is None
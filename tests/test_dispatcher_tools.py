@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import threading
 import time
 import zipfile
 
 import metrics
 
-from dispatcher import dispatch
+from dispatcher import dispatch, dispatch_async
+from executor import Cancelled
 from registry import clear, register_tool, register_alias
 import tools
 
@@ -35,7 +38,11 @@ def test_fs_and_archive(tmp_path):
     env = dispatch(
         {
             "name": "fs.list",
-            "args": {"path": str(tmp_path), "recursive": True, "allow": [str(tmp_path)]},
+            "args": {
+                "path": str(tmp_path),
+                "recursive": True,
+                "allow": [str(tmp_path)],
+            },
         },
         request_id="2b",
     )
@@ -115,6 +122,22 @@ def test_dispatcher_errors(tmp_path):
     env = dispatch({"name": "slow", "args": {}}, request_id="9")
     assert env["code"] == "timeout" and "elapsed_ms" in env
 
+    def past_deadline():
+        raise Cancelled("tool call deadline passed")
+
+    register_tool(
+        name="expired",
+        version="1",
+        summary="",
+        safety="ro",
+        timeout_ms=1000,
+        rate_limit_per_min=10,
+        enabled_in_safe_mode=True,
+        func=past_deadline,
+    )
+    env = dispatch({"name": "expired", "args": {}}, request_id="9b")
+    assert env["code"] == "timeout"
+
     env = dispatch({"name": "fs.read", "args": {}}, request_id="10")
     assert env["code"] == "bad_args"
 
@@ -159,3 +182,56 @@ def test_registry_alias_dispatch():
     register_alias("orig", "alias")
     env = dispatch({"name": "alias", "args": {}}, request_id="1")
     assert env["kind"] == "ok" and called
+
+
+def _register(name, func, timeout_ms=1000, **extra):
+    register_tool(
+        name=name,
+        version="1",
+        summary="",
+        safety="ro",
+        timeout_ms=timeout_ms,
+        rate_limit_per_min=0,
+        enabled_in_safe_mode=True,
+        func=func,
+        **extra,
+    )
+
+
+def test_dispatch_async_runs_async_tools_on_loop():
+    clear()
+
+    async def nap(n):
+        await asyncio.sleep(0.05)
+        return n
+
+    async def stuck():
+        await asyncio.sleep(10)
+
+    _register("nap", nap, max_concurrency=500)
+    _register("stuck", stuck, timeout_ms=50)
+    _register("double", lambda n: n * 2)
+
+    async def main():
+        threads = threading.active_count()
+        start = time.monotonic()
+        envs = await asyncio.gather(
+            *(
+                dispatch_async({"name": "nap", "args": {"n": i}}, request_id=str(i))
+                for i in range(300)
+            )
+        )
+        elapsed = time.monotonic() - start
+        assert [e["result"] for e in envs] == list(range(300))
+        assert elapsed < 2
+        assert threading.active_count() == threads
+        env = await dispatch_async({"name": "stuck", "args": {}}, request_id="s")
+        assert env["code"] == "timeout"
+        env = await dispatch_async({"name": "double", "args": {"n": 4}}, request_id="d")
+        assert env["result"] == 8
+        env = await dispatch_async({"name": "double", "args": {}}, request_id="b")
+        assert env["code"] == "bad_args"
+
+    asyncio.run(main())
+    # async tools still work from the sync path
+    assert dispatch({"name": "nap", "args": {"n": 7}}, request_id="x")["result"] == 7
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import threading
+import time
+
+import pytest
+
+from executor import (
+    SHM_MIN_BYTES,
+    Cancelled,
+    CancelToken,
+    Overloaded,
+    ShmRef,
+    ToolExecutor,
+    _decode_binary,
+    _pack,
+    _unpack,
+    check_cancelled,
+)
+
+
+def make_tool(func, **extra):
+    return {"name": func.__name__, "safety": "read", "func": func, **extra}
+
+
+def stuck(seconds=30.0):
+    time.sleep(seconds)
+
+
+def test_threads_are_reused():
+    ex = ToolExecutor(2)
+    tool = make_tool(lambda: threading.get_ident())
+    idents = {ex.run(tool, {}, 1.0) for _ in range(20)}
+    assert len(idents) <= 2
+    ex.shutdown()
+
+
+def test_timeout_cancels_token_and_tracks_leak():
+    ex = ToolExecutor(2)
+    seen = []
+
+    def loop():
+        try:
+            while True:
+                check_cancelled()
+                time.sleep(0.01)
+        except Cancelled:
+            seen.append("cancelled")
+
+    with pytest.raises(TimeoutError):
+        ex.run(make_tool(loop), {}, 0.05)
+    deadline = time.monotonic() + 2
+    while not seen and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert seen == ["cancelled"]
+    stats = ex.stats()
+    assert stats["live"] == 0 and stats["leaked"] == 0
+    ex.shutdown()
+
+
+def test_remaining_raises_once_the_deadline_passed():
+    token = CancelToken(time.monotonic() + 60)
+    assert token.remaining(10) == 10
+    assert 0 < CancelToken(time.monotonic() + 1).remaining(10) <= 1
+    assert CancelToken().remaining(10) == 10
+    with pytest.raises(Cancelled):
+        CancelToken(time.monotonic() - 1).remaining(10)
+    token.cancel()
+    with pytest.raises(Cancelled):
+        token.remaining(10)
+
+
+def test_bulkhead_rejects_when_full():
+    ex = ToolExecutor(4)
+    release = threading.Event()
+
+    def wait():
+        release.wait(2)
+        return "done"
+
+    tool = make_tool(wait, max_concurrency=1)
+    t = threading.Thread(target=ex.run, args=(tool, {}, 5.0))
+    t.start()
+    time.sleep(0.05)
+    with pytest.raises(Overloaded):
+        ex.run(tool, {}, 1.0)
+    release.set()
+    t.join()
+    assert ex.run(tool, {}, 1.0) == "done"
+    assert ex.stats()["bulkhead_rejected_total"] == 1
+    ex.shutdown()
+
+
+def test_process_isolation_terminates_stuck_tool():
+    ex = ToolExecutor(1)
+    tool = make_tool(stuck, executor="isolated")
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        ex.run(tool, {}, 0.3)
+    assert time.monotonic() - start < 5
+    assert ex.stats()["processes"] == 0
+    assert ex.run(make_tool(pow, executor="isolated"), {"base": 2, "exp": 5}, 5.0) == 32
+
+
+def reverse(data, label):
+    return {"label": label, "data": data[::-1]}
+
+
+def test_process_pool_moves_large_payloads_through_shared_memory():
+    ex = ToolExecutor(1, process_workers=2)
+    tool = make_tool(reverse, executor="process")
+    big = bytes(range(256)) * 1024
+    out = ex.run(tool, {"data": big, "label": "x"}, 10.0)
+    assert out == {"label": "x", "data": big[::-1]}
+    text = "a" * SHM_MIN_BYTES + "b"
+    out = asyncio.run(ex.run_async(tool, {"data": text, "label": "y"}, 10.0))
+    assert out["data"] == text[::-1]
+    blocks = []
+    packed = _pack({"data": big, "small": "s"}, blocks)
+    assert isinstance(packed["data"], ShmRef) and packed["small"] == "s"
+    assert _unpack(packed, unlink=True)["data"] == big
+    assert ex.stats()["live"] == 0
+    ex.shutdown()
+
+
+def image_size(png_base64, image=None):
+    return {"png_base64": png_base64, "size": len(image or b"")}
+
+
+def test_process_pool_decodes_binary_args():
+    ex = ToolExecutor(1, process_workers=1)
+    tool = make_tool(
+        image_size, executor="process", binary_args={"png_base64": "image"}
+    )
+    raw = bytes(range(256)) * 1024
+    encoded = base64.b64encode(raw).decode("ascii")
+    args = _decode_binary(tool, {"png_base64": encoded})
+    assert args == {"png_base64": None, "image": raw}
+    out = ex.run(tool, {"png_base64": encoded}, 10.0)
+    assert out == {"png_base64": None, "size": len(raw)}
+    # left for the tool to reject
+    assert _decode_binary(tool, {"png_base64": "abc"}) == {"png_base64": "abc"}
+    ex.shutdown()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+
+import pytest
+
+import hover_pipeline
+
+
+@pytest.fixture
+def Image(monkeypatch):
+    # other test modules stub PIL; workers need the real package
+    for name in list(sys.modules):
+        if name == "PIL" or name.startswith("PIL."):
+            monkeypatch.delitem(sys.modules, name)
+    return pytest.importorskip("PIL.Image")
+
+
+def fake_ocr(img):
+    return f"{img.size[0]}x{img.size[1]}", 0.9
+
+
+def slow_ocr(img):
+    time.sleep(0.2)
+    return fake_ocr(img)
+
+
+def make_frame(Image, x, image=True):
+    return {
+        "cursor": {"x": x, "y": 0},
+        "window": {},
+        "element": {},
+        "uia_text": "",
+        "uia_conf": 0.0,
+        "image": Image.new("RGB", (40 + x, 20)) if image else None,
+        "crop": (0, 0, 10 + x, 5) if image else None,
+        "ocr_text": "",
+        "ocr_conf": 0.0,
+        "timings": {},
+        "errors": {},
+    }
+
+
+def wait_for(pipeline, key, value, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while pipeline.stats()[key] < value and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pipeline_ocr_in_workers_preserves_order(Image):
+    out = []
+    pipe = hover_pipeline.HoverPipeline(2, out.append, ocr_func=fake_ocr)
+    pipe.start()
+    try:
+        pipe.submit(make_frame(Image, 1))
+        pipe.submit(make_frame(Image, 2, image=False))
+        pipe.submit(make_frame(Image, 3))
+        wait_for(pipe, "emitted_total", 3)
+    finally:
+        pipe.stop()
+    assert [info["cursor"]["x"] for info in out] == [1, 2, 3]
+    assert out[0]["text"]["ocr"] == "11x5"
+    assert out[1]["errors"]["extract_text"] == "missing image"
+    assert out[2]["text"]["ocr"] == "13x5"
+
+
+def test_pipeline_drops_superseded_frames(Image):
+    out = []
+    pipe = hover_pipeline.HoverPipeline(1, out.append, ocr_func=slow_ocr)
+    pipe.start()
+    try:
+        for x in range(4):
+            pipe.submit(make_frame(Image, x))
+        stats = pipe.stats()
+        assert stats["in_flight"] == 1 and stats["waiting"] == 1
+        wait_for(pipe, "emitted_total", 2)
+    finally:
+        pipe.stop()
+    stats = pipe.stats()
+    assert stats["dropped_total"] == 2
+    assert [info["cursor"]["x"] for info in out] == [0, 3]
+
+
+def crashing_ocr(img):
+    if img.size[0] == 11:
+        os._exit(1)
+    return fake_ocr(img)
+
+
+def hanging_ocr(img):
+    if img.size[0] == 11:
+        time.sleep(60)
+    return fake_ocr(img)
+
+
+@pytest.mark.parametrize(
+    "ocr, error", [(crashing_ocr, "ocr_worker_died"), (hanging_ocr, "ocr_timeout")]
+)
+def test_pipeline_gives_up_on_lost_frames(Image, ocr, error):
+    out = []
+    pipe = hover_pipeline.HoverPipeline(1, out.append, ocr_func=ocr, job_timeout=0.5)
+    pipe.start()
+    try:
+        pipe.submit(make_frame(Image, 1))
+        wait_for(pipe, "emitted_total", 1)
+        # a replacement worker takes the next frame
+        pipe.submit(make_frame(Image, 2))
+        wait_for(pipe, "emitted_total", 2)
+    finally:
+        pipe.stop()
+    assert [info["cursor"]["x"] for info in out] == [1, 2]
+    assert out[0]["errors"]["extract_text"] == error
+    assert out[1]["text"]["ocr"] == "12x5"
+    assert pipe.stats()["abandoned_total"] == 1
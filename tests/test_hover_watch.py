@@ -1,5 +1,8 @@
 import sys
 import time
+
+import pytest
+
 import hover_watch
 
 
@@ -22,6 +25,127 @@ def test_hover_watch_uses_settings(monkeypatch):
     monkeypatch.setattr(hover_watch, "describe_under_cursor", fake_desc)
     monkeypatch.setattr(hover_watch, "emit_cli_json_line", fake_emit)
     monkeypatch.setattr(time, "sleep", fake_sleep)
+    monkeypatch.setattr(time, "monotonic", lambda: 100.0)
     hover_watch.main()
     assert called["emitted"]
     assert called["delay"] == 0.5
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+def test_scheduler_deadlines_do_not_drift():
+    clock = FakeClock()
+    sched = hover_watch.TickScheduler(10.0, clock=clock, sleep=clock.sleep)
+    sched.wait()
+    for _ in range(5):
+        clock.now += 0.03  # processing time is absorbed by the deadline
+        sched.wait()
+    assert abs(clock.now - 0.5) < 1e-9
+    assert all(abs(d - 0.07) < 1e-9 for d in clock.sleeps)
+    assert sched.stats()["achieved_hz"] == 10.0
+    assert sched.stats()["skipped_ticks"] == 0
+
+
+def test_scheduler_drops_missed_ticks():
+    clock = FakeClock()
+    sched = hover_watch.TickScheduler(10.0, clock=clock, sleep=clock.sleep)
+    sched.wait()
+    clock.now += 0.35
+    sched.wait()
+    assert sched.skipped == 2
+    assert clock.sleeps == []
+    clock.now = 0.36
+    sched.wait()
+    assert abs(clock.now - 0.4) < 1e-9
+
+
+def test_scheduler_decays_when_idle():
+    sched = hover_watch.TickScheduler(10.0, 1.0)
+    for _ in range(20):
+        sched.feedback(False)
+    assert sched.hz == 1.0
+    sched.feedback(True)
+    assert sched.hz == 10.0
+
+
+def _sample(control_id, chosen, left=0, digest="d"):
+    return {
+        "cursor": {"x": left, "y": 0},
+        "element": {"bounds": {"left": left, "top": 0, "right": 10, "bottom": 10}},
+        "text": {"chosen": chosen, "source": "uia"},
+        "control_id": control_id,
+        "state_digest": {"last_window_id": digest},
+        "timings": {"extract_text": {"start": 1.0, "end": 2.0}},
+    }
+
+
+def test_delta_encoder_change_only_and_keyframes():
+    enc = hover_watch.DeltaEncoder(keyframe_every=3)
+    first = enc.encode(_sample("c1", "a"))
+    assert first["type"] == "key" and "timings" not in first["data"]
+    assert enc.encode(_sample("c1", "a", digest="other")) is None
+    delta = enc.encode(_sample("c1", "b"))
+    assert delta == {"seq": 2, "type": "delta", "set": {"/text/chosen": "b"}}
+    moved = enc.encode(_sample("c2", "b", left=5))
+    assert moved["type"] == "delta"
+    assert moved["set"]["/element/bounds/left"] == 5
+    assert enc.encode(_sample("c3", "b"))["type"] == "key"
+
+
+def test_delta_records_rebuild_samples():
+    enc = hover_watch.DeltaEncoder(keyframe_every=100)
+    samples = [_sample("c1", "a"), _sample("c2", "b", left=3), _sample("c2", "c")]
+    del samples[2]["state_digest"]
+    state = None
+    for sample in samples:
+        state = hover_watch.apply_record(state, enc.encode(sample))
+        expected = {k: v for k, v in sample.items() if k != "timings"}
+        assert state == expected
+    assert hover_watch.apply_record(None, {"type": "delta", "set": {}}) is None
+
+
+def test_delta_paths_escape_keys():
+    enc = hover_watch.DeltaEncoder(keyframe_every=100)
+    old = {"props": {"a.b": 1, "c/d": 2, "e~f": 3, "gone": 0}}
+    new = {"props": {"a.b": 10, "c/d": 20, "e~f": 30}}
+    state = hover_watch.apply_record(None, enc.encode(old))
+    record = enc.encode(new | {"control_id": "other"})
+    assert record["set"]["/props/c~1d"] == 20
+    assert record["unset"] == ["/props/gone"]
+    assert hover_watch.apply_record(state, record) == new | {"control_id": "other"}
+
+
+def test_hover_watch_msgpack_frames(monkeypatch, capsysbinary):
+    msgpack = pytest.importorskip("msgpack")
+    monkeypatch.setattr(
+        sys, "argv", ["hover_watch.py", "--changes-only", "--format", "msgpack"]
+    )
+    samples = iter([_sample("c1", "a"), _sample("c1", "a"), _sample("c1", "b")])
+
+    def fake_desc():
+        try:
+            return next(samples)
+        except StopIteration:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(hover_watch, "describe_under_cursor", fake_desc)
+    monkeypatch.setattr(time, "sleep", lambda delay: None)
+    hover_watch.main()
+    out = capsysbinary.readouterr().out
+    records = []
+    while out:
+        size = int.from_bytes(out[:4], "big")
+        records.append(msgpack.unpackb(out[4 : 4 + size]))
+        out = out[4 + size :]
+    assert [r["type"] for r in records] == ["key", "delta"]
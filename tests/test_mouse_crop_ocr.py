@@ -4,7 +4,10 @@ import types
 
 # stub sanitize deps
 sys.modules["agent_local"] = types.SimpleNamespace(
-    _redact=lambda x: x, _truncate=lambda x: x
+    _redact=lambda x: x,
+    _truncate=lambda x: x,
+    MAX_TOOL_RESULT_CHARS=1000,
+    MAX_TOOL_RESULT_TOKENS=512,
 )
 
 from tools import ui, system, image  # noqa: E402
@@ -0,0 +1,45 @@
+import os
+import stat
+
+import pytest
+
+import private_paths
+from tools import httpcache
+
+posix_only = pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@posix_only
+def test_user_cache_dir_follows_xdg(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert private_paths.user_cache_dir() == str(tmp_path / "nuv2")
+
+
+@posix_only
+def test_private_dir_and_file_modes(tmp_path):
+    old = os.umask(0o022)
+    try:
+        db = tmp_path / "cache" / "nested" / "http.sqlite3"
+        httpcache.HttpCache(str(db))
+        assert _mode(db.parent) == 0o700
+        assert _mode(db) == 0o600
+
+        shared = tmp_path / "shared.sqlite3"
+        shared.write_bytes(b"")
+        shared.chmod(0o644)
+        private_paths.private_file(str(shared))
+        assert _mode(shared) == 0o600
+    finally:
+        os.umask(old)
+
+
+@posix_only
+def test_foreign_owner_is_refused(tmp_path, monkeypatch):
+    path = tmp_path / "x.sqlite3"
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(tmp_path).st_uid + 1)
+    with pytest.raises(PermissionError):
+        private_paths.private_file(str(path))
@@ -0,0 +1,44 @@
+import pytest
+
+from rate_limit import GCRALimiter, parse_route_limits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_gcra_burst_then_steady_rate():
+    clock = FakeClock()
+    limiter = GCRALimiter(clock=clock)
+    assert [limiter.check("ip", 3) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.check("ip", 3) == pytest.approx(20.0)
+    clock.now += 19.5
+    assert limiter.check("ip", 3) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.check("ip", 3) == 0.0
+    assert limiter.check("other", 3) == 0.0
+    # a zero limit refuses every request, as the sliding window did
+    assert limiter.check("new", 0) == 60.0
+    assert len(limiter) == 2
+
+
+def test_gcra_client_table_is_lru_bounded():
+    clock = FakeClock()
+    limiter = GCRALimiter(2, clock=clock)
+    limiter.check("a", 1)
+    limiter.check("b", 1)
+    assert limiter.check("a", 1) > 0
+    limiter.check("c", 1)
+    assert len(limiter) == 2
+    assert limiter.stats()["evicted_total"] == 1
+    # "b" was least recently used and forgot its state
+    assert limiter.check("b", 1) == 0.0
+
+
+def test_parse_route_limits():
+    spec = "/snapshot=30, /v1/tools.call=120,bad,/x=y"
+    assert parse_route_limits(spec) == {"/snapshot": 30, "/v1/tools.call": 120}
@@ -118,7 +118,11 @@ def test_ids_and_cache(monkeypatch):
         resolve, "capture_around", lambda pos, bounds=None: ("img", (0, 0, 0, 0))
     )
     monkeypatch.setattr(resolve, "extract_text", lambda img, region=None: ("ocr", 0.5))
+    frame = resolve.capture_frame(0, 0)
     result = resolve.describe_under_cursor(0, 0)
+    # the pipeline sees the ids before OCR runs
+    assert frame["control_id"] == result["control_id"]
+    assert frame["window_id"] == result["window_id"]
     window_path = "/Window:MainWin"
     control_path = "/Window:MainWin/Pane:ContentPane/Edit:InputField"
     expected_window_id = hashlib.sha256(
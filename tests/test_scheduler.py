@@ -0,0 +1,117 @@
+import threading
+import time
+
+import metrics
+import pytest
+from dispatcher import SCHEDULER, dispatch
+from executor import current_token
+from registry import clear, register_tool
+from scheduler import PRIORITIES, PriorityGate
+
+
+def wait_for(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end
+        time.sleep(0.005)
+
+
+def test_gate_orders_by_priority_then_deadline():
+    gate = PriorityGate("t", 1)
+    gate.acquire(PRIORITIES["default"], time.monotonic() + 5)
+    order = []
+
+    def waiter(label, rank, due_in):
+        gate.acquire(rank, time.monotonic() + due_in)
+        order.append(label)
+        gate.release()
+
+    specs = [
+        ("batch", PRIORITIES["batch"], 5),
+        ("default-late", PRIORITIES["default"], 5),
+        ("default-soon", PRIORITIES["default"], 2),
+        ("interactive", PRIORITIES["interactive"], 5),
+    ]
+    threads = [threading.Thread(target=waiter, args=spec) for spec in specs]
+    for t in threads:
+        t.start()
+    wait_for(lambda: gate.stats()["queued"] == 4)
+    gate.release()
+    for t in threads:
+        t.join()
+    assert order == ["interactive", "default-soon", "default-late", "batch"]
+    assert gate.stats() == {"running": 0, "queued": 0, "expired_total": 0}
+
+
+def test_gate_drops_expired_waiters():
+    gate = PriorityGate("t", 1)
+    gate.acquire(0, time.monotonic() + 5)
+    with pytest.raises(TimeoutError):
+        gate.acquire(0, time.monotonic() + 0.05)
+    assert gate.stats() == {"running": 1, "queued": 0, "expired_total": 1}
+    gate.release()
+    gate.acquire(0, time.monotonic() + 1)
+    gate.release()
+    assert gate.stats()["running"] == 0
+
+
+def test_identical_calls_share_one_run():
+    clear()
+    metrics.reset()
+    calls = []
+
+    def look(x):
+        calls.append(x)
+        time.sleep(0.2)
+        return {"x": x}
+
+    register_tool(
+        name="look",
+        version="1",
+        summary="",
+        safety="read",
+        timeout_ms=2000,
+        rate_limit_per_min=0,
+        enabled_in_safe_mode=True,
+        func=look,
+    )
+    envs = []
+    threads = [
+        threading.Thread(
+            target=lambda: envs.append(
+                dispatch({"name": "look", "args": {"x": 1}}, request_id="c")
+            )
+        )
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+    assert envs == [{"kind": "ok", "result": {"x": 1}}] * 5
+    assert metrics.summary()["coalesce_total"]["look"] == {
+        "executed": 1,
+        "coalesced": 4,
+    }
+    assert len(SCHEDULER.flights) == 0
+
+
+def test_deadline_reaches_the_tool():
+    clear()
+    register_tool(
+        name="budget",
+        version="1",
+        summary="",
+        safety="read",
+        timeout_ms=5000,
+        rate_limit_per_min=0,
+        enabled_in_safe_mode=True,
+        func=lambda: current_token().remaining(10),
+    )
+    env = dispatch({"name": "budget"}, request_id="d", deadline=time.time() + 0.5)
+    assert 0 < env["result"] <= 0.5
+    env = dispatch({"name": "budget"}, request_id="d", deadline=time.time() - 1)
+    assert env["code"] == "timeout"
+    env = dispatch({"name": "budget"}, request_id="d", priority="urgent")
+    assert env["code"] == "bad_args"
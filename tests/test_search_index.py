@@ -0,0 +1,148 @@
+import os
+import re
+import types
+from pathlib import Path
+
+import search_index
+from search_index import TrigramIndex, literal_runs, trigrams
+
+
+def _tree(root: Path) -> None:
+    (root / "pkg").mkdir()
+    (root / "pkg" / "alpha.py").write_text("def handle_request():\n    return 1\n")
+    (root / "pkg" / "beta.txt").write_text("nothing here\nHandle_Request later\n")
+    (root / "blob.bin").write_bytes(b"handle_request\0\x01\x02")
+    (root / ".git").mkdir()
+    (root / ".git" / "HEAD").write_text("handle_request")
+
+
+def test_trigrams_and_literal_runs():
+    assert trigrams("AbcD\nxy") == {"abc", "bcd"}
+    assert literal_runs(r"foo\d+barbaz") == ["foo", "barbaz"]
+    assert literal_runs(r"ab.cd") == []
+    assert literal_runs(r"(unclosed") == []
+
+
+def test_search_uses_index_and_skips_binary(tmp_path):
+    root = tmp_path / "src"
+    root.mkdir()
+    _tree(root)
+    index = TrigramIndex(str(tmp_path / "idx.sqlite3"), watch=False)
+    stats = index.refresh([str(root)])
+    assert stats == {"indexed": 3, "removed": 0, "unchanged": 0}
+
+    pattern = re.compile(re.escape("handle_request"), re.IGNORECASE)
+    hits, truncated = index.search(
+        pattern, [str(root)], required=trigrams("handle_request")
+    )
+    assert not truncated
+    assert [(Path(h["path"]).name, h["line"]) for h in hits] == [
+        ("alpha.py", 1),
+        ("beta.txt", 2),
+    ]
+    hits, truncated = index.search(
+        pattern, [str(root)], required=trigrams("handle_request"), limit=1
+    )
+    assert len(hits) == 1 and truncated
+    hits, _ = index.search(
+        pattern, [str(root)], required=trigrams("handle_request"), glob="*.py"
+    )
+    assert [Path(h["path"]).name for h in hits] == ["alpha.py"]
+    assert index.candidates([str(root)], trigrams("absent_word")) == []
+
+
+def test_refresh_is_incremental(tmp_path):
+    root = tmp_path / "src"
+    root.mkdir()
+    _tree(root)
+    index = TrigramIndex(str(tmp_path / "idx.sqlite3"), refresh_s=0.0, watch=False)
+    index.refresh([str(root)])
+    assert index.refresh([str(root)]) == {"indexed": 0, "removed": 0, "unchanged": 3}
+
+    alpha = root / "pkg" / "alpha.py"
+    alpha.write_text("def renamed_entry():\n    pass\n")
+    st = alpha.stat()
+    os.utime(alpha, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    (root / "pkg" / "beta.txt").unlink()
+    assert index.refresh([str(root)]) == {"indexed": 1, "removed": 1, "unchanged": 1}
+    assert index.candidates([str(root)], trigrams("handle_request")) == []
+    assert index.candidates([str(root)], trigrams("renamed_entry")) == [str(alpha)]
+
+    # without force, a fresh scan is not repeated within refresh_s
+    index.refresh_s = 3600.0
+    (root / "new.txt").write_text("renamed_entry again")
+    assert index.refresh([str(root)])["indexed"] == 0
+    assert index.refresh([str(root)], force=True)["indexed"] == 1
+
+
+def test_watch_events_mark_paths_dirty(tmp_path):
+    index = TrigramIndex(str(tmp_path / "idx.sqlite3"), watch=False)
+    root = str(tmp_path)
+    index._scanned[root] = 1.0
+
+    def event(kind, path, is_directory=False, dest=""):
+        return types.SimpleNamespace(
+            event_type=kind, src_path=path, is_directory=is_directory, dest_path=dest
+        )
+
+    index._on_event(root, event("modified", root + "/a.txt"))
+    index._on_event(root, event("moved", root + "/b.txt", dest=root + "/c.txt"))
+    index._on_event(root, event("opened", root + "/d.txt"))
+    # a file change also modifies its parent; that must not force a rescan
+    index._on_event(root, event("modified", root, is_directory=True))
+    assert index._dirty == {root + "/a.txt", root + "/b.txt", root + "/c.txt"}
+    assert root in index._scanned
+    index._on_event(root, event("deleted", root + "/sub", is_directory=True))
+    assert root not in index._scanned
+
+
+def test_symlinks_out_of_the_root_are_not_searched(tmp_path):
+    root = tmp_path / "src"
+    root.mkdir()
+    (root / "a.txt").write_text("inside marker\n")
+    outside = tmp_path / "secret.txt"
+    outside.write_text("secret marker\n")
+    index = TrigramIndex(str(tmp_path / "idx.sqlite3"), watch=False)
+    roots = [str(root)]
+    index.refresh(roots)
+
+    # as a watch event would report it, after the initial scan
+    link = root / "link.txt"
+    link.symlink_to(outside)
+    index._dirty.add(str(link))
+    index.refresh(roots)
+    pattern = re.compile("marker")
+    hits, _ = index.search(pattern, roots, required=trigrams("marker"))
+    assert [h["path"] for h in hits] == [str(root / "a.txt")]
+
+    # an indexed file replaced by a link is dropped at search time
+    (root / "a.txt").unlink()
+    (root / "a.txt").symlink_to(outside)
+    hits, _ = index.search(pattern, roots, required=trigrams("marker"))
+    assert hits == []
+
+
+def test_fs_search_tool(tmp_path, monkeypatch):
+    from tools import fs
+
+    root = tmp_path / "src"
+    root.mkdir()
+    _tree(root)
+    index = TrigramIndex(str(tmp_path / "idx.sqlite3"), watch=False)
+    monkeypatch.setattr(search_index, "_INDEX", index)
+    monkeypatch.setattr(fs, "ALLOWED", [])
+
+    env = fs.search("handle_request", allow=[str(root)], case_sensitive=True)
+    assert env["kind"] == "ok"
+    assert [Path(h["path"]).name for h in env["result"]] == ["alpha.py"]
+
+    env = fs.search(r"handle_\w+\(\)", allow=[str(root)], regex=True)
+    assert [(Path(h["path"]).name, h["text"]) for h in env["result"]] == [
+        ("alpha.py", "def handle_request():")
+    ]
+    env = fs.search("handle", allow=[str(root)], limit=1)
+    assert env["truncated"] is True
+
+    bad = fs.search("(", allow=[str(root)], regex=True)
+    assert bad["kind"] == "error" and bad["code"] == "bad_args"
+    assert fs.search("handle_request")["result"] == []
@@ -0,0 +1,74 @@
+import pytest
+
+import metrics
+import state_backend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sqlite_mapping_is_shared_between_backends(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    a = state_backend.SQLiteBackend(path).mapping("bounds")
+    b = state_backend.SQLiteBackend(path).mapping("bounds")
+    a["c1"] = {"left": 0, "top": 0, "right": 5, "bottom": 5}
+    assert b.get("c1") == {"left": 0, "top": 0, "right": 5, "bottom": 5}
+    assert b.get("missing") is None
+    assert list(b) == ["c1"] and len(b) == 1
+    del b["c1"]
+    assert "c1" not in a
+    a["x"] = {}
+    b.clear()
+    assert len(a) == 0
+
+
+def test_sqlite_rate_limiter_is_shared_and_pruned(tmp_path, monkeypatch):
+    path = str(tmp_path / "state.sqlite3")
+    clock = FakeClock()
+    a = state_backend.SQLiteRateLimiter(
+        state_backend.SQLiteBackend(path), "api", 2, clock=clock
+    )
+    b = state_backend.SQLiteRateLimiter(
+        state_backend.SQLiteBackend(path), "api", 2, clock=clock
+    )
+    assert a.check(("1.2.3.4", "*"), 2) == 0.0
+    assert b.check(("1.2.3.4", "*"), 2) == 0.0
+    assert a.check(("1.2.3.4", "*"), 2) == pytest.approx(30.0)
+    assert b.check(("5.6.7.8", "*"), 0) == 60.0
+    monkeypatch.setattr(state_backend, "PRUNE_EVERY", 1)
+    for ip in ("a", "b", "c"):
+        b.check(ip, 1)
+    assert len(a) == 2 and b.evicted > 0
+    clock.now += 120
+    b.check("d", 1)
+    assert len(a) == 1
+
+
+def test_merge_summaries_sums_counters():
+    local = {"status_total": {"/inspect": {"200": 2}}, "rate_limited_total": 1}
+    other = {
+        "status_total": {"/inspect": {"200": 3, "429": 1}, "/details": {"200": 1}},
+        "rate_limited_total": 2,
+        "gauges": {"ignored": 1},
+    }
+    merged = metrics.merge_summaries(local, [other])
+    assert merged["status_total"] == {
+        "/inspect": {"200": 5, "429": 1},
+        "/details": {"200": 1},
+    }
+    assert merged["rate_limited_total"] == 3
+    assert "gauges" not in merged
+    assert merged["workers"] == 2
+
+
+def test_create_backend_rejects_unknown_kind():
+    assert isinstance(
+        state_backend.create_backend("memory"), state_backend.MemoryBackend
+    )
+    with pytest.raises(ValueError):
+        state_backend.create_backend("redis")
@@ -0,0 +1,152 @@
+import base64
+import gzip
+import io
+import random
+import stat
+import tarfile
+from pathlib import Path
+
+import pytest
+
+import metrics
+import settings
+from tools import archive, tarindex
+
+needs_libz = pytest.mark.skipif(tarindex._libz() is None, reason="no system zlib")
+
+
+@pytest.fixture(autouse=True)
+def _index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_INDEX_DIR", str(tmp_path / "idx"))
+    monkeypatch.setattr(tarindex, "SPAN", 64 * 1024)
+    tarindex._LOADED.clear()
+
+
+def _files():
+    rng = random.Random(0)
+    files = {}
+    for i in range(12):
+        rows = b"".join(b"row %d %d\n" % (i, j) for j in range(rng.randint(0, 20_000)))
+        files[f"logs/f{i}.txt"] = rows + rng.randbytes(rng.randint(0, 3000))
+    return files
+
+
+def _tar_bytes(files, mode="w"):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode=mode) as tf:
+        d = tarfile.TarInfo("logs")
+        d.type = tarfile.DIRTYPE
+        tf.addfile(d)
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def _check_reads(path, files, allow):
+    for name, data in files.items():
+        for offset, length in ((0, 50), (len(data) // 2, 4000), (len(data) - 5, 50)):
+            offset = max(0, offset)
+            env = archive.read(
+                str(path), name, allow=allow, offset=offset, length=length
+            )
+            got = base64.b64decode(env["result"]["bytes_b64"])
+            assert got == data[offset : offset + length], (name, offset)
+            assert env["size"] == len(data)
+
+
+@pytest.mark.parametrize("mode", ["w", "w:gz", "w:bz2", "w:xz"])
+def test_tar_formats_list_and_read(tmp_path, mode):
+    files = _files()
+    path = tmp_path / "a.tar"
+    path.write_bytes(_tar_bytes(files, mode))
+    allow = [str(tmp_path)]
+
+    env = archive.list(str(path), allow=allow, limit=5)
+    assert env["result"] == ["logs", *list(files)[:4]]
+    assert env["total"] == len(files) + 1 and env["next_cursor"] == "5"
+    _check_reads(path, files, allow)
+    assert (
+        archive.read(str(path), "logs", allow=allow)["message"] == "not a regular file"
+    )
+    assert archive.read(str(path), "missing.txt", allow=allow)["code"] == "not_found"
+
+
+@needs_libz
+def test_gzip_checkpoints_and_sidecar(tmp_path):
+    metrics.reset()
+    files = _files()
+    path = tmp_path / "a.tar.gz"
+    path.write_bytes(_tar_bytes(files, "w:gz"))
+    index = tarindex.get_index(str(path), "gz")
+    assert len(index.points) > 3
+    assert index.points[0].out == 0
+    assert all(
+        b.out - a.out >= tarindex.SPAN for a, b in zip(index.points, index.points[1:])
+    )
+
+    idx = Path(settings.ARCHIVE_INDEX_DIR)
+    assert stat.S_IMODE(idx.stat().st_mode) == 0o700
+    assert [stat.S_IMODE(p.stat().st_mode) for p in idx.iterdir()] == [0o600]
+
+    tarindex._LOADED.clear()
+    again = tarindex.get_index(str(path), "gz")
+    assert again.members == index.members and again.points == index.points
+    tarindex.get_index(str(path), "gz")
+    assert metrics.summary()["fs_cache_total"]["tar"] == {
+        "miss": 1,
+        "sidecar": 1,
+        "hit": 1,
+    }
+    _check_reads(path, files, [str(tmp_path)])
+
+    # a rewritten archive is indexed again
+    files["logs/f0.txt"] = b"replaced\n"
+    path.write_bytes(_tar_bytes(files, "w:gz"))
+    _check_reads(path, files, [str(tmp_path)])
+
+
+@needs_libz
+def test_multi_member_gzip(tmp_path):
+    files = _files()
+    raw = _tar_bytes(files)
+    third = len(raw) // 3
+    path = tmp_path / "multi.tgz"
+    path.write_bytes(
+        gzip.compress(raw[:third])
+        + gzip.compress(raw[third : 2 * third])
+        + gzip.compress(raw[2 * third :])
+    )
+    _check_reads(path, files, [str(tmp_path)])
+
+
+@needs_libz
+def test_gzip_ratio_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "MAX_RATIO", 100)
+    path = tmp_path / "bomb.tar.gz"
+    path.write_bytes(_tar_bytes({"zeros.bin": b"\0" * 10_000_000}, "w:gz"))
+    env = archive.list(str(path), allow=[str(tmp_path)])
+    assert env["code"] == "bad_args" and env["message"] == "too_big"
+
+
+@pytest.mark.parametrize("mode", ["w:bz2", "w:xz", "w:gz"])
+def test_sequential_ratio_limit(tmp_path, monkeypatch, mode):
+    # bz2, xz and gzip without system zlib decompress through tarfile
+    monkeypatch.setattr(tarindex, "_LIBZ", False)
+    monkeypatch.setattr(archive, "MAX_RATIO", 100)
+    path = tmp_path / "bomb.tar"
+    path.write_bytes(_tar_bytes({"zeros.bin": b"\0" * 10_000_000}, mode))
+    env = archive.list(str(path), allow=[str(tmp_path)])
+    assert env["code"] == "bad_args" and env["message"] == "too_big"
+
+
+def test_sequential_read_checks_ratio(tmp_path, monkeypatch):
+    path = tmp_path / "bomb.tar.bz2"
+    data = b"\0" * 10_000_000 + b"tail"
+    path.write_bytes(_tar_bytes({"zeros.bin": data, "after.txt": b"x"}, "w:bz2"))
+    allow = [str(tmp_path)]
+    assert archive.list(str(path), allow=allow)["result"][-1] == "after.txt"
+    monkeypatch.setattr(archive, "MAX_RATIO", 100)
+    env = archive.read(str(path), "after.txt", allow=allow)
+    assert env["code"] == "bad_args" and env["message"] == "too_big"
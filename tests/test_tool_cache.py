@@ -0,0 +1,86 @@
+import os
+
+import metrics
+import tools
+from dispatcher import TOOL_CACHE, dispatch
+from registry import clear, register_tool
+from tools import web
+
+
+def setup_function(function):
+    clear()
+    tools.register_all_tools()
+    TOOL_CACHE.clear()
+    metrics.reset()
+
+
+def read(path, tmp_path):
+    return dispatch(
+        {"name": "fs.read", "args": {"path": str(path), "allow": [str(tmp_path)]}},
+        request_id="c",
+    )
+
+
+def test_fs_read_cached_until_file_changes(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("one")
+    first = read(f, tmp_path)
+    assert first["result"] == "one" and "cached" not in first
+    second = read(f, tmp_path)
+    assert second["result"] == "one" and second["cached"] is True
+    f.write_text("three")
+    st = f.stat()
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert read(f, tmp_path)["result"] == "three"
+    summary = metrics.summary()
+    assert summary["tool_cache_total"]["fs.read"] == {
+        "miss": 1,
+        "hit": 1,
+        "invalidated": 1,
+    }
+    assert summary["tool_cache_hit_ratio"]["fs.read"] == 1 / 3
+
+
+def test_errors_are_not_cached(tmp_path):
+    missing = tmp_path / "missing.txt"
+    assert read(missing, tmp_path)["kind"] == "error"
+    missing.write_text("now")
+    assert read(missing, tmp_path)["result"] == "now"
+
+
+def test_http_entries_revalidate_after_ttl(monkeypatch):
+    calls = []
+
+    def fake_read(url):
+        calls.append(url)
+        return {
+            "kind": "ok",
+            "result": {"text": "hi", "url_final": url, "etag": '"v1"'},
+        }
+
+    register_tool(
+        name="web.fake",
+        version="1",
+        summary="",
+        safety="read",
+        timeout_ms=1000,
+        rate_limit_per_min=0,
+        enabled_in_safe_mode=True,
+        func=fake_read,
+        cache={"ttl_s": 0, "key": ["url"], "validate": "http"},
+    )
+    answers = iter([True, False])
+    seen = []
+
+    def fake_revalidate(url, etag=None, last_modified=None):
+        seen.append(etag)
+        return next(answers)
+
+    monkeypatch.setattr(web, "revalidate", fake_revalidate)
+    req = {"name": "web.fake", "args": {"url": "https://example.com"}}
+    assert "cached" not in dispatch(req, request_id="1")
+    assert dispatch(req, request_id="2")["cached"] is True
+    assert "cached" not in dispatch(req, request_id="3")
+    assert seen == ['"v1"', '"v1"'] and len(calls) == 2
+    counts = metrics.summary()["tool_cache_total"]["web.fake"]
+    assert counts["revalidated"] == 1 and counts["expired"] == 1
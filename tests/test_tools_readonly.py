@@ -1,3 +1,5 @@
+import base64
+import subprocess
 import sys
 import types
 import zipfile
@@ -6,7 +8,8 @@ from pathlib import Path
 import pytest
 
 from tools import register_all_tools, system, fs, archive, web, ui
-from registry import REGISTRY, clear
+from dispatcher import dispatch
+from registry import REGISTRY, clear, register_tool
 import ocr as ocr_module
 
 
@@ -18,6 +21,68 @@ def test_register_all_tools_idempotent():
     assert len(REGISTRY) == n
 
 
+def test_catalog_does_not_import_tool_modules():
+    code = (
+        "import sys, tools, dispatcher\n"
+        "tools.register_all_tools()\n"
+        "env = dispatcher.dispatch({'name': 'system.toolspec'}, request_id='x')\n"
+        "assert 'web.read' in env['result']\n"
+        "print(sorted(m for m in ('requests', 'tools.web', 'tools.image', "
+        "'tools.archive') if m in sys.modules))\n"
+    )
+    root = Path(__file__).resolve().parent.parent
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, capture_output=True, text=True
+    )
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "[]"
+
+
+def test_catalog_does_not_import_capture_stack():
+    code = (
+        "import sys, tools, dispatcher\n"
+        "tools.register_all_tools()\n"
+        "dispatcher.dispatch({'name': 'system.toolspec'}, request_id='x')\n"
+        "print(sorted(m for m in ('PIL', 'mss', 'pytesseract', 'requests') "
+        "if m in sys.modules))\n"
+    )
+    root = Path(__file__).resolve().parent.parent
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, capture_output=True, text=True
+    )
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "[]"
+
+
+def test_lazy_tool_loads_on_first_dispatch():
+    clear()
+    register_tool(
+        name="lazy.sep",
+        version="1",
+        summary="",
+        safety="read",
+        timeout_ms=1000,
+        rate_limit_per_min=0,
+        enabled_in_safe_mode=True,
+        target="os.path:join",
+    )
+    assert REGISTRY["lazy.sep"]["func"] is None
+    env = dispatch({"name": "lazy.sep", "args": {"a": "x"}}, request_id="l")
+    assert env == {"kind": "ok", "result": "x"}
+    register_tool(
+        name="lazy.broken",
+        version="1",
+        summary="",
+        safety="read",
+        timeout_ms=1000,
+        rate_limit_per_min=0,
+        enabled_in_safe_mode=True,
+        target="no_such_module_xyz:run",
+    )
+    env = dispatch({"name": "lazy.broken", "args": {}}, request_id="b")
+    assert env["code"] == "missing_dep"
+
+
 def test_capture_screen_missing_dep(monkeypatch):
     monkeypatch.setitem(sys.modules, "mss", None)
     monkeypatch.setitem(sys.modules, "PIL", None)
@@ -43,7 +108,9 @@ def test_ocr_missing_dep(monkeypatch):
     monkeypatch.setattr(
         ocr_module,
         "extract_text",
-        lambda img, region=None: (_ for _ in ()).throw(RuntimeError("tesseract_missing")),
+        lambda img, region=None: (_ for _ in ()).throw(
+            RuntimeError("tesseract_missing")
+        ),
     )
     res = system.ocr(bounds={"left": 0, "top": 0, "right": 1, "bottom": 1})
     assert res["code"] == "tesseract_missing"
@@ -82,25 +149,131 @@ def test_archive_list_read(tmp_path):
     p.unlink()
 
 
-def test_web_read_sanitize(monkeypatch):
+def test_archive_handles_are_cached_and_pages_listed(tmp_path, monkeypatch):
+    import metrics
+
+    metrics.reset()
+    cache = archive.ZipCache(max_handles=2)
+    monkeypatch.setattr(archive, "_ZIP_CACHE", cache)
+    allow = [str(tmp_path)]
+    p = tmp_path / "many.zip"
+    with zipfile.ZipFile(p, "w") as z:
+        for i in range(archive.MAX_FILES + 50):
+            z.writestr(f"f{i:03}.txt", str(i))
+
+    first = archive.list(str(p), allow=allow)
+    assert len(first["result"]) == archive.MAX_FILES
+    assert first["total"] == archive.MAX_FILES + 50
+    rest = archive.list(str(p), allow=allow, cursor=first["next_cursor"])
+    assert rest["result"][-1] == f"f{archive.MAX_FILES + 49:03}.txt"
+    assert "next_cursor" not in rest
+    assert archive.list(str(p), allow=allow, cursor="x")["code"] == "bad_args"
+    for i in (0, 7):
+        env = archive.read(str(p), f"f{i:03}.txt", allow=allow)
+        assert base64.b64decode(env["result"]["bytes_b64"]) == str(i).encode()
+    assert metrics.summary()["fs_cache_total"]["zip"] == {"miss": 1, "hit": 3}
+
+    with zipfile.ZipFile(p, "w") as z:
+        z.writestr("only.txt", "new content")
+    assert archive.list(str(p), allow=allow)["result"] == ["only.txt"]
+    assert metrics.summary()["fs_cache_total"]["zip"]["stale"] == 1
+
+    others = []
+    for name in ("a.zip", "b.zip"):
+        other = tmp_path / name
+        with zipfile.ZipFile(other, "w") as z:
+            z.writestr("x.txt", "x")
+        others.append(other)
+    with cache.open(p) as held:
+        for other in others:
+            assert archive.list(str(other), allow=allow)["kind"] == "ok"
+        assert len(cache) == 2
+        # evicted while in use: stays readable until released
+        assert held.read("only.txt") == b"new content"
+    assert held.fp is None
+
+
+def test_archive_read_streams_a_window(tmp_path, monkeypatch):
+    import random
+
+    allow = [str(tmp_path)]
+    p = tmp_path / "logs.zip"
+    noise = random.Random(0).randbytes(200_000)
+    log = b"".join(b"line %06d\n" % i for i in range(100_000))
+    with zipfile.ZipFile(p, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("app.log", log)
+        z.writestr("mixed.bin", b"\0" * 5_000_000 + noise)
+
+    env = archive.read(str(p), "app.log", allow=allow, offset=12_345, length=100)
+    assert base64.b64decode(env["result"]["bytes_b64"]) == log[12_345:12_445]
+    assert (env["offset"], env["size"], env["next_offset"]) == (
+        12_345,
+        len(log),
+        12_445,
+    )
+    env = archive.read(str(p), "app.log", allow=allow, offset=len(log) - 12)
+    assert base64.b64decode(env["result"]["bytes_b64"]) == b"line 099999\n"
+    assert "next_offset" not in env
+    first = archive.read(str(p), "app.log", allow=allow)
+    assert len(base64.b64decode(first["result"]["bytes_b64"])) == archive.MAX_BYTES
+
+    # overall ratio passes the header check, the zero-filled prefix does not
+    monkeypatch.setattr(archive, "MAX_RATIO", 50)
+    assert archive.read(str(p), "mixed.bin", allow=allow, length=10)["kind"] == "ok"
+    deep = archive.read(str(p), "mixed.bin", allow=allow, offset=5_000_000)
+    assert deep["code"] == "bad_args" and deep["message"] == "too_big"
+
+
+def test_archive_window_without_byte_count_uses_header(tmp_path, monkeypatch):
+    import random
+
+    p = tmp_path / "mixed.zip"
+    with zipfile.ZipFile(p, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("zeros.bin", b"\0" * 1_000_000)
+        z.writestr("mixed.bin", b"\0" * 5_000_000 + random.Random(0).randbytes(200_000))
+    monkeypatch.setattr(archive, "MAX_RATIO", 50)
+    # a plain ZipFile has no byte count: the header's compress_size is the bound
+    with zipfile.ZipFile(p) as z:
+        with pytest.raises(archive.RatioExceeded):
+            archive._window(z, z.getinfo("zeros.bin"), 0, 1_000_000)
+        assert archive._window(z, z.getinfo("mixed.bin"), 5_000_000, 10)
+    # counted bytes catch the zero-filled prefix
+    with archive.ZipCache().open(p) as z:
+        with pytest.raises(archive.RatioExceeded):
+            archive._window(z, z.getinfo("mixed.bin"), 5_000_000, 10)
+
+
+def test_web_read_sanitize(monkeypatch, tmp_path):
     class Resp:
         url = "http://a"
+        status_code = 200
         history = []
         headers = {"content-type": "text/html"}
-        text = "<h1>hi</h1><script>bad()</script>"
+        content = b"<h1>hi</h1><script>bad()</script>"
+        is_redirect = False
+        request = None
 
         def raise_for_status(self):
             return None
 
-    sess = types.SimpleNamespace(get=lambda *a, **k: Resp())
-    monkeypatch.setattr(web.requests, "Session", lambda: sess)
+        def iter_content(self, size):
+            return iter([self.content])
+
+        def close(self):
+            return None
+
+    sess = types.SimpleNamespace(get=lambda *a, **k: Resp(), headers={})
+    monkeypatch.setattr(web, "_session", lambda: sess)
+    monkeypatch.setattr(web, "_CACHE", web.httpcache.HttpCache(str(tmp_path / "c.db")))
     out = web.read("http://a")
     assert "bad" not in out["result"]["text"]
 
     def timeout(*a, **k):
         raise web.requests.Timeout()
 
-    monkeypatch.setattr(web.requests, "Session", lambda: types.SimpleNamespace(get=timeout))
+    monkeypatch.setattr(
+        web, "_session", lambda: types.SimpleNamespace(get=timeout, headers={})
+    )
     out = web.read("http://a")
     assert out["code"] == "timeout"
 
@@ -112,10 +285,91 @@ def test_ui_missing_cursor(monkeypatch):
 
 
 def test_ui_ok(monkeypatch):
-    monkeypatch.setitem(sys.modules, "cursor", types.SimpleNamespace(get_position=lambda: {"x": 1, "y": 2}))
+    monkeypatch.setitem(
+        sys.modules,
+        "cursor",
+        types.SimpleNamespace(get_position=lambda: {"x": 1, "y": 2}),
+    )
     fake_win = types.SimpleNamespace(title="t")
-    pgw = types.SimpleNamespace(getWindowsAt=lambda x, y: [fake_win], getActiveWindow=lambda: fake_win)
+    pgw = types.SimpleNamespace(
+        getWindowsAt=lambda x, y: [fake_win], getActiveWindow=lambda: fake_win
+    )
     monkeypatch.setitem(sys.modules, "pygetwindow", pgw)
-    monkeypatch.setitem(sys.modules, "uia", types.SimpleNamespace(get_element_info=lambda x, y: ({}, {"role": "r", "name": "n"}, "", 0.0)))
+    monkeypatch.setitem(
+        sys.modules,
+        "uia",
+        types.SimpleNamespace(
+            get_element_info=lambda x, y: ({}, {"role": "r", "name": "n"}, "", 0.0)
+        ),
+    )
     res = ui.what_under_mouse()
     assert res["kind"] == "ok" and res["result"]["window"]
+
+
+def test_fs_list_pages_with_cursor(tmp_path):
+    for d in ("a", "b", "c"):
+        (tmp_path / d).mkdir()
+        for i in range(3):
+            (tmp_path / d / f"f{i}.txt").write_text(d)
+    (tmp_path / "b" / "deep").mkdir()
+    (tmp_path / "b" / "deep" / "x.py").write_text("x")
+    allow = [str(tmp_path)]
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        env = fs.list(
+            str(tmp_path), recursive=True, allow=allow, limit=4, cursor=cursor
+        )
+        assert env["kind"] == "ok" and len(env["result"]) <= 4
+        seen += env["result"]
+        pages += 1
+        cursor = env.get("next_cursor")
+        if cursor is None:
+            break
+    everything = fs.list(str(tmp_path), recursive=True, allow=allow)["result"]
+    assert seen == everything and len(everything) == 14 and pages == 4
+    assert everything[:2] == ["a", str(Path("a") / "f0.txt")]
+
+    top = fs.list(str(tmp_path), allow=allow)["result"]
+    assert top == ["a", "b", "c"]
+    two = fs.list(str(tmp_path), allow=allow, depth=2, glob="*.py")["result"]
+    assert two == []
+    py = fs.list(str(tmp_path), recursive=True, allow=allow, glob="*.py", stat=True)
+    assert py["result"] == [
+        {
+            "path": str(Path("b") / "deep" / "x.py"),
+            "type": "file",
+            "size": 1,
+            "mtime": (tmp_path / "b" / "deep" / "x.py").stat().st_mtime,
+        }
+    ]
+    bad = fs.list(str(tmp_path), allow=allow, cursor="..")
+    assert bad["code"] == "bad_args"
+
+
+def test_fs_read_pages_by_offset(tmp_path):
+    lines = [f"linha {i} çã" for i in range(400)]
+    f = tmp_path / "big.log"
+    f.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    allow = [str(tmp_path)]
+    chunks = []
+    offset = 0
+    while True:
+        env = fs.read(str(f), allow=allow, offset=offset, length=700)
+        assert env["kind"] == "ok" and env["offset"] == offset
+        assert len(env["result"].encode("utf-8")) <= 700
+        chunks.append(env["result"])
+        if "next_offset" not in env:
+            break
+        offset = env["next_offset"]
+    assert "".join(chunks) == f.read_text(encoding="utf-8")
+    assert env["size"] == f.stat().st_size
+
+    whole = fs.read(str(f), allow=allow)
+    assert len(whole["result"]) <= 1000 and "next_offset" in whole
+
+    tail = fs.read(str(f), allow=allow, tail=2)
+    assert tail["result"] == "linha 398 çã\nlinha 399 çã\n"
+    assert "next_offset" not in tail
+    assert fs.read(str(f), allow=allow, tail=1, offset=5)["code"] == "bad_args"
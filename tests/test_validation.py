@@ -0,0 +1,84 @@
+import metrics
+from dispatcher import EXECUTOR, dispatch
+from registry import clear, get_tool, register_tool
+from validation import compile_args, compile_schema, validator_for
+
+
+def test_compiled_schema_reports_problems():
+    validate = compile_schema(
+        {
+            "type": "object",
+            "properties": {
+                "n": {"type": "integer", "minimum": 1, "maximum": 5},
+                "mode": {"enum": ["a", "b"]},
+                "tags": {"type": "array", "items": {"type": "string"}},
+                "box": {
+                    "type": ["object", "null"],
+                    "properties": {"x": {"type": "number"}},
+                },
+            },
+            "required": ["n"],
+            "additionalProperties": False,
+        }
+    )
+    assert validate({"n": 3, "box": None}) == []
+    assert validate({"n": 3, "box": {"x": 1.5}, "tags": ["a"]}) == []
+    problems = validate(
+        {"n": True, "mode": "c", "tags": ["a", 1], "box": {"x": "1"}, "extra": 1}
+    )
+    assert problems == [
+        {"field": "n", "reason": "expected integer"},
+        {"field": "mode", "reason": "expected one of a, b"},
+        {"field": "tags[1]", "reason": "expected string"},
+        {"field": "box.x", "reason": "expected number"},
+        {"field": "extra", "reason": "unexpected"},
+    ]
+    assert validate({"n": 9}) == [{"field": "n", "reason": "above maximum 5"}]
+    assert validate({}) == [{"field": "n", "reason": "missing"}]
+    assert validate([]) == [{"field": "", "reason": "expected object"}]
+
+
+def test_args_schema_lookup():
+    assert compile_args(None) is None
+    assert compile_args({"returns": {"type": "string"}}) is None
+    nested = compile_args({"args": {"properties": {"a": {"type": "string"}}}})
+    flat = compile_args({"required": ["a"]})
+    assert nested is not None and nested({"a": 1}) == [
+        {"field": "a", "reason": "expected string"}
+    ]
+    assert flat is not None and flat({}) == [{"field": "a", "reason": "missing"}]
+    assert validator_for({"schema": {"required": ["a"]}}) is not None
+
+
+def test_dispatch_rejects_bad_args_before_running():
+    clear()
+    metrics.reset()
+    calls = []
+    register_tool(
+        name="typed",
+        version="1",
+        summary="",
+        safety="read",
+        timeout_ms=1000,
+        rate_limit_per_min=1,
+        enabled_in_safe_mode=True,
+        func=lambda n: calls.append(n) or n,
+        schema={
+            "args": {
+                "type": "object",
+                "properties": {"n": {"type": "integer"}},
+                "required": ["n"],
+            }
+        },
+    )
+    assert get_tool("typed")["validate"] is not None
+    env = dispatch({"name": "typed", "args": {"n": "x"}}, request_id="1")
+    assert env["code"] == "bad_args"
+    assert env["message"] == "n: expected integer"
+    assert env["errors"] == [{"field": "n", "reason": "expected integer"}]
+    env = dispatch({"name": "typed", "args": {}}, request_id="2")
+    assert env["errors"] == [{"field": "n", "reason": "missing"}]
+    assert calls == []
+    assert EXECUTOR.stats()["live"] == 0
+    # rejected calls do not spend the tool's rate limit
+    assert dispatch({"name": "typed", "args": {"n": 2}}, request_id="3")["result"] == 2
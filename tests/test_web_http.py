@@ -0,0 +1,191 @@
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import metrics
+from tools import httpcache, web
+
+CHECK_URL = web._check_url
+
+# path -> (extra headers, body)
+PAGES = {
+    "/fresh": ({"Cache-Control": "max-age=60"}, b"<p>fresh</p>"),
+    "/etag": ({"Cache-Control": "no-cache", "ETag": '"v1"'}, b"<p>tagged</p>"),
+    "/nostore": ({"Cache-Control": "no-store"}, b"<p>secret</p>"),
+    "/moved": ({"Location": "/fresh"}, b""),
+    "/metadata": ({"Location": "http://169.254.169.254/latest/meta-data/"}, b""),
+    "/loop": ({"Location": "/loop"}, b""),
+    "/big": ({"Cache-Control": "max-age=60"}, b"<p>" + b"word " * 400_000 + b"</p>"),
+    "/page": (
+        {},
+        b"<html><head><style>p { color: red }</style>"
+        b"<SCRIPT>if (a < b) alert('x')</SCRIPT></head>"
+        b"<body><p>caf&eacute; &amp; p&atilde;o</p><br/>fim</body></html>",
+    ),
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    seen: list = []
+
+    def do_GET(self):
+        Handler.seen.append((self.path, self.headers.get("If-None-Match")))
+        headers, body = PAGES[self.path]
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(301 if "Location" in headers else 200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Date", formatdate(usegmt=True))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # the client hung up at its byte cap
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    Handler.seen = []
+    metrics.reset()
+    # the stand-in lives on loopback, which web.read normally refuses
+    monkeypatch.setattr(web, "_check_url", lambda url: None)
+    monkeypatch.setattr(web, "_CACHE", httpcache.HttpCache(str(tmp_path / "http.db")))
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fresh_responses_are_served_from_cache(server):
+    first = web.read(server + "/fresh")
+    second = web.read(server + "/fresh")
+    assert first["result"]["text"] == second["result"]["text"] == "fresh"
+    assert Handler.seen == [("/fresh", None)]
+    assert metrics.summary()["http_total"]["cache"] == {"miss": 1, "hit": 1}
+
+
+def test_no_cache_revalidates_with_etag(server):
+    for _ in range(3):
+        out = web.read(server + "/etag")
+        assert out["result"]["text"] == "tagged"
+        assert out["result"]["etag"] == '"v1"'
+    assert Handler.seen == [("/etag", None), ("/etag", '"v1"'), ("/etag", '"v1"')]
+    summary = metrics.summary()
+    assert summary["http_total"]["cache"] == {"miss": 1, "revalidated": 2}
+    assert summary["http_cache_hit_ratio"] == 2 / 3
+
+
+def test_no_store_and_redirects_are_not_cached(server):
+    web.read(server + "/nostore")
+    web.read(server + "/nostore")
+    moved = web.read(server + "/moved")
+    assert moved["result"]["url_final"] == server + "/fresh"
+    assert web.http_cache().lookup(server + "/nostore", {}) is None
+    assert web.http_cache().lookup(server + "/moved", {}) is None
+    assert [p for p, _ in Handler.seen] == ["/nostore", "/nostore", "/moved", "/fresh"]
+
+
+def test_redirects_are_checked_on_every_hop(server, monkeypatch):
+    # only the loopback stand-in itself is allowed
+    monkeypatch.setattr(
+        web,
+        "_check_url",
+        lambda url: None if url.startswith(server) else CHECK_URL(url),
+    )
+    out = web.read(server + "/metadata")
+    assert out["code"] == "bad_args" and out["message"] == "blocked_host"
+    assert web.http_cache().lookup(server + "/metadata", {}) is None
+    assert web.read(server + "/loop")["message"] == "too_many_redirects"
+    assert [p for p, _ in Handler.seen] == ["/metadata"] + ["/loop"] * 4
+
+
+def test_connections_are_reused(server):
+    for path in ("/nostore", "/nostore", "/etag", "/nostore"):
+        web.read(server + path)
+    connections = metrics.summary()["http_total"]["connection"]
+    assert connections["new"] == 1
+    assert connections["reused"] == 3
+
+
+def test_download_stops_at_byte_cap(server, monkeypatch):
+    monkeypatch.setattr(web, "MAX_BYTES", 100_000)
+    out = web.read(server + "/big")
+    assert out["result"]["text"].startswith("word word")
+    # the capped body is what the cache keeps and serves
+    assert len(web.http_cache().lookup(server + "/big", {}).body) == 100_000
+    assert web.read(server + "/big")["result"]["text"] == out["result"]["text"]
+
+
+def test_html_text_drops_scripts_and_styles(server):
+    text = web.read(server + "/page")["result"]["text"]
+    assert "alert" not in text and "color" not in text
+    assert text.split() == ["café", "&", "pão", "fim"]
+
+
+def test_text_is_extracted_across_chunk_boundaries(monkeypatch):
+    monkeypatch.setattr(web, "READ_CHUNK", 3)
+    body = "<p>pão</p><script>x</script><b>fim</b>".encode("utf-8")
+    headers = {"content-type": "text/html; charset=utf-8"}
+    assert web._page_text(headers, body).split() == ["pão", "fim"]
+    latin = {"content-type": "text/plain; charset=latin-1"}
+    assert web._page_text(latin, "pão".encode("latin-1")) == "pão"
+    unknown = {"content-type": "text/plain; charset=nope"}
+    assert web._page_text(unknown, "pão".encode("utf-8")) == "pão"
+
+
+def test_cache_size_is_tracked_and_evicts_lru(tmp_path):
+    cache = httpcache.HttpCache(str(tmp_path / "c.db"), max_bytes=250)
+    headers = {"cache-control": "max-age=60"}
+    for url in ("a", "b"):
+        cache.store(url, 200, headers, b"x" * 100, 0.0, 0.0, {})
+    cache.store("a", 200, headers, b"x" * 50, 0.0, 0.0, {})
+    assert cache.stats() == {"entries": 2, "bytes": 150}
+    cache.store("c", 200, headers, b"x" * 150, 0.0, 0.0, {})
+    # "b" was used least recently
+    assert cache.lookup("b", {}) is None
+    assert cache.stats() == {"entries": 2, "bytes": 200}
+    cache.forget("a")
+    reopened = httpcache.HttpCache(cache.path, max_bytes=250)
+    assert reopened.stats() == {"entries": 1, "bytes": 150}
+
+
+def test_freshness_rules():
+    now = time.time()
+    date = formatdate(now, usegmt=True)
+
+    def entry(headers, age=0.0):
+        return httpcache.Entry("u", 200, headers, b"", now - age, now - age, {})
+
+    assert httpcache.freshness_lifetime({"cache-control": "max-age=30"}) == 30
+    expires = {"date": date, "expires": formatdate(now + 100, usegmt=True)}
+    assert 99 <= httpcache.freshness_lifetime(expires) <= 101
+    assert httpcache.freshness_lifetime({"date": date, "expires": "0"}) == 0
+    modified = {"date": date, "last-modified": formatdate(now - 1000, usegmt=True)}
+    assert 99 <= httpcache.freshness_lifetime(modified) <= 101
+
+    assert httpcache.is_fresh(entry({"cache-control": "max-age=30"}, age=10), now)
+    assert not httpcache.is_fresh(entry({"cache-control": "max-age=30"}, age=40), now)
+    aged = {"cache-control": "max-age=30", "age": "25"}
+    assert not httpcache.is_fresh(entry(aged, age=10), now)
+    assert not httpcache.storable(200, {"cache-control": "max-age=60", "vary": "*"})
+    assert not httpcache.storable(200, {})
+    assert httpcache.storable(200, {"etag": '"x"'})
@@ -0,0 +1,158 @@
+"""Result cache for read-only tools, opted into through registry metadata.
+
+A tool registered with ``cache={"ttl_s": ..., "key": [...], "validate": ...}``
+has its successful envelopes cached by tool name and the listed argument
+fields (all arguments when ``key`` is omitted). Validators keep entries
+honest cheaply:
+
+``"path"``
+    the ``path`` argument's mtime and size are recorded before the call and
+    compared on every hit; any change is a miss.
+``"http"``
+    after ``ttl_s`` the entry is revalidated with a conditional GET using the
+    ``etag``/``last_modified`` of the cached result; a 304 renews it.
+
+Without a validator entries simply expire after ``ttl_s``. Hits are returned
+with ``"cached": True`` and counted per tool in ``metrics.summary()``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+import metrics
+
+
+def _path_stamp(args: Dict[str, Any]) -> Any:
+    try:
+        st = os.stat(args["path"])
+    except (KeyError, TypeError, OSError):
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _http_revalidate(args: Dict[str, Any], result: Dict[str, Any]) -> bool:
+    from tools import web
+
+    data = result.get("result") or {}
+    return web.revalidate(
+        data.get("url_final") or args.get("url", ""),
+        etag=data.get("etag"),
+        last_modified=data.get("last_modified"),
+    )
+
+
+# validator name -> (stamp taken before each call, revalidation after ttl)
+VALIDATORS: Dict[
+    str,
+    Tuple[
+        Callable[[Dict[str, Any]], Any] | None,
+        Callable[[Dict[str, Any], Dict[str, Any]], bool] | None,
+    ],
+] = {
+    "path": (_path_stamp, None),
+    "http": (None, _http_revalidate),
+}
+
+
+class _Entry:
+    __slots__ = ("envelope", "stamp", "expires")
+
+    def __init__(self, envelope: Dict[str, Any], stamp: Any, expires: float) -> None:
+        self.envelope = envelope
+        self.stamp = stamp
+        self.expires = expires
+
+
+class ToolCache:
+    """LRU of tool envelopes keyed by tool name and selected arguments."""
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    @staticmethod
+    def key(tool: Dict[str, Any], args: Dict[str, Any]) -> str | None:
+        """Cache key for a call, or ``None`` if the tool is not cacheable."""
+        spec = tool.get("cache")
+        if not spec:
+            return None
+        fields = spec.get("key")
+        picked = args if fields is None else {f: args.get(f) for f in fields}
+        return json.dumps([tool["name"], picked], sort_keys=True, default=str)
+
+    @staticmethod
+    def stamp(tool: Dict[str, Any], args: Dict[str, Any]) -> Any:
+        """Validator state to record with a result computed now."""
+        stamp_fn, _ = VALIDATORS.get(tool["cache"].get("validate") or "", (None, None))
+        return stamp_fn(args) if stamp_fn is not None else None
+
+    def get(
+        self, tool: Dict[str, Any], args: Dict[str, Any], key: str
+    ) -> Dict[str, Any] | None:
+        """Return a cached envelope marked ``cached: True`` or ``None``."""
+        spec = tool["cache"]
+        name = tool["name"]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            metrics.record_tool_cache(name, "miss")
+            return None
+        stamp_fn, revalidate = VALIDATORS.get(spec.get("validate") or "", (None, None))
+        if stamp_fn is not None and stamp_fn(args) != entry.stamp:
+            self._drop(key, entry)
+            metrics.record_tool_cache(name, "invalidated")
+            return None
+        if time.monotonic() >= entry.expires:
+            try:
+                fresh = revalidate is not None and revalidate(args, entry.envelope)
+            except Exception:
+                fresh = False
+            if not fresh:
+                self._drop(key, entry)
+                metrics.record_tool_cache(name, "expired")
+                return None
+            entry.expires = time.monotonic() + float(spec.get("ttl_s", 0))
+            metrics.record_tool_cache(name, "revalidated")
+        else:
+            metrics.record_tool_cache(name, "hit")
+        return {**entry.envelope, "cached": True}
+
+    def put(
+        self,
+        tool: Dict[str, Any],
+        key: str,
+        envelope: Dict[str, Any],
+        stamp: Any,
+    ) -> None:
+        if envelope.get("kind") != "ok":
+            return
+        expires = time.monotonic() + float(tool["cache"].get("ttl_s", 0))
+        with self._lock:
+            self._entries[key] = _Entry(envelope, stamp, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _drop(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+__all__ = ["ToolCache", "VALIDATORS"]
@@ -1,88 +1,347 @@
+"""Read-only access to zip and tar archives inside the allowed directories.
+
+Opening a zip parses its whole central directory, so :class:`ZipCache` keeps
+recently used archives open together with that parsed index. Entries are
+keyed by resolved path and checked against the file's ``(mtime_ns, size)`` on
+every use; a rewritten archive is reopened. At most ``ARCHIVE_MAX_HANDLES``
+archives stay open, and a handle evicted while a call is reading from it is
+closed when that call finishes.
+
+``archive.read`` streams a member through :meth:`zipfile.ZipFile.open` and
+inflates only up to the end of the requested window, checking the
+compression ratio as it goes against the compressed bytes read from the
+archive file, which :class:`_CountingFile` tallies per thread. Tar archives, plain or compressed with gzip,
+bz2 or xz, are detected by their magic bytes and served from the member
+index kept by :mod:`tools.tarindex`.
+"""
+
 from __future__ import annotations
 
 import base64
+import io
+import os
+import threading
 import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path, PurePosixPath
-from typing import Dict
+from typing import Any, Dict, Iterator, List, Tuple
+
+import metrics
+from executor import check_cancelled
 
-from . import fs
+from . import fs, tarindex
+from .tarindex import RatioExceeded
 
 MAX_BYTES = 512_000
+# default page size of archive.list
 MAX_FILES = 200
+# archives with a larger central directory are refused
+MAX_ENTRIES = 100_000
+# members inflating beyond this many times their compressed size are refused
+MAX_RATIO = 1000
+READ_CHUNK = 64 * 1024
+
+
+class _CountingFile(io.FileIO):
+    """Archive file opened for reading that counts bytes read per thread.
+
+    :class:`zipfile.ZipFile` reads members from it under its own lock in the
+    calling thread, so the count a thread sees grows only with its reads.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path, "rb")
+        self._counts = threading.local()
+
+    @property
+    def consumed(self) -> int:
+        n: int = getattr(self._counts, "n", 0)
+        return n
+
+    def read(self, size: int | None = -1) -> bytes:
+        data = super().read(size) or b""
+        self._counts.n = self.consumed + len(data)
+        return data
+
+
+class _Handle:
+    __slots__ = ("stamp", "zf", "users", "evicted")
+
+    def __init__(self, stamp: Tuple[int, int], zf: zipfile.ZipFile) -> None:
+        self.stamp = stamp
+        self.zf = zf
+        self.users = 0
+        self.evicted = False
+
+    def close(self) -> None:
+        fp = self.zf.fp
+        self.zf.close()
+        # ZipFile leaves a file object it was given open
+        if fp is not None:
+            fp.close()
+
+
+def _open_zip(path: str) -> zipfile.ZipFile:
+    raw = _CountingFile(path)
+    try:
+        return zipfile.ZipFile(raw)
+    except BaseException:
+        raw.close()
+        raise
+
+
+class ZipCache:
+    """LRU of open :class:`zipfile.ZipFile` handles with their parsed index."""
+
+    def __init__(self, max_handles: int = 16) -> None:
+        self.max_handles = max(1, max_handles)
+        self._lock = threading.Lock()
+        self._handles: OrderedDict[str, _Handle] = OrderedDict()
+
+    @contextmanager
+    def open(self, path: str | os.PathLike[str]) -> Iterator[zipfile.ZipFile]:
+        """Yield an open archive for ``path``, reusing a cached handle."""
+        key = os.fspath(path)
+        st = os.stat(key)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and handle.stamp == stamp:
+                self._handles.move_to_end(key)
+                handle.users += 1
+                outcome = "hit"
+            else:
+                if handle is not None:
+                    self._evict(key)
+                outcome = "miss" if handle is None else "stale"
+                handle = None
+        metrics.record_fs_cache("zip", outcome)
+        if handle is None:
+            handle = _Handle(stamp, _open_zip(key))
+            handle.users = 1
+            with self._lock:
+                if key in self._handles:
+                    # another call opened it meanwhile; keep the newer one
+                    self._evict(key)
+                self._handles[key] = handle
+                while len(self._handles) > self.max_handles:
+                    self._evict(next(iter(self._handles)))
+        try:
+            yield handle.zf
+        finally:
+            with self._lock:
+                handle.users -= 1
+                if handle.evicted and not handle.users:
+                    handle.close()
+
+    def _evict(self, key: str) -> None:
+        handle = self._handles.pop(key)
+        handle.evicted = True
+        if not handle.users:
+            handle.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in [*self._handles]:
+                self._evict(key)
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+
+_ZIP_CACHE: ZipCache | None = None
+
+
+def zip_cache() -> ZipCache:
+    """Process-wide handle cache sized by ``ARCHIVE_MAX_HANDLES``."""
+    global _ZIP_CACHE
+    if _ZIP_CACHE is None:
+        from settings import ARCHIVE_MAX_HANDLES
 
+        _ZIP_CACHE = ZipCache(ARCHIVE_MAX_HANDLES)
+    return _ZIP_CACHE
 
-def list(path: str, allow: list[str] | None = None) -> Dict:
+
+def _too_many(count: int) -> Dict[str, Any] | None:
+    if count > MAX_ENTRIES:
+        return {
+            "kind": "error",
+            "code": "too_many_entries",
+            "message": "archive too large",
+            "hint": "",
+        }
+    return None
+
+
+def list(
+    path: str,
+    allow: List[str] | None = None,
+    limit: int = MAX_FILES,
+    cursor: str | None = None,
+) -> Dict:
     p = Path(path)
-    rp = p.resolve()
-    allowed = fs.ALLOWED + [Path(a) for a in (allow or [])]  # type: ignore[attr-defined]
-    if not any(base in rp.parents or base == rp for base in allowed):
+    rp = fs.resolve_allowed(path, allow)
+    if rp is None:
         return {
             "kind": "error",
             "code": "forbidden_path",
             "message": "path not allowed",
             "hint": "",
         }
+    if cursor is not None and not (cursor.isascii() and cursor.isdigit()):
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": "invalid cursor",
+            "hint": "",
+        }
+    start = int(cursor or 0)
+    limit = max(1, min(limit, fs.MAX_LIST_LIMIT))
     try:
-        with zipfile.ZipFile(p) as z:
-            if len(z.infolist()) > MAX_FILES:
-                return {
-                    "kind": "error",
-                    "code": "bad_args",
-                    "message": "too_many_entries",
-                    "hint": "",
-                }
-            return {"kind": "ok", "result": z.namelist()}
+        fmt = tarindex.detect(str(rp))
+        if fmt is not None:
+            index = tarindex.get_index(str(rp), fmt, MAX_RATIO)
+            total = len(index.members)
+            page = [m.name for m in index.members[start : start + limit]]
+        else:
+            with zip_cache().open(p) as z:
+                total = len(z.filelist)
+                page = [info.filename for info in z.filelist[start : start + limit]]
+        error = _too_many(total)
+        if error is not None:
+            return error
+        env: Dict[str, Any] = {"kind": "ok", "result": page, "total": total}
+        if start + limit < total:
+            env["next_cursor"] = str(start + limit)
+        return env
+    except RatioExceeded:
+        return _too_big()
     except Exception as e:
         return {"kind": "error", "code": "not_found", "message": str(e), "hint": ""}
 
 
-def read(path: str, inner_path: str, allow: list[str] | None = None) -> Dict:
+def _window(
+    z: zipfile.ZipFile, info: zipfile.ZipInfo, offset: int, length: int
+) -> bytes:
+    """Decompress member bytes ``[offset, offset + length)`` and stop there.
+
+    Bytes before ``offset`` are inflated and discarded chunk by chunk, so
+    memory stays at one chunk plus the window. The ratio of bytes produced to
+    compressed bytes consumed is checked after every chunk, which catches
+    members whose header understates their size. Archives not opened through
+    :class:`ZipCache` have no byte count; for them the whole
+    ``compress_size`` counts as consumed.
+    """
+    out = bytearray()
+    produced = 0
+    end = offset + length
+    raw = z.fp if isinstance(z.fp, _CountingFile) else None
+    with z.open(info) as member:
+        base = raw.consumed if raw is not None else 0
+        while produced < end:
+            check_cancelled()
+            chunk = member.read(min(READ_CHUNK, end - produced))
+            if not chunk:
+                break
+            if raw is not None:
+                consumed = max(raw.consumed - base, 1)
+            else:
+                consumed = max(info.compress_size, 1)
+            produced += len(chunk)
+            if produced > MAX_RATIO * consumed:
+                raise RatioExceeded
+            if produced > offset:
+                out += chunk[max(0, len(chunk) - (produced - offset)) :]
+    return bytes(out)
+
+
+def read(
+    path: str,
+    inner_path: str,
+    allow: List[str] | None = None,
+    offset: int = 0,
+    length: int | None = None,
+) -> Dict:
     p = Path(path)
-    rp = p.resolve()
-    allowed = fs.ALLOWED + [Path(a) for a in (allow or [])]  # type: ignore[attr-defined]
-    if not any(base in rp.parents or base == rp for base in allowed):
+    rp = fs.resolve_allowed(path, allow)
+    if rp is None:
         return {
             "kind": "error",
             "code": "forbidden_path",
             "message": "path not allowed",
             "hint": "",
         }
+    pp = PurePosixPath(inner_path)
+    if pp.is_absolute() or ".." in pp.parts:
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": "bad_path",
+            "hint": "",
+        }
+    start = max(0, offset)
+    budget = max(1, min(length or MAX_BYTES, MAX_BYTES))
     try:
-        with zipfile.ZipFile(p) as z:
-            if len(z.infolist()) > MAX_FILES:
-                return {
-                    "kind": "error",
-                    "code": "too_many_entries",
-                    "message": "archive too large",
-                    "hint": "",
-                }
-            pp = PurePosixPath(inner_path)
-            if pp.is_absolute() or ".." in pp.parts:
-                return {
-                    "kind": "error",
-                    "code": "bad_args",
-                    "message": "bad_path",
-                    "hint": "",
-                }
+        fmt = tarindex.detect(str(rp))
+        if fmt is not None:
+            return _read_tar(str(rp), fmt, inner_path, start, budget)
+        with zip_cache().open(p) as z:
+            error = _too_many(len(z.filelist))
+            if error is not None:
+                return error
             info = z.getinfo(inner_path)
             ratio = (info.file_size or 1) / max(info.compress_size or 1, 1)
-            if ratio > 1000 or info.file_size > MAX_BYTES:
-                return {
-                    "kind": "error",
-                    "code": "bad_args",
-                    "message": "too_big",
-                    "hint": "",
-                }
-            data = z.read(info)[:MAX_BYTES]
-            return {
-                "kind": "ok",
-                "result": {
-                    "inner_path": inner_path,
-                    "bytes_b64": base64.b64encode(data).decode("ascii"),
-                },
-            }
+            if ratio > MAX_RATIO:
+                return _too_big()
+            start = min(start, info.file_size)
+            data = _window(z, info, start, budget)
+            return _read_envelope(inner_path, data, start, info.file_size)
+    except RatioExceeded:
+        return _too_big()
     except Exception as e:
         return {"kind": "error", "code": "not_found", "message": str(e), "hint": ""}
 
 
-__all__ = ["list", "read"]
+def _read_tar(path: str, fmt: str, inner_path: str, start: int, budget: int) -> Dict:
+    index = tarindex.get_index(path, fmt, MAX_RATIO)
+    member = index.by_name.get(inner_path)
+    if member is None:
+        raise KeyError(f"There is no item named {inner_path!r} in the archive")
+    if not member.regular:
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": "not a regular file",
+            "hint": "",
+        }
+    start = min(start, member.size)
+    data = index.read(path, member, start, budget, MAX_RATIO)
+    return _read_envelope(inner_path, data, start, member.size)
+
+
+def _read_envelope(inner_path: str, data: bytes, start: int, size: int) -> Dict:
+    env: Dict[str, Any] = {
+        "kind": "ok",
+        "result": {
+            "inner_path": inner_path,
+            "bytes_b64": base64.b64encode(data).decode("ascii"),
+        },
+        "offset": start,
+        "size": size,
+    }
+    if start + len(data) < size:
+        env["next_offset"] = start + len(data)
+    return env
+
+
+def _too_big() -> Dict[str, Any]:
+    return {
+        "kind": "error",
+        "code": "bad_args",
+        "message": "too_big",
+        "hint": f"compression ratio above {MAX_RATIO}",
+    }
+
+
+__all__ = ["RatioExceeded", "ZipCache", "list", "read", "zip_cache"]
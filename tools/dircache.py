@@ -0,0 +1,152 @@
+"""Directory snapshots and allowlist lookups shared by the file tools.
+
+:class:`DirCache` keeps the sorted entries of recently listed directories and
+revalidates them with a single ``stat`` of the directory: creating, removing
+or renaming an entry bumps the directory's mtime, so an unchanged
+``(mtime_ns, inode, device)`` stamp means the snapshot is still exact.
+Snapshots of a directory modified within the last :data:`RACY_NS` are not
+kept, since a change landing in the same timestamp tick would go unnoticed.
+Entry stat data is never cached; :meth:`Entry.stat` always asks the OS.
+
+:class:`PathTrie` holds the allowed roots by path component, so checking a
+resolved path walks at most its depth instead of every root's parents.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import metrics
+
+# snapshots of directories changed this recently are not cached
+RACY_NS = 2_000_000_000
+
+
+class Entry:
+    """Cached stand-in for :class:`os.DirEntry` with the same query methods."""
+
+    __slots__ = ("name", "path", "kind")
+
+    def __init__(self, name: str, path: str, kind: str) -> None:
+        self.name = name
+        self.path = path
+        self.kind = kind
+
+    @classmethod
+    def of(cls, entry: os.DirEntry[str]) -> "Entry":
+        try:
+            if entry.is_symlink():
+                kind = "link"
+            elif entry.is_dir(follow_symlinks=False):
+                kind = "dir"
+            elif entry.is_file(follow_symlinks=False):
+                kind = "file"
+            else:
+                kind = "other"
+        except OSError:
+            kind = "other"
+        return cls(entry.name, entry.path, kind)
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        if self.kind == "link":
+            # the target may change without touching this directory
+            return follow_symlinks and os.path.isdir(self.path)
+        return self.kind == "dir"
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        if self.kind == "link":
+            return follow_symlinks and os.path.isfile(self.path)
+        return self.kind == "file"
+
+    def is_symlink(self) -> bool:
+        return self.kind == "link"
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        return os.stat(self.path, follow_symlinks=follow_symlinks)
+
+
+class DirCache:
+    """LRU of directory listings validated by the directory's own stat."""
+
+    def __init__(self, max_dirs: int = 1024) -> None:
+        self.max_dirs = max(0, max_dirs)
+        self._lock = threading.Lock()
+        self._dirs: OrderedDict[str, Tuple[Tuple[int, int, int], List[Entry]]] = (
+            OrderedDict()
+        )
+
+    def entries(self, top: str) -> List[Entry]:
+        """Entries of directory ``top`` sorted by name; ``OSError`` if unreadable."""
+        st = os.stat(top)
+        stamp = (st.st_mtime_ns, st.st_ino, st.st_dev)
+        with self._lock:
+            cached = self._dirs.get(top)
+            if cached is not None and cached[0] == stamp:
+                self._dirs.move_to_end(top)
+                metrics.record_fs_cache("dir", "hit")
+                return cached[1]
+        metrics.record_fs_cache("dir", "miss" if cached is None else "stale")
+        with os.scandir(top) as it:
+            entries = sorted((Entry.of(e) for e in it), key=lambda e: e.name)
+        with self._lock:
+            if self.max_dirs and time.time_ns() - st.st_mtime_ns >= RACY_NS:
+                self._dirs[top] = (stamp, entries)
+                self._dirs.move_to_end(top)
+                while len(self._dirs) > self.max_dirs:
+                    self._dirs.popitem(last=False)
+            else:
+                self._dirs.pop(top, None)
+        return entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dirs.clear()
+
+    def __len__(self) -> int:
+        return len(self._dirs)
+
+
+class PathTrie:
+    """Prefix trie of root paths, matched component by component."""
+
+    _END = ""  # never a path component
+
+    def __init__(self, roots: Sequence[str | os.PathLike[str]] = ()) -> None:
+        self._root: Dict[str, Dict] = {}
+        for root in roots:
+            self.add(root)
+
+    def add(self, root: str | os.PathLike[str]) -> None:
+        node = self._root
+        for part in Path(root).parts:
+            node = node.setdefault(part, {})
+        node[self._END] = {}
+
+    def covers(self, path: str | os.PathLike[str]) -> bool:
+        """Whether ``path`` is one of the roots or lies below one."""
+        node = self._root
+        if self._END in node:
+            return True
+        for part in Path(path).parts:
+            child = node.get(part)
+            if child is None:
+                return False
+            if self._END in child:
+                return True
+            node = child
+        return False
+
+
+@lru_cache(maxsize=64)
+def trie_for(roots: Tuple[str, ...]) -> PathTrie:
+    """Trie of the resolved ``roots``, built once per distinct tuple."""
+    return PathTrie([Path(r).resolve() for r in roots])
+
+
+__all__ = ["DirCache", "Entry", "PathTrie", "RACY_NS", "trie_for"]
@@ -1,10 +1,45 @@
 from __future__ import annotations
 
+import base64
+import binascii
+import fnmatch
+import itertools
+import mmap
+import os
+import re
+import sqlite3
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, Iterator, List, Tuple
+
+from executor import check_cancelled
+
+from .dircache import DirCache, Entry, trie_for
 
 ALLOWED = [Path.cwd(), Path.cwd() / "experiments/llm_sandbox/assets"]
 
+LIST_LIMIT = 500
+MAX_LIST_LIMIT = 5000
+MAX_READ_LENGTH = 1_000_000
+
+_DIR_CACHE: DirCache | None = None
+
+
+def dir_cache() -> DirCache:
+    """Process-wide directory snapshot cache sized by ``FS_DIR_CACHE_ENTRIES``."""
+    global _DIR_CACHE
+    if _DIR_CACHE is None:
+        from settings import FS_DIR_CACHE_ENTRIES
+
+        _DIR_CACHE = DirCache(FS_DIR_CACHE_ENTRIES)
+    return _DIR_CACHE
+
+
+def resolve_allowed(path: str, allow: List[str] | None = None) -> Path | None:
+    """Resolve ``path`` and return it if it lies under an allowed root."""
+    rp = Path(path).resolve()
+    roots = tuple(str(r) for r in ALLOWED) + tuple(allow or ())
+    return rp if trie_for(roots).covers(rp) else None
+
 
 def _sanitize(text: str) -> str:
     from agent_local import _redact, _truncate
@@ -12,11 +47,96 @@ def _sanitize(text: str) -> str:
     return _truncate(_redact(text))
 
 
-def list(path: str, recursive: bool | None = None, allow: List[str] | None = None) -> Dict:
+def scan(
+    root: str | os.PathLike[str],
+    *,
+    depth: int | None = None,
+    after: Tuple[str, ...] = (),
+) -> Iterator[Tuple[str, Entry]]:
+    """Yield ``(relative path, entry)`` under ``root`` lazily, in sorted order.
+
+    Directories come before their contents and are descended up to ``depth``
+    levels (``None`` for no limit) without following symlinks. ``after`` is
+    the path components of an entry already returned: the walk resumes right
+    after it without listing what came before. Directory listings come from
+    :func:`dir_cache`, so an unchanged directory is not read again. Unreadable
+    subdirectories are skipped; an unreadable ``root`` raises ``OSError``.
+    """
+    yield from _scan(os.fspath(root), "", 1, depth, after)
+
+
+def _scan(
+    top: str,
+    prefix: str,
+    level: int,
+    depth: int | None,
+    after: Tuple[str, ...],
+) -> Iterator[Tuple[str, Entry]]:
+    for entry in dir_cache().entries(top):
+        check_cancelled()
+        returned = False
+        sub_after: Tuple[str, ...] = ()
+        if after:
+            if entry.name < after[0]:
+                continue
+            if entry.name == after[0]:
+                # the cursor entry or one of its ancestors
+                returned = True
+                sub_after = after[1:]
+        rel = os.path.join(prefix, entry.name) if prefix else entry.name
+        if not returned:
+            yield rel, entry
+        if depth is not None and level >= depth:
+            continue
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir:
+            try:
+                yield from _scan(entry.path, rel, level + 1, depth, sub_after)
+            except OSError:
+                continue
+
+
+def _encode_cursor(rel: str) -> str:
+    return base64.urlsafe_b64encode(rel.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, ...]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rel = raw.decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("invalid cursor") from None
+    parts = tuple(rel.split(os.sep))
+    if not rel or any(p in ("", ".", "..") for p in parts):
+        raise ValueError("invalid cursor")
+    return parts
+
+
+def _describe(rel: str, entry: Entry) -> Dict[str, Any]:
+    st = entry.stat()
+    return {
+        "path": rel,
+        "type": "dir" if entry.is_dir() else "file",
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+    }
+
+
+def list(
+    path: str,
+    recursive: bool | None = None,
+    allow: List[str] | None = None,
+    limit: int = LIST_LIMIT,
+    cursor: str | None = None,
+    depth: int | None = None,
+    glob: str | None = None,
+    stat: bool = False,
+) -> Dict:
     p = Path(path)
-    allowed = ALLOWED + [Path(a) for a in (allow or [])]
-    rp = p.resolve()
-    if not any(base in rp.parents or base == rp for base in allowed):
+    if resolve_allowed(path, allow) is None:
         return {
             "kind": "error",
             "code": "forbidden_path",
@@ -24,17 +144,38 @@ def list(path: str, recursive: bool | None = None, allow: List[str] | None = Non
             "hint": "",
         }
     try:
-        if recursive:
-            names = []
-            for sub in p.rglob("*"):
-                if sub.is_file() or sub.is_dir():
-                    try:
-                        names.append(str(sub.relative_to(p)))
-                    except Exception:
-                        names.append(str(sub))
-        else:
-            names = [c.name for c in p.iterdir()]
-        return {"kind": "ok", "result": names}
+        after = _decode_cursor(cursor) if cursor else ()
+    except ValueError as e:
+        return {"kind": "error", "code": "bad_args", "message": str(e), "hint": ""}
+    limit = max(1, min(limit, MAX_LIST_LIMIT))
+    if depth is None and not recursive:
+        depth = 1
+    # patterns without a separator match the entry name, like shell globs
+    match_name = bool(glob) and "/" not in glob and os.sep not in glob
+
+    def wanted(item: Tuple[str, Entry]) -> bool:
+        rel, entry = item
+        try:
+            if not (entry.is_file() or entry.is_dir()):
+                return False
+        except OSError:
+            return False
+        if not glob:
+            return True
+        target = entry.name if match_name else rel.replace(os.sep, "/")
+        return fnmatch.fnmatch(target, glob)
+
+    try:
+        # one extra entry tells whether another page exists
+        entries = filter(wanted, scan(p, depth=depth, after=after))
+        page = [*itertools.islice(entries, limit + 1)]
+        more = len(page) > limit
+        page = page[:limit]
+        result = [_describe(rel, e) if stat else rel for rel, e in page]
+        env: Dict[str, Any] = {"kind": "ok", "result": result}
+        if more:
+            env["next_cursor"] = _encode_cursor(page[-1][0])
+        return env
     except Exception as e:
         return {
             "kind": "error",
@@ -44,20 +185,117 @@ def list(path: str, recursive: bool | None = None, allow: List[str] | None = Non
         }
 
 
-def read(path: str, allow: List[str] | None = None, max_bytes: int = 100_000) -> Dict:
+def _complete_utf8(data: bytes) -> bytes:
+    """Drop a multi-byte UTF-8 sequence cut off at the end of ``data``."""
+    for k in range(1, min(4, len(data)) + 1):
+        lead = data[-k]
+        if lead & 0xC0 == 0x80:
+            continue
+        if lead >> 5 == 0b110:
+            need = 2
+        elif lead >> 4 == 0b1110:
+            need = 3
+        elif lead >> 3 == 0b11110:
+            need = 4
+        else:
+            need = 1
+        return data[:-k] if need > k else data
+    return data
+
+
+def _fit(text: str, from_end: bool = False) -> str:
+    """Longest prefix (suffix with ``from_end``) the result truncation keeps.
+
+    Returning only what survives :func:`_sanitize` keeps ``next_offset``
+    exact: the next page starts right after the last byte the caller saw.
+    """
+    from agent_local import MAX_TOOL_RESULT_CHARS, MAX_TOOL_RESULT_TOKENS
+
+    if from_end:
+        text = text[-MAX_TOOL_RESULT_CHARS:]
+        starts = [m.start() for m in re.finditer(r"\S+", text)]
+        if len(starts) > MAX_TOOL_RESULT_TOKENS:
+            text = text[starts[-MAX_TOOL_RESULT_TOKENS] :]
+        return text
+    text = text[:MAX_TOOL_RESULT_CHARS]
+    for i, m in enumerate(re.finditer(r"\S+", text)):
+        if i == MAX_TOOL_RESULT_TOKENS:
+            return text[: m.start()]
+    return text
+
+
+def _tail_start(f: Any, size: int, lines: int) -> int:
+    """Offset of the first of the last ``lines`` lines, found with mmap."""
+    if size == 0:
+        return 0
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = size - 1 if mm[size - 1] == ord("\n") else size
+        for _ in range(lines):
+            check_cancelled()
+            nl = mm.rfind(b"\n", 0, end)
+            if nl < 0:
+                return 0
+            end = nl
+        return end + 1
+
+
+def read(
+    path: str,
+    allow: List[str] | None = None,
+    max_bytes: int = 100_000,
+    offset: int = 0,
+    length: int | None = None,
+    tail: int | None = None,
+) -> Dict:
     p = Path(path)
-    allowed = ALLOWED + [Path(a) for a in (allow or [])]
-    rp = p.resolve()
-    if not any(base in rp.parents or base == rp for base in allowed):
+    if resolve_allowed(path, allow) is None:
         return {
             "kind": "error",
             "code": "forbidden_path",
             "message": "path not allowed",
             "hint": "",
         }
+    if tail is not None and offset:
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": "tail and offset are exclusive",
+            "hint": "",
+        }
+    # never more than this in memory, whatever the file size
+    budget = max(1, min(length or max_bytes, MAX_READ_LENGTH))
     try:
-        data = p.read_bytes()[:max_bytes]
-        return {"kind": "ok", "result": _sanitize(data.decode("utf-8", "replace"))}
+        with p.open("rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if tail is not None:
+                start = max(_tail_start(f, size, tail), size - budget)
+            else:
+                start = min(max(0, offset), size)
+            f.seek(start)
+            data = f.read(budget)
+        if tail is not None:
+            # a byte cap may start inside a character
+            skip = 0
+            while skip < min(3, len(data)) and data[skip] & 0xC0 == 0x80:
+                skip += 1
+            data = data[skip:]
+            start += skip
+        elif start + len(data) < size:
+            data = _complete_utf8(data)
+        text = _fit(data.decode("utf-8", "surrogateescape"), from_end=tail is not None)
+        kept = text.encode("utf-8", "surrogateescape")
+        if tail is not None:
+            start += len(data) - len(kept)
+        end = start + len(kept)
+        env: Dict[str, Any] = {
+            "kind": "ok",
+            "result": _sanitize(kept.decode("utf-8", "replace")),
+            "offset": start,
+            "size": size,
+        }
+        if end < size:
+            env["next_offset"] = end
+        return env
     except Exception as e:
         return {
             "kind": "error",
@@ -67,4 +305,41 @@ def read(path: str, allow: List[str] | None = None, max_bytes: int = 100_000) ->
         }
 
 
-__all__ = ["list", "read"]
+def search(
+    query: str,
+    allow: List[str] | None = None,
+    regex: bool = False,
+    case_sensitive: bool = False,
+    limit: int = 50,
+    glob: str | None = None,
+) -> Dict:
+    from search_index import get_index, literal_runs, trigrams
+
+    try:
+        pattern = re.compile(
+            query if regex else re.escape(query),
+            0 if case_sensitive else re.IGNORECASE,
+        )
+    except re.error as e:
+        return {"kind": "error", "code": "bad_args", "message": str(e), "hint": ""}
+    runs = literal_runs(query) if regex else [query]
+    required = set().union(*(trigrams(r) for r in runs))
+    roots = [str(r.resolve()) for r in ALLOWED + [Path(a) for a in (allow or [])]]
+    roots = [r for r in roots if os.path.isdir(r)]
+    try:
+        index = get_index()
+        index.refresh(roots)
+        hits, truncated = index.search(
+            pattern, roots, required=required, limit=max(1, limit), glob=glob
+        )
+    except sqlite3.Error as e:
+        return {"kind": "error", "code": "index_error", "message": str(e), "hint": ""}
+    for hit in hits:
+        hit["text"] = _sanitize(hit["text"])
+    env: Dict[str, Any] = {"kind": "ok", "result": hits}
+    if truncated:
+        env["truncated"] = True
+    return env
+
+
+__all__ = ["dir_cache", "list", "read", "resolve_allowed", "scan", "search"]
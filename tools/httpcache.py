@@ -0,0 +1,338 @@
+"""Disk-backed private HTTP cache for ``web.read`` (a subset of RFC 9111).
+
+Successful ``GET`` responses are stored in SQLite with the headers they came
+with. An entry is served without contacting the origin while it is fresh:
+freshness comes from ``Cache-Control: max-age``, else ``Expires`` minus
+``Date``, else the usual heuristic of 10% of the time since
+``Last-Modified`` (at most a day). Age includes the ``Age`` header and the
+time spent in the cache. Stale entries, and entries stored with
+``no-cache``, are revalidated with ``If-None-Match``/``If-Modified-Since``;
+a ``304`` freshens the stored headers and the cached body is used.
+
+Responses with ``no-store``, ``Vary: *`` or neither a freshness lifetime nor
+a validator are not stored. The database is created 0600 in the user's cache
+directory (see :mod:`private_paths`), so ``private`` responses are kept.
+Entries beyond ``WEB_CACHE_MAX_BYTES`` are evicted least recently used first;
+triggers keep the total body size in ``cache_size`` so a write only scans
+entries when the cache is over budget.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, NamedTuple
+
+from private_paths import private_file, user_cache_dir
+
+DEFAULT_CACHE_PATH = os.path.join(user_cache_dir(), "http_cache.sqlite3")
+HEURISTIC_FRACTION = 0.1
+MAX_HEURISTIC_S = 86_400.0
+CACHEABLE_STATUS = {200, 203}
+
+
+class Entry(NamedTuple):
+    """A stored response and the times needed to compute its age."""
+
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    request_time: float
+    response_time: float
+    vary: Dict[str, str]
+
+
+def cache_control(headers: Mapping[str, str]) -> Dict[str, str | None]:
+    """Parse ``Cache-Control`` into ``{directive: argument or None}``."""
+    out: Dict[str, str | None] = {}
+    for part in (headers.get("cache-control") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            out[name.lower()] = value.strip().strip('"') if value else None
+    return out
+
+
+def _date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _seconds(value: str | None) -> float | None:
+    try:
+        return max(0.0, float(int(value or "")))
+    except ValueError:
+        return None
+
+
+def freshness_lifetime(headers: Mapping[str, str]) -> float:
+    """Seconds a response stays fresh after it was generated."""
+    cc = cache_control(headers)
+    max_age = _seconds(cc.get("max-age"))
+    if max_age is not None:
+        return max_age
+    date = _date(headers.get("date"))
+    if "expires" in headers:
+        expires = _date(headers.get("expires"))
+        # an invalid Expires, like "0", means already expired
+        if expires is None or date is None:
+            return 0.0
+        return max(0.0, expires - date)
+    modified = _date(headers.get("last-modified"))
+    if modified is not None and date is not None and date > modified:
+        return min((date - modified) * HEURISTIC_FRACTION, MAX_HEURISTIC_S)
+    return 0.0
+
+
+def current_age(entry: Entry, now: float) -> float:
+    """Age of ``entry`` at ``now`` (RFC 9111, section 4.2.3)."""
+    date = _date(entry.headers.get("date"))
+    apparent = max(0.0, entry.response_time - date) if date is not None else 0.0
+    age_value = _seconds(entry.headers.get("age")) or 0.0
+    delay = entry.response_time - entry.request_time
+    initial = max(apparent, age_value + delay)
+    return initial + (now - entry.response_time)
+
+
+def is_fresh(entry: Entry, now: float) -> bool:
+    if "no-cache" in cache_control(entry.headers):
+        return False
+    return freshness_lifetime(entry.headers) > current_age(entry, now)
+
+
+def storable(status: int, headers: Mapping[str, str]) -> bool:
+    cc = cache_control(headers)
+    if status not in CACHEABLE_STATUS or "no-store" in cc:
+        return False
+    if (headers.get("vary") or "").strip() == "*":
+        return False
+    has_validator = "etag" in headers or "last-modified" in headers
+    return has_validator or "no-cache" in cc or freshness_lifetime(headers) > 0
+
+
+def conditional_headers(entry: Entry) -> Dict[str, str]:
+    out = {}
+    if entry.headers.get("etag"):
+        out["If-None-Match"] = entry.headers["etag"]
+    if entry.headers.get("last-modified"):
+        out["If-Modified-Since"] = entry.headers["last-modified"]
+    return out
+
+
+def _vary(
+    headers: Mapping[str, str], request_headers: Mapping[str, str]
+) -> Dict[str, str]:
+    names = [n.strip().lower() for n in (headers.get("vary") or "").split(",")]
+    lowered = {k.lower(): v for k, v in request_headers.items()}
+    return {n: lowered.get(n, "") for n in names if n}
+
+
+# headers a 304 must not replace (RFC 9111, section 3.2)
+_KEEP_ON_304 = {
+    "content-encoding",
+    "content-length",
+    "content-range",
+    "transfer-encoding",
+}
+
+
+class HttpCache:
+    """Response store at ``path``; safe to share between threads."""
+
+    def __init__(
+        self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 50_000_000
+    ) -> None:
+        self.path = private_file(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                vary TEXT NOT NULL,
+                body BLOB NOT NULL,
+                request_time REAL NOT NULL,
+                response_time REAL NOT NULL,
+                used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at);
+            CREATE TABLE IF NOT EXISTS cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                bytes INTEGER NOT NULL
+            );
+            CREATE TRIGGER IF NOT EXISTS responses_added AFTER INSERT ON responses
+            BEGIN
+                UPDATE cache_size SET bytes = bytes + LENGTH(new.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS responses_removed AFTER DELETE ON responses
+            BEGIN
+                UPDATE cache_size SET bytes = bytes - LENGTH(old.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS responses_replaced
+            AFTER UPDATE OF body ON responses
+            BEGIN
+                UPDATE cache_size
+                SET bytes = bytes + LENGTH(new.body) - LENGTH(old.body);
+            END;
+            BEGIN IMMEDIATE;
+            INSERT OR IGNORE INTO cache_size (id, bytes)
+                SELECT 0, COALESCE(SUM(LENGTH(body)), 0) FROM responses
+                WHERE NOT EXISTS (SELECT 1 FROM cache_size);
+            COMMIT;
+            """
+        )
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        con: sqlite3.Connection | None = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def lookup(self, url: str, request_headers: Mapping[str, str]) -> Entry | None:
+        row = (
+            self.connection()
+            .execute(
+                "SELECT status, headers, vary, body, request_time, response_time"
+                " FROM responses WHERE url = ?",
+                (url,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        status, headers, vary, body, request_time, response_time = row
+        entry = Entry(
+            url,
+            status,
+            json.loads(headers),
+            body,
+            request_time,
+            response_time,
+            json.loads(vary),
+        )
+        lowered = {k.lower(): v for k, v in request_headers.items()}
+        if any(lowered.get(k, "") != v for k, v in entry.vary.items()):
+            return None
+        self.connection().execute(
+            "UPDATE responses SET used_at = ? WHERE url = ?", (time.time(), url)
+        )
+        return entry
+
+    def store(
+        self,
+        url: str,
+        status: int,
+        headers: Mapping[str, str],
+        body: bytes,
+        request_time: float,
+        response_time: float,
+        request_headers: Mapping[str, str],
+    ) -> Entry | None:
+        """Save the response if it may be cached; return the stored entry."""
+        if not storable(status, headers) or len(body) > self.max_bytes:
+            self.forget(url)
+            return None
+        stored = {k.lower(): v for k, v in headers.items()}
+        vary = _vary(stored, request_headers)
+        entry = Entry(url, status, stored, body, request_time, response_time, vary)
+        self._write(entry)
+        return entry
+
+    def freshen(
+        self,
+        entry: Entry,
+        headers: Mapping[str, str],
+        request_time: float,
+        response_time: float,
+    ) -> Entry:
+        """Apply a ``304`` response's headers to ``entry`` and save it."""
+        merged = dict(entry.headers)
+        for key, value in headers.items():
+            if key.lower() not in _KEEP_ON_304:
+                merged[key.lower()] = value
+        entry = entry._replace(
+            headers=merged, request_time=request_time, response_time=response_time
+        )
+        self._write(entry)
+        return entry
+
+    def _write(self, entry: Entry) -> None:
+        con = self.connection()
+        # an upsert rather than INSERT OR REPLACE, whose implicit delete
+        # would skip the responses_removed trigger
+        con.execute(
+            """
+            INSERT INTO responses
+                (url, status, headers, vary, body, request_time, response_time, used_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                status = excluded.status,
+                headers = excluded.headers,
+                vary = excluded.vary,
+                body = excluded.body,
+                request_time = excluded.request_time,
+                response_time = excluded.response_time,
+                used_at = excluded.used_at
+            """,
+            (
+                entry.url,
+                entry.status,
+                json.dumps(entry.headers),
+                json.dumps(entry.vary),
+                entry.body,
+                entry.request_time,
+                entry.response_time,
+                time.time(),
+            ),
+        )
+        self._evict(con)
+
+    def _evict(self, con: sqlite3.Connection) -> None:
+        (total,) = con.execute("SELECT bytes FROM cache_size").fetchone()
+        if total <= self.max_bytes:
+            return
+        for url, size in con.execute(
+            "SELECT url, LENGTH(body) FROM responses ORDER BY used_at"
+        ).fetchall():
+            con.execute("DELETE FROM responses WHERE url = ?", (url,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def forget(self, url: str) -> None:
+        self.connection().execute("DELETE FROM responses WHERE url = ?", (url,))
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = (
+            self.connection()
+            .execute("SELECT (SELECT COUNT(*) FROM responses), bytes FROM cache_size")
+            .fetchone()
+        )
+        return {"entries": entries, "bytes": size}
+
+
+__all__ = [
+    "Entry",
+    "HttpCache",
+    "cache_control",
+    "conditional_headers",
+    "current_age",
+    "freshness_lifetime",
+    "is_fresh",
+    "storable",
+]
@@ -11,7 +11,15 @@ def _sanitize(text: str) -> str:
     return _truncate(_redact(text))
 
 
-def crop(png_base64: str, x: int, y: int, w: int, h: int) -> Dict[str, Any]:
+def crop(
+    png_base64: str | None,
+    x: int,
+    y: int,
+    w: int,
+    h: int,
+    image: bytes | None = None,
+) -> Dict[str, Any]:
+    """Crop a PNG given as ``png_base64`` or as raw ``image`` bytes."""
     try:
         from PIL import Image
     except Exception:
@@ -22,7 +30,7 @@ def crop(png_base64: str, x: int, y: int, w: int, h: int) -> Dict[str, Any]:
             "hint": "pip install -r requirements-optional.txt",
         }
     try:
-        data = base64.b64decode(png_base64)
+        data = image if image is not None else base64.b64decode(png_base64 or "")
         img = Image.open(io.BytesIO(data))
         cropped = img.crop((x, y, x + w, y + h))
         buf = io.BytesIO()
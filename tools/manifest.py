@@ -0,0 +1,355 @@
+"""Static catalog of the built-in tools.
+
+Pure data: metadata and schemas of every tool with the ``module:function``
+that implements it. :func:`tools.register_all_tools` registers these entries
+without importing the implementing modules, which load on first dispatch.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+MANIFEST: List[Dict[str, Any]] = [
+    {
+        "name": "system.capture_screen",
+        "version": "1",
+        "summary": "capture screen region",
+        "safety": "read",
+        "timeout_ms": 5000,
+        "rate_limit_per_min": 30,
+        "enabled_in_safe_mode": True,
+        "target": "tools.system:capture_screen",
+        "schema": {
+            "args": {"type": "object", "properties": {"bounds": {"type": "object"}}},
+            "returns": {
+                "type": "object",
+                "properties": {"png_base64": {"type": "string"}},
+            },
+        },
+    },
+    {
+        "name": "system.ocr",
+        "version": "1",
+        "summary": "ocr image or screen region",
+        "safety": "read",
+        "timeout_ms": 5000,
+        "rate_limit_per_min": 30,
+        "enabled_in_safe_mode": True,
+        "target": "tools.system:ocr",
+        "executor": "process",
+        "binary_args": {"png_base64": "image"},
+        "schema": {
+            "args": {
+                "type": "object",
+                "properties": {
+                    "bounds": {"type": "object"},
+                    "path": {"type": "string"},
+                    "png_base64": {"type": "string"},
+                },
+            },
+            "returns": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string"},
+                    "confidence": {"type": "number"},
+                },
+            },
+        },
+    },
+    {
+        "name": "system.toolspec",
+        "version": "1",
+        "summary": "list available tools and schemas",
+        "safety": "read",
+        "timeout_ms": 1000,
+        "rate_limit_per_min": 10,
+        "enabled_in_safe_mode": True,
+        "target": "tools.system:toolspec",
+        "cache": {"ttl_s": 5},
+        "schema": {
+            "args": {"type": "object", "properties": {}},
+            "returns": {"type": "object"},
+        },
+    },
+    {
+        "name": "system.info",
+        "version": "1",
+        "summary": "basic system info",
+        "safety": "read",
+        "timeout_ms": 1000,
+        "rate_limit_per_min": 60,
+        "enabled_in_safe_mode": True,
+        "target": "tools.system:info",
+        "cache": {"ttl_s": 5},
+        "schema": {
+            "args": {"type": "object", "properties": {}},
+            "returns": {"type": "object"},
+            "x-retry": 2,
+        },
+    },
+    {
+        "name": "fs.list",
+        "version": "1",
+        "summary": "list directory",
+        "safety": "read",
+        "timeout_ms": 1000,
+        "rate_limit_per_min": 60,
+        "enabled_in_safe_mode": True,
+        "target": "tools.fs:list",
+        "cache": {
+            "ttl_s": 2,
+            "key": [
+                "path",
+                "recursive",
+                "allow",
+                "limit",
+                "cursor",
+                "depth",
+                "glob",
+                "stat",
+            ],
+            "validate": "path",
+        },
+        "schema": {
+            "args": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "recursive": {"type": "boolean"},
+                    "allow": {"type": "array", "items": {"type": "string"}},
+                    "limit": {"type": "integer", "minimum": 1, "maximum": 5000},
+                    "cursor": {"type": "string"},
+                    "depth": {"type": "integer", "minimum": 1},
+                    "glob": {"type": "string"},
+                    "stat": {"type": "boolean"},
+                },
+                "required": ["path"],
+            },
+            "returns": {
+                "type": "array",
+                "items": {
+                    "type": ["string", "object"],
+                    "properties": {
+                        "path": {"type": "string"},
+                        "type": {"type": "string"},
+                        "size": {"type": "integer"},
+                        "mtime": {"type": "number"},
+                    },
+                },
+            },
+        },
+    },
+    {
+        "name": "fs.read",
+        "version": "1",
+        "summary": "read file",
+        "safety": "read",
+        "timeout_ms": 1000,
+        "rate_limit_per_min": 60,
+        "enabled_in_safe_mode": True,
+        "target": "tools.fs:read",
+        "cache": {
+            "ttl_s": 30,
+            "key": ["path", "allow", "max_bytes", "offset", "length", "tail"],
+            "validate": "path",
+        },
+        "schema": {
+            "args": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "allow": {"type": "array", "items": {"type": "string"}},
+                    "max_bytes": {"type": "integer", "minimum": 1},
+                    "offset": {"type": "integer", "minimum": 0},
+                    "length": {"type": "integer", "minimum": 1},
+                    "tail": {"type": "integer", "minimum": 1},
+                },
+                "required": ["path"],
+            },
+            "returns": {"type": "string"},
+        },
+    },
+    {
+        "name": "fs.search",
+        "version": "1",
+        "summary": "search file contents in allowed dirs",
+        "safety": "read",
+        "timeout_ms": 10000,
+        "rate_limit_per_min": 60,
+        "enabled_in_safe_mode": True,
+        "target": "tools.fs:search",
+        "schema": {
+            "args": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "minLength": 1},
+                    "regex": {"type": "boolean"},
+                    "case_sensitive": {"type": "boolean"},
+                    "limit": {"type": "integer", "minimum": 1, "maximum": 500},
+                    "glob": {"type": "string"},
+                    "allow": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["query"],
+            },
+            "returns": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string"},
+                        "line": {"type": "integer"},
+                        "text": {"type": "string"},
+                    },
+                },
+            },
+        },
+    },
+    {
+        "name": "archive.list",
+        "version": "1",
+        "summary": "list zip or tar archive entries",
+        "safety": "read",
+        "timeout_ms": 10000,
+        "rate_limit_per_min": 60,
+        "enabled_in_safe_mode": True,
+        "target": "tools.archive:list",
+        "cache": {
+            "ttl_s": 30,
+            "key": ["path", "allow", "limit", "cursor"],
+            "validate": "path",
+        },
+        "schema": {
+            "args": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "allow": {"type": "array", "items": {"type": "string"}},
+                    "limit": {"type": "integer", "minimum": 1, "maximum": 5000},
+                    "cursor": {"type": "string"},
+                },
+                "required": ["path"],
+            },
+            "returns": {"type": "array", "items": {"type": "string"}},
+        },
+    },
+    {
+        "name": "archive.read",
+        "version": "1",
+        "summary": "read zip or tar archive entry",
+        "safety": "read",
+        "timeout_ms": 10000,
+        "rate_limit_per_min": 60,
+        "enabled_in_safe_mode": True,
+        "target": "tools.archive:read",
+        "cache": {
+            "ttl_s": 30,
+            "key": ["path", "inner_path", "allow", "offset", "length"],
+            "validate": "path",
+        },
+        "schema": {
+            "args": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "inner_path": {"type": "string"},
+                    "allow": {"type": "array", "items": {"type": "string"}},
+                    "offset": {"type": "integer", "minimum": 0},
+                    "length": {"type": "integer", "minimum": 1, "maximum": 512000},
+                },
+                "required": ["path", "inner_path"],
+            },
+            "returns": {
+                "type": "object",
+                "properties": {"bytes_b64": {"type": "string"}},
+            },
+        },
+    },
+    {
+        "name": "web.read",
+        "version": "1",
+        "summary": "read web page",
+        "safety": "read",
+        "timeout_ms": 5000,
+        "rate_limit_per_min": 30,
+        "enabled_in_safe_mode": True,
+        "target": "tools.web:read",
+        "cache": {"ttl_s": 60, "key": ["url"], "validate": "http"},
+        "schema": {
+            "args": {
+                "type": "object",
+                "properties": {"url": {"type": "string"}},
+                "required": ["url"],
+            },
+            "returns": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string"},
+                    "url_final": {"type": "string"},
+                },
+            },
+        },
+    },
+    {
+        "name": "ui.what_under_mouse",
+        "version": "1",
+        "summary": "cursor position and UI element",
+        "safety": "read",
+        "timeout_ms": 1000,
+        "rate_limit_per_min": 60,
+        "enabled_in_safe_mode": True,
+        "target": "tools.ui:what_under_mouse",
+        "schema": {
+            "args": {"type": "object", "properties": {}},
+            "returns": {
+                "type": "object",
+                "properties": {
+                    "x": {"type": "integer"},
+                    "y": {"type": "integer"},
+                    "window": {
+                        "type": ["object", "null"],
+                        "properties": {
+                            "title": {"type": "string"},
+                            "app": {"type": "string"},
+                        },
+                    },
+                    "control": {
+                        "type": ["object", "null"],
+                        "properties": {
+                            "role": {"type": "string"},
+                            "name": {"type": "string"},
+                        },
+                    },
+                },
+            },
+        },
+    },
+    {
+        "name": "image.crop",
+        "version": "1",
+        "summary": "crop image region",
+        "safety": "read",
+        "timeout_ms": 1000,
+        "rate_limit_per_min": 30,
+        "enabled_in_safe_mode": True,
+        "target": "tools.image:crop",
+        "executor": "process",
+        "binary_args": {"png_base64": "image"},
+        "schema": {
+            "args": {
+                "type": "object",
+                "properties": {
+                    "png_base64": {"type": "string"},
+                    "x": {"type": "integer"},
+                    "y": {"type": "integer"},
+                    "w": {"type": "integer"},
+                    "h": {"type": "integer"},
+                },
+                "required": ["png_base64", "x", "y", "w", "h"],
+            },
+            "returns": {
+                "type": "object",
+                "properties": {"png_base64": {"type": "string"}},
+            },
+        },
+    },
+]
@@ -0,0 +1,552 @@
+"""Random-access index of tar archives, plain or compressed.
+
+The first access to an archive walks it once and records every member's name,
+size and data offset in the uncompressed tar stream. For gzip the same pass
+also stores inflate checkpoints, zran style: at a deflate block boundary
+roughly every :data:`SPAN` bytes of output it keeps the compressed offset,
+the bit position inside that byte and the last 32 KiB of output. Reading a
+member later resumes raw inflation at the nearest checkpoint before it, so
+the work is bounded by ``SPAN`` plus the requested window instead of
+everything in front of the member.
+
+Checkpoints need ``inflatePrime``, which Python's :mod:`zlib` does not
+expose, so they use the system zlib through :mod:`ctypes`. Without it, and
+for bz2 and xz, reads decompress sequentially from the start of the stream.
+Every decompressing pass checks for cancellation and stops with
+:class:`RatioExceeded` past ``max_ratio`` times the compressed input.
+
+Indexes are saved as JSON sidecar files under ``ARCHIVE_INDEX_DIR``, named
+after the archive path and checked against its ``(mtime_ns, size)``.
+"""
+
+from __future__ import annotations
+
+import base64
+import bz2
+import ctypes
+import ctypes.util
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import tarfile
+import threading
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from typing import IO, Any, Deque, Dict, List, NamedTuple, Tuple
+
+import metrics
+from executor import check_cancelled
+from private_paths import private_dir, user_cache_dir
+
+# uncompressed bytes between gzip checkpoints
+SPAN = 4 * 1024 * 1024
+WINDOW = 32 * 1024
+CHUNK = 64 * 1024
+INDEX_VERSION = 1
+DEFAULT_INDEX_DIR = os.path.join(user_cache_dir(), "archive_index")
+# parsed indexes kept in memory
+MAX_LOADED = 16
+
+_MAGIC = ((b"\x1f\x8b", "gz"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"))
+_DECOMPRESSORS: Dict[str, Any] = {
+    "gz": lambda f: gzip.GzipFile(fileobj=f, mode="rb"),
+    "bz2": bz2.BZ2File,
+    "xz": lzma.LZMAFile,
+}
+
+_Z_OK, _Z_STREAM_END, _Z_BUF_ERROR = 0, 1, -5
+_Z_NO_FLUSH, _Z_BLOCK = 0, 5
+
+
+class RatioExceeded(Exception):
+    """Decompression produced over ``max_ratio`` times the bytes consumed."""
+
+
+class Member(NamedTuple):
+    """A tar member and where its data starts in the uncompressed stream."""
+
+    name: str
+    offset: int
+    size: int
+    regular: bool
+
+
+class Checkpoint(NamedTuple):
+    """Restart point for raw inflation inside a gzip stream."""
+
+    inpos: int
+    bits: int
+    out: int
+    window: bytes
+
+
+def detect(path: str) -> str | None:
+    """``"tar"``, ``"gz"``, ``"bz2"`` or ``"xz"`` for tar archives, else ``None``."""
+    with open(path, "rb") as f:
+        head = f.read(512)
+    for magic, fmt in _MAGIC:
+        if head.startswith(magic):
+            return fmt
+    if len(head) == 512 and head[257:262] == b"ustar":
+        return "tar"
+    return None
+
+
+# system zlib --------------------------------------------------------------
+
+
+class _ZStream(ctypes.Structure):
+    _fields_ = [
+        ("next_in", ctypes.c_void_p),
+        ("avail_in", ctypes.c_uint),
+        ("total_in", ctypes.c_ulong),
+        ("next_out", ctypes.c_void_p),
+        ("avail_out", ctypes.c_uint),
+        ("total_out", ctypes.c_ulong),
+        ("msg", ctypes.c_char_p),
+        ("state", ctypes.c_void_p),
+        ("zalloc", ctypes.c_void_p),
+        ("zfree", ctypes.c_void_p),
+        ("opaque", ctypes.c_void_p),
+        ("data_type", ctypes.c_int),
+        ("adler", ctypes.c_ulong),
+        ("reserved", ctypes.c_ulong),
+    ]
+
+
+_LIBZ: Any = None
+_LIBZ_LOCK = threading.Lock()
+
+
+def _libz() -> Any:
+    """The system zlib loaded through ctypes, or ``None`` if unavailable."""
+    global _LIBZ
+    with _LIBZ_LOCK:
+        if _LIBZ is None:
+            _LIBZ = False
+            for name in (ctypes.util.find_library("z"), "libz.so.1", "zlib1.dll"):
+                if not name:
+                    continue
+                try:
+                    lib = ctypes.CDLL(name)
+                    lib.inflatePrime
+                except (OSError, AttributeError):
+                    continue
+                p = ctypes.POINTER(_ZStream)
+                lib.zlibVersion.restype = ctypes.c_char_p
+                lib.inflateInit2_.argtypes = [
+                    p,
+                    ctypes.c_int,
+                    ctypes.c_char_p,
+                    ctypes.c_int,
+                ]
+                lib.inflate.argtypes = [p, ctypes.c_int]
+                lib.inflatePrime.argtypes = [p, ctypes.c_int, ctypes.c_int]
+                lib.inflateSetDictionary.argtypes = [p, ctypes.c_char_p, ctypes.c_uint]
+                lib.inflateReset2.argtypes = [p, ctypes.c_int]
+                lib.inflateEnd.argtypes = [p]
+                _LIBZ = lib
+                break
+        return _LIBZ or None
+
+
+class _Inflate:
+    """Thin wrapper over a ``z_stream`` with fixed input and output buffers."""
+
+    def __init__(self, wbits: int) -> None:
+        self.lib = _libz()
+        self.strm = _ZStream()
+        self._in = ctypes.create_string_buffer(CHUNK)
+        self._out = ctypes.create_string_buffer(CHUNK)
+        self.total_in = 0
+        ret = self.lib.inflateInit2_(
+            ctypes.byref(self.strm),
+            wbits,
+            self.lib.zlibVersion(),
+            ctypes.sizeof(self.strm),
+        )
+        if ret != _Z_OK:
+            raise zlib.error(f"inflateInit2 failed ({ret})")
+
+    @property
+    def avail_in(self) -> int:
+        return int(self.strm.avail_in)
+
+    def feed(self, data: bytes) -> bool:
+        """Replace the (exhausted) input with ``data``; ``False`` at EOF."""
+        if not data:
+            return False
+        ctypes.memmove(self._in, data, len(data))
+        self.strm.next_in = ctypes.addressof(self._in)
+        self.strm.avail_in = len(data)
+        return True
+
+    def skip(self, n: int) -> int:
+        """Drop up to ``n`` input bytes without inflating them."""
+        n = min(n, self.avail_in)
+        self.strm.next_in += n
+        self.strm.avail_in -= n
+        self.total_in += n
+        return n
+
+    def inflate(self, limit: int, flush: int) -> Tuple[bytes, int]:
+        limit = min(limit, CHUNK)
+        self.strm.next_out = ctypes.addressof(self._out)
+        self.strm.avail_out = limit
+        before = self.avail_in
+        ret = self.lib.inflate(ctypes.byref(self.strm), flush)
+        if ret not in (_Z_OK, _Z_STREAM_END, _Z_BUF_ERROR):
+            msg = (self.strm.msg or b"").decode("ascii", "replace")
+            raise zlib.error(f"inflate failed ({ret}): {msg}")
+        self.total_in += before - self.avail_in
+        produced = limit - self.strm.avail_out
+        return ctypes.string_at(self._out, produced), ret
+
+    def at_block_boundary(self) -> bool:
+        # bit 7: stopped at a block boundary; bit 6: after the last block
+        return bool(self.strm.data_type & 128) and not self.strm.data_type & 64
+
+    def prime(self, bits: int, value: int) -> None:
+        self.lib.inflatePrime(ctypes.byref(self.strm), bits, value)
+
+    def set_dictionary(self, window: bytes) -> None:
+        self.lib.inflateSetDictionary(ctypes.byref(self.strm), window, len(window))
+
+    def reset(self, wbits: int) -> None:
+        self.lib.inflateReset2(ctypes.byref(self.strm), wbits)
+
+    def close(self) -> None:
+        self.lib.inflateEnd(ctypes.byref(self.strm))
+
+
+class _GzipIndexer(io.RawIOBase):
+    """Decompressed view of a gzip file that records checkpoints as it goes."""
+
+    def __init__(self, f: IO[bytes], span: int, max_ratio: float) -> None:
+        self.f = f
+        self.span = span
+        self.max_ratio = max_ratio
+        self.z = _Inflate(47)  # gzip or zlib header, auto-detected
+        self.total_out = 0
+        self.points: List[Checkpoint] = []
+        self._recent: Deque[bytes] = deque()
+        self._recent_len = 0
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _track(self, out: bytes) -> None:
+        if not out:
+            return
+        self.total_out += len(out)
+        self._recent.append(out)
+        self._recent_len += len(out)
+        while self._recent_len - len(self._recent[0]) >= WINDOW:
+            self._recent_len -= len(self._recent.popleft())
+        if self.total_out > self.max_ratio * max(self.z.total_in, CHUNK):
+            raise RatioExceeded
+
+    def readinto(self, b: Any) -> int:
+        while not self._eof:
+            check_cancelled()
+            if not self.z.avail_in and not self.z.feed(self.f.read(CHUNK)):
+                raise EOFError("gzip stream ended early")
+            out, ret = self.z.inflate(len(b), _Z_BLOCK)
+            self._track(out)
+            if ret == _Z_STREAM_END:
+                # another gzip member may follow
+                if self.z.avail_in or self.z.feed(self.f.read(CHUNK)):
+                    self.z.reset(47)
+                else:
+                    self._eof = True
+            elif self.z.at_block_boundary() and (
+                not self.points or self.total_out - self.points[-1].out >= self.span
+            ):
+                window = b"".join(self._recent)[-WINDOW:]
+                self.points.append(
+                    Checkpoint(
+                        self.z.total_in,
+                        self.z.strm.data_type & 7,
+                        self.total_out,
+                        window,
+                    )
+                )
+            if out:
+                b[: len(out)] = out
+                return len(out)
+        return 0
+
+    def close(self) -> None:
+        if not self.closed:
+            self.z.close()
+        super().close()
+
+
+class _Guarded(io.RawIOBase):
+    """Decompressed view of ``f`` that enforces ``max_ratio`` per chunk."""
+
+    def __init__(self, f: IO[bytes], fmt: str, max_ratio: float) -> None:
+        self.f = f
+        self.max_ratio = max_ratio
+        self.total_out = 0
+        self.stream = _DECOMPRESSORS[fmt](f)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        check_cancelled()
+        view = memoryview(b)[:CHUNK]
+        n: int = self.stream.readinto(view)
+        self.total_out += n
+        # f.tell() is the compressed input the decompressor consumed so far
+        if self.total_out > self.max_ratio * max(self.f.tell(), CHUNK):
+            raise RatioExceeded
+        return n
+
+    def skip(self, n: int) -> None:
+        """Decompress and drop ``n`` bytes."""
+        buf = bytearray(CHUNK)
+        while n > 0:
+            got = self.readinto(memoryview(buf)[: min(n, CHUNK)])
+            if not got:
+                break
+            n -= got
+
+    def close(self) -> None:
+        if not self.closed:
+            self.stream.close()
+        super().close()
+
+
+# index --------------------------------------------------------------------
+
+
+class TarIndex:
+    """Members of one archive version and, for gzip, its checkpoints."""
+
+    def __init__(
+        self,
+        fmt: str,
+        stamp: Tuple[int, int],
+        members: List[Member],
+        points: List[Checkpoint],
+    ) -> None:
+        self.fmt = fmt
+        self.stamp = stamp
+        self.members = members
+        self.points = points
+        self.by_name = {m.name: m for m in members}
+        self._outs = [p.out for p in points]
+
+    def read(
+        self,
+        path: str,
+        member: Member,
+        start: int,
+        length: int,
+        max_ratio: float = 1000,
+    ) -> bytes:
+        """Bytes ``[start, start + length)`` of ``member``'s data."""
+        start = min(max(0, start), member.size)
+        length = min(length, member.size - start)
+        if length <= 0:
+            return b""
+        pos = member.offset + start
+        if self.fmt == "gz" and self.points and _libz() is not None:
+            return self._inflate_from_checkpoint(path, pos, length)
+        with open(path, "rb") as f:
+            if self.fmt == "tar":
+                f.seek(pos)
+                return f.read(length)
+            # no checkpoints: decompress everything in front of ``pos``
+            with _Guarded(f, self.fmt, max_ratio) as raw:
+                raw.skip(pos)
+                out = bytearray()
+                buf = bytearray(CHUNK)
+                while len(out) < length:
+                    got = raw.readinto(memoryview(buf)[: length - len(out)])
+                    if not got:
+                        break
+                    out += buf[:got]
+                return bytes(out)
+
+    def _inflate_from_checkpoint(self, path: str, pos: int, length: int) -> bytes:
+        cp = self.points[bisect_right(self._outs, pos) - 1]
+        z = _Inflate(-15)
+        out = bytearray()
+        try:
+            with open(path, "rb") as f:
+                if cp.bits:
+                    f.seek(cp.inpos - 1)
+                    z.prime(cp.bits, f.read(1)[0] >> (8 - cp.bits))
+                else:
+                    f.seek(cp.inpos)
+                if cp.window:
+                    z.set_dictionary(cp.window)
+                produced, end = cp.out, pos + length
+                raw, trailer = True, 0
+                while produced < end:
+                    check_cancelled()
+                    if not z.avail_in and not z.feed(f.read(CHUNK)):
+                        break
+                    if trailer:
+                        trailer -= z.skip(trailer)
+                        continue
+                    data, ret = z.inflate(CHUNK, _Z_NO_FLUSH)
+                    produced += len(data)
+                    if produced > pos:
+                        keep = data[max(0, len(data) - (produced - pos)) :]
+                        out += keep[: end - pos - len(out)]
+                    if ret == _Z_STREAM_END:
+                        # raw inflation leaves the member's 8-byte trailer;
+                        # later members are read with their gzip header
+                        if raw:
+                            trailer = 8
+                        raw = False
+                        z.reset(31)
+        finally:
+            z.close()
+        return bytes(out)
+
+    # sidecar ------------------------------------------------------------
+
+    def dump(self, path: str) -> Dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
+            "path": path,
+            "format": self.fmt,
+            "stamp": list(self.stamp),
+            "members": [list(m) for m in self.members],
+            "points": [
+                [
+                    p.inpos,
+                    p.bits,
+                    p.out,
+                    base64.b64encode(zlib.compress(p.window)).decode("ascii"),
+                ]
+                for p in self.points
+            ],
+        }
+
+    @classmethod
+    def load(cls, data: Dict[str, Any]) -> "TarIndex":
+        return cls(
+            data["format"],
+            (data["stamp"][0], data["stamp"][1]),
+            [Member(*m) for m in data["members"]],
+            [
+                Checkpoint(i, b, o, zlib.decompress(base64.b64decode(w)))
+                for i, b, o, w in data["points"]
+            ],
+        )
+
+
+def build(path: str, fmt: str, max_ratio: float = 1000) -> TarIndex:
+    """Walk the archive at ``path`` once and index it."""
+    st = os.stat(path)
+    points: List[Checkpoint] = []
+    with open(path, "rb") as f:
+        if fmt == "gz" and _libz() is not None:
+            raw = _GzipIndexer(f, SPAN, max_ratio)
+            with raw, tarfile.open(
+                fileobj=io.BufferedReader(raw, CHUNK), mode="r|"
+            ) as tf:
+                members = _members(tf)
+            points = raw.points
+        elif fmt == "tar":
+            with tarfile.open(fileobj=f, mode="r:") as tf:
+                members = _members(tf)
+        else:
+            raw = _Guarded(f, fmt, max_ratio)
+            with raw, tarfile.open(
+                fileobj=io.BufferedReader(raw, CHUNK), mode="r|"
+            ) as tf:
+                members = _members(tf)
+    return TarIndex(fmt, (st.st_mtime_ns, st.st_size), members, points)
+
+
+def _members(tf: tarfile.TarFile) -> List[Member]:
+    out = []
+    for info in tf:
+        check_cancelled()
+        out.append(Member(info.name, info.offset_data, info.size, info.isreg()))
+    return out
+
+
+def index_dir() -> str:
+    from settings import ARCHIVE_INDEX_DIR
+
+    return ARCHIVE_INDEX_DIR or DEFAULT_INDEX_DIR
+
+
+def _sidecar(path: str) -> str:
+    name = hashlib.sha1(path.encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(index_dir(), name + ".json")
+
+
+_LOADED: OrderedDict[str, TarIndex] = OrderedDict()
+_LOADED_LOCK = threading.Lock()
+
+
+def get_index(path: str, fmt: str, max_ratio: float = 1000) -> TarIndex:
+    """Index of the archive at resolved ``path``, built on first access."""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _LOADED_LOCK:
+        index = _LOADED.get(path)
+        if index is not None and index.stamp == stamp:
+            _LOADED.move_to_end(path)
+            metrics.record_fs_cache("tar", "hit")
+            return index
+    sidecar = _sidecar(path)
+    index = None
+    try:
+        # refuses a directory someone else owns, so its sidecars are not read
+        private_dir(os.path.dirname(sidecar))
+        with open(sidecar, encoding="utf-8") as f:
+            data = json.load(f)
+        if (
+            data.get("version") == INDEX_VERSION
+            and data.get("path") == path
+            and tuple(data.get("stamp", ())) == stamp
+        ):
+            index = TarIndex.load(data)
+            metrics.record_fs_cache("tar", "sidecar")
+    except (OSError, ValueError, KeyError, TypeError, zlib.error):
+        index = None
+    if index is None:
+        metrics.record_fs_cache("tar", "miss")
+        index = build(path, fmt, max_ratio)
+        try:
+            # member names and paths are private: 0700 directory, 0600 files
+            tmp = f"{sidecar}.{os.getpid()}.{threading.get_ident()}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump(index.dump(path), f)
+            os.replace(tmp, sidecar)
+        except OSError:
+            pass  # read-only cache dir: the in-memory index still helps
+    with _LOADED_LOCK:
+        _LOADED[path] = index
+        _LOADED.move_to_end(path)
+        while len(_LOADED) > MAX_LOADED:
+            _LOADED.popitem(last=False)
+    return index
+
+
+__all__ = [
+    "Checkpoint",
+    "RatioExceeded",
+    "Member",
+    "TarIndex",
+    "build",
+    "detect",
+    "get_index",
+    "index_dir",
+]
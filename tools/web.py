@@ -1,12 +1,40 @@
+"""Read-only web access for ``web.read``.
+
+All calls share one :class:`requests.Session` whose adapter keeps up to
+``WEB_POOL_PER_HOST`` keep-alive connections per host for
+``WEB_POOL_HOSTS`` hosts, so repeated reads skip the TCP and TLS handshakes.
+The session never stores cookies. Redirects are followed by :func:`_fetch`
+so each hop is checked against private addresses. Responses go through the
+HTTP cache of :mod:`tools.httpcache`. Cache outcomes and new versus reused
+connections are counted in ``metrics.summary()["http_total"]``.
+
+Bodies are streamed and the download stops after ``MAX_BYTES``, so a huge
+page costs no more than the part that is returned. Each chunk is decoded
+and, for HTML, fed to an :class:`html.parser.HTMLParser` that drops
+``script`` and ``style`` contents as it goes, so text extraction overlaps
+the download. Raw bytes are only kept when the response goes to the cache.
+"""
+
 from __future__ import annotations
 
+import codecs
 import datetime as _dt
-import re
-from typing import Dict
+import threading
+import time
+import weakref
+from html.parser import HTMLParser
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, List, Mapping, NamedTuple
 
 import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from executor import check_cancelled, current_token
+
+from . import httpcache
 
-from urllib.parse import urlparse
+from urllib.parse import urljoin, urlparse
 import ipaddress
 import socket
 
@@ -25,6 +53,8 @@ PRIVATE_NETS = [
 ]
 
 MAX_BYTES = 1_000_000
+MAX_REDIRECTS = 3
+READ_CHUNK = 64 * 1024
 
 
 def _sanitize(text: str) -> str:
@@ -45,37 +75,355 @@ def _is_private(host: str) -> bool:
     return False
 
 
-def read(url: str) -> Dict:
+def _check_url(url: str) -> Dict | None:
     u = urlparse(url)
     if u.scheme not in ("http", "https"):
-        return {"kind": "error", "code": "bad_args", "message": "unsupported_scheme", "hint": ""}
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": "unsupported_scheme",
+            "hint": "",
+        }
     if u.username or u.password:
-        return {"kind": "error", "code": "bad_args", "message": "blocked_userinfo", "hint": ""}
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": "blocked_userinfo",
+            "hint": "",
+        }
     host = u.hostname or ""
     if host == "localhost" or _is_private(host):
-        return {"kind": "error", "code": "bad_args", "message": "blocked_host", "hint": ""}
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": "blocked_host",
+            "hint": "",
+        }
+    return None
+
+
+_SESSION: requests.Session | None = None
+_ADAPTER: HTTPAdapter | None = None
+_CACHE: httpcache.HttpCache | None = None
+_LOCK = threading.Lock()
+# connection pool -> (connections, requests) already counted
+_POOL_SEEN: "weakref.WeakKeyDictionary[Any, tuple[int, int]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _session() -> requests.Session:
+    """The shared, pooled session, created on first use."""
+    global _SESSION, _ADAPTER
+    with _LOCK:
+        if _SESSION is None:
+            from settings import WEB_POOL_HOSTS, WEB_POOL_PER_HOST
+
+            s = requests.Session()
+            s.trust_env = False
+            s.max_redirects = MAX_REDIRECTS
+            s.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _ADAPTER = HTTPAdapter(
+                pool_connections=WEB_POOL_HOSTS,
+                pool_maxsize=WEB_POOL_PER_HOST,
+                # a burst past the pool opens a throwaway connection instead
+                # of waiting, with no timeout, for one to be returned
+                pool_block=False,
+            )
+            s.mount("http://", _ADAPTER)
+            s.mount("https://", _ADAPTER)
+            _SESSION = s
+        return _SESSION
+
+
+def http_cache() -> httpcache.HttpCache:
+    """The process-wide response cache configured by ``WEB_CACHE_PATH``."""
+    global _CACHE
+    with _LOCK:
+        if _CACHE is None:
+            from settings import WEB_CACHE_MAX_BYTES, WEB_CACHE_PATH
+
+            _CACHE = httpcache.HttpCache(
+                WEB_CACHE_PATH or httpcache.DEFAULT_CACHE_PATH, WEB_CACHE_MAX_BYTES
+            )
+        return _CACHE
+
+
+def _count_connections() -> None:
+    """Record connections the pools opened or reused since the last call."""
+    if _ADAPTER is None:
+        return
+    new = made = 0
+    with _LOCK:
+        pools = _ADAPTER.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            seen = _POOL_SEEN.get(pool, (0, 0))
+            now = (pool.num_connections, pool.num_requests)
+            _POOL_SEEN[pool] = now
+            new += now[0] - seen[0]
+            made += now[1] - seen[1]
+    for _ in range(new):
+        metrics.record_http("connection", "new")
+    for _ in range(max(0, made - new)):
+        metrics.record_http("connection", "reused")
+
+
+class _Page(NamedTuple):
+    url: str
+    headers: Mapping[str, str]
+    text: str
+
+
+def _is_text(headers: Mapping[str, str]) -> bool:
+    return headers.get("content-type", "").lower().startswith("text/")
+
+
+class _TextSink:
+    """Decode body chunks as they arrive and extract their text.
+
+    The charset comes from ``Content-Type`` (unknown ones fall back to
+    UTF-8); HTML goes through :class:`_TextExtractor`, other text is kept
+    as decoded.
+    """
+
+    def __init__(self, headers: Mapping[str, str]) -> None:
+        encoding = requests.utils.get_encoding_from_headers(headers) or "utf-8"
+        try:
+            factory = codecs.getincrementaldecoder(encoding)
+        except LookupError:
+            factory = codecs.getincrementaldecoder("utf-8")
+        self._decoder = factory("replace")
+        self._parser: _TextExtractor | None = None
+        self._parts: List[str] = []
+        if "html" in headers.get("content-type", "").lower():
+            self._parser = _TextExtractor()
+            self._parts = self._parser.parts
+
+    def feed(self, chunk: bytes, final: bool = False) -> None:
+        text = self._decoder.decode(chunk, final)
+        if self._parser is None:
+            self._parts.append(text)
+        elif text:
+            self._parser.feed(text)
+
+    def close(self) -> str:
+        self.feed(b"", final=True)
+        if self._parser is not None:
+            self._parser.close()
+        return "".join(self._parts)
+
+
+def _page_text(headers: Mapping[str, str], body: bytes) -> str:
+    """Text of a cached ``body``, extracted chunk by chunk like a download."""
+    if not _is_text(headers):
+        return ""
+    sink = _TextSink(headers)
+    for start in range(0, len(body), READ_CHUNK):
+        sink.feed(body[start : start + READ_CHUNK])
+    return sink.close()
+
+
+def _download(resp: requests.Response, keep: bool) -> tuple[str, bytes]:
+    """Read at most ``MAX_BYTES`` of a streamed body and release the connection.
+
+    Returns the extracted text and, if ``keep``, the raw bytes for the cache.
+    Bodies ``read`` would reject are not downloaded at all. Stopping early
+    closes the connection instead of returning it to the pool, which is
+    cheaper than draining the rest of a large page.
+    """
+    if not _is_text(resp.headers):
+        resp.close()
+        return "", b""
+    sink = _TextSink(resp.headers)
+    chunks: List[bytes] = []
+    size = 0
+    try:
+        for chunk in resp.iter_content(READ_CHUNK):
+            check_cancelled()
+            chunk = chunk[: MAX_BYTES - size]
+            sink.feed(chunk)
+            if keep:
+                chunks.append(chunk)
+            size += len(chunk)
+            if size >= MAX_BYTES:
+                break
+    finally:
+        resp.close()
+    return sink.close(), b"".join(chunks)
+
+
+class _Blocked(Exception):
+    """A redirect pointed at a URL :func:`_check_url` refuses."""
+
+    def __init__(self, envelope: Dict[str, Any]) -> None:
+        super().__init__(envelope["message"])
+        self.envelope = envelope
+
+
+def _fetch(url: str) -> _Page:
+    """GET ``url`` through the HTTP cache; raises ``requests`` exceptions.
+
+    Redirects are followed here, not by ``requests``, so every ``Location``
+    passes :func:`_check_url` before it is requested.
+    """
+    session = _session()
+    cache = http_cache()
+    entry = cache.lookup(url, session.headers)
+    if entry is not None and httpcache.is_fresh(entry, time.time()):
+        metrics.record_http("cache", "hit")
+        return _Page(url, entry.headers, _page_text(entry.headers, entry.body))
+    # never outlive the dispatcher's timeout for this call
+    timeout = current_token().remaining(10)
+    target = url
+    headers = httpcache.conditional_headers(entry) if entry is not None else {}
+    for hop in range(MAX_REDIRECTS + 1):
+        sent = time.time()
+        resp = session.get(
+            target,
+            headers=headers,
+            timeout=timeout,
+            allow_redirects=False,
+            stream=True,
+        )
+        _count_connections()
+        if resp.status_code == 304 and entry is not None and hop == 0:
+            resp.close()
+            entry = cache.freshen(entry, resp.headers, sent, time.time())
+            metrics.record_http("cache", "revalidated")
+            return _Page(url, entry.headers, _page_text(entry.headers, entry.body))
+        if not resp.is_redirect:
+            return _store(cache, url, resp, sent, redirected=hop > 0)
+        resp.close()
+        if hop == 0:
+            cache.forget(url)
+        target = urljoin(target, resp.headers["location"])
+        blocked = _check_url(target)
+        if blocked is not None:
+            raise _Blocked(blocked)
+        headers = {}
+        timeout = current_token().remaining(10)
+    raise requests.TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects.")
+
+
+def _store(
+    cache: httpcache.HttpCache,
+    url: str,
+    resp: requests.Response,
+    sent: float,
+    redirected: bool,
+) -> _Page:
+    metrics.record_http("cache", "miss")
+    if resp.status_code >= 400:
+        resp.close()
+    resp.raise_for_status()
+    # only responses fetched without redirects are stored under ``url``; a
+    # body cut at MAX_BYTES is stored as is since ``read`` never returns more
+    text, body = _download(resp, keep=not redirected)
+    if not redirected:
+        cache.store(
+            url,
+            resp.status_code,
+            resp.headers,
+            body,
+            sent,
+            time.time(),
+            resp.request.headers if resp.request is not None else {},
+        )
+    return _Page(resp.url, resp.headers, text)
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the text of an HTML document, skipping scripts and styles."""
+
+    SKIP = {"script", "style"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag in self.SKIP:
+            self._skipping += 1
+        self.parts.append(" ")
+
+    def handle_startendtag(self, tag: str, attrs: Any) -> None:
+        self.parts.append(" ")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+        self.parts.append(" ")
+
+    def handle_data(self, data: str) -> None:
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def stats() -> Dict[str, Any]:
+    """Size of the response cache and number of pooled hosts."""
+    pools = len(_ADAPTER.poolmanager.pools) if _ADAPTER is not None else 0
+    return {"cache": http_cache().stats(), "pooled_hosts": pools}
+
+
+def revalidate(
+    url: str, etag: str | None = None, last_modified: str | None = None
+) -> bool:
+    """Return True if ``url`` answers 304 to a conditional GET."""
+    if not (etag or last_modified) or _check_url(url) is not None:
+        return False
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    resp = _session().get(
+        url,
+        headers=headers,
+        timeout=current_token().remaining(10),
+        allow_redirects=False,
+        stream=True,
+    )
+    resp.close()
+    status: int = resp.status_code
+    return status == 304
+
+
+def read(url: str) -> Dict:
+    blocked = _check_url(url)
+    if blocked is not None:
+        return blocked
     try:
-        s = requests.Session()
-        s.trust_env = False
-        resp = s.get(url, timeout=10, allow_redirects=True)
-        if len(resp.history) > 3:
-            return {"kind": "error", "code": "bad_args", "message": "too_many_redirects", "hint": ""}
-        resp.raise_for_status()
-        ct = resp.headers.get("content-type", "").lower()
-        if not ct.startswith("text/"):
-            return {"kind": "error", "code": "bad_args", "message": "unsupported_content_type", "hint": ""}
-        content = resp.text[:MAX_BYTES]
-        content = re.sub(r"<script.*?>.*?</script>", "", content, flags=re.DOTALL | re.IGNORECASE)
-        content = re.sub(r"<style.*?>.*?</style>", "", content, flags=re.DOTALL | re.IGNORECASE)
-        content = re.sub(r"<[^>]+>", " ", content)
+        page = _fetch(url)
+        if not _is_text(page.headers):
+            return {
+                "kind": "error",
+                "code": "bad_args",
+                "message": "unsupported_content_type",
+                "hint": "",
+            }
         return {
             "kind": "ok",
             "result": {
-                "text": _sanitize(content.strip()),
-                "url_final": resp.url,
+                "text": _sanitize(page.text.strip()),
+                "url_final": page.url,
                 "fetched_at": _dt.datetime.utcnow().isoformat(),
+                "etag": page.headers.get("etag"),
+                "last_modified": page.headers.get("last-modified"),
             },
         }
+    except _Blocked as e:
+        return e.envelope
+    except requests.TooManyRedirects:
+        return {
+            "kind": "error",
+            "code": "bad_args",
+            "message": "too_many_redirects",
+            "hint": "",
+        }
     except requests.Timeout:
         return {
             "kind": "error",
@@ -87,4 +435,4 @@ def read(url: str) -> Dict:
         return {"kind": "error", "code": "http_error", "message": str(e), "hint": ""}
 
 
-__all__ = ["read"]
+__all__ = ["http_cache", "read", "revalidate", "stats"]
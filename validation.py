@@ -0,0 +1,193 @@
+"""Argument validators compiled from tool schemas.
+
+Tools describe their arguments with a small JSON-schema subset: ``type``
+(a name or list of names), ``properties``, ``required``,
+``additionalProperties: false``, ``items``, ``enum``, ``minimum``/``maximum``
+and ``minLength``/``maxLength``. :func:`compile_schema` turns such a schema
+into a closure once, at registration time, so checking a call is a handful of
+``isinstance`` tests instead of a walk over the schema dict. Validators return
+a list of ``{"field", "reason"}`` problems, empty when the arguments are valid.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List
+
+Problem = Dict[str, str]
+Validator = Callable[[Any], List[Problem]]
+_Check = Callable[[Any, str, List[Problem]], None]
+
+# bool is an int subclass, but JSON booleans are not numbers
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "null": lambda v: v is None,
+}
+
+
+class _Stop(Exception):
+    """Raised by a failed type check to skip the remaining checks."""
+
+
+def _join(path: str, key: str) -> str:
+    return f"{path}.{key}" if path else key
+
+
+def _compile(schema: Dict[str, Any]) -> _Check:
+    checks: List[_Check] = []
+
+    types = schema.get("type")
+    if types is not None:
+        names = [types] if isinstance(types, str) else list(types)
+        preds = [_TYPES[n] for n in names if n in _TYPES]
+        expected = "expected " + " or ".join(names)
+
+        def check_type(value: Any, path: str, out: List[Problem]) -> None:
+            if not any(p(value) for p in preds):
+                out.append({"field": path, "reason": expected})
+                raise _Stop
+
+        if preds:
+            checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+        reason = "expected one of " + ", ".join(map(str, allowed))
+
+        def check_enum(value: Any, path: str, out: List[Problem]) -> None:
+            if value not in allowed:
+                out.append({"field": path, "reason": reason})
+
+        checks.append(check_enum)
+
+    low, high = schema.get("minimum"), schema.get("maximum")
+    if low is not None or high is not None:
+
+        def check_range(value: Any, path: str, out: List[Problem]) -> None:
+            if not _TYPES["number"](value):
+                return
+            if low is not None and value < low:
+                out.append({"field": path, "reason": f"below minimum {low}"})
+            elif high is not None and value > high:
+                out.append({"field": path, "reason": f"above maximum {high}"})
+
+        checks.append(check_range)
+
+    min_len, max_len = schema.get("minLength"), schema.get("maxLength")
+    if min_len is not None or max_len is not None:
+
+        def check_length(value: Any, path: str, out: List[Problem]) -> None:
+            if not isinstance(value, str):
+                return
+            if min_len is not None and len(value) < min_len:
+                out.append({"field": path, "reason": f"shorter than {min_len}"})
+            elif max_len is not None and len(value) > max_len:
+                out.append({"field": path, "reason": f"longer than {max_len}"})
+
+        checks.append(check_length)
+
+    props = {
+        key: _compile(spec)
+        for key, spec in (schema.get("properties") or {}).items()
+        if isinstance(spec, dict)
+    }
+    required = list(schema.get("required") or [])
+    closed = schema.get("additionalProperties") is False
+    if props or required or closed:
+
+        def check_object(value: Any, path: str, out: List[Problem]) -> None:
+            if not isinstance(value, dict):
+                return
+            for key in required:
+                if key not in value:
+                    out.append({"field": _join(path, key), "reason": "missing"})
+            for key, item in value.items():
+                sub = props.get(key)
+                if sub is not None:
+                    sub(item, _join(path, key), out)
+                elif closed:
+                    out.append({"field": _join(path, key), "reason": "unexpected"})
+
+        checks.append(check_object)
+
+    if isinstance(schema.get("items"), dict):
+        item_check = _compile(schema["items"])
+
+        def check_items(value: Any, path: str, out: List[Problem]) -> None:
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    item_check(item, f"{path}[{i}]", out)
+
+        checks.append(check_items)
+
+    def check(value: Any, path: str, out: List[Problem]) -> None:
+        try:
+            for c in checks:
+                c(value, path, out)
+        except _Stop:
+            pass
+
+    return check
+
+
+def compile_schema(schema: Dict[str, Any]) -> Validator:
+    """Compile ``schema`` into a function returning the value's problems."""
+    check = _compile(schema)
+
+    def validate(value: Any) -> List[Problem]:
+        out: List[Problem] = []
+        check(value, "", out)
+        return out
+
+    return validate
+
+
+def args_schema(schema: Dict[str, Any] | None) -> Dict[str, Any] | None:
+    """Return the arguments part of a tool schema.
+
+    Registered tools keep it under ``"args"``; a bare object schema with
+    ``properties``/``required`` at the top level is accepted as well.
+    """
+    if not schema:
+        return None
+    if isinstance(schema.get("args"), dict):
+        return dict(schema["args"], type="object")
+    if "properties" in schema or "required" in schema:
+        return dict(schema, type="object")
+    return None
+
+
+def compile_args(schema: Dict[str, Any] | None) -> Validator | None:
+    """Compile the arguments validator of a tool schema, if it has one."""
+    spec = args_schema(schema)
+    return compile_schema(spec) if spec is not None else None
+
+
+def validator_for(tool: Dict[str, Any]) -> Validator | None:
+    """Return the tool's precompiled validator, compiling ad hoc if absent."""
+    if "validate" in tool:
+        validate: Validator | None = tool["validate"]
+        return validate
+    return compile_args(tool.get("schema"))
+
+
+def describe(problems: List[Problem]) -> str:
+    """One-line summary such as ``"x: expected integer; path: missing"``."""
+    return "; ".join(
+        f"{p['field']}: {p['reason']}" if p["field"] else p["reason"] for p in problems
+    )
+
+
+__all__ = [
+    "Problem",
+    "Validator",
+    "args_schema",
+    "compile_args",
+    "compile_schema",
+    "describe",
+    "validator_for",
+]